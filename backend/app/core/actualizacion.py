@@ -0,0 +1,62 @@
+# backend/app/core/actualizacion.py
+# --- Doctrina Escritura con Retorno: PATCH condicionado a la pre-imagen, sin releer el documento ---
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import HTTPException, status
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from .versiones import marcar_version
+
+# Reintentos cuando el documento cambia entre la pre-imagen y el commit
+INTENTOS_ACTUALIZACION = 3
+
+# preparar(lote, pre-imagen): escrituras asociadas y validaciones sobre el estado actual
+Preparar = Callable[[Any, dict], Awaitable[None]]
+
+
+async def leer_preimagen(db, coleccion: str, doc_id: str, espejo=None) -> Optional[Tuple[dict, Any]]:
+    """(datos, update_time) del documento: de la copia local si hay Espejo listo, si no una lectura puntual."""
+    if espejo is not None and espejo.listo:
+        previo = espejo.preimagen(doc_id)
+        if previo is not None:
+            return previo
+    snap = await db.collection(coleccion).document(doc_id).get()
+    if not snap.exists:
+        return None
+    return snap.to_dict(), snap.update_time
+
+
+async def actualizar_con_retorno(db, coleccion: str, doc_id: str, cambios: dict,
+                                 preparar: Optional[Preparar] = None, espejo=None) -> Optional[dict]:
+    """
+    Actualiza y devuelve el documento resultante (con id) sin la lectura posterior al update:
+    1. Pre-imagen (Espejo: sin RPC; si no, una lectura). Documento inexistente -> None (404 del router).
+    2. 'preparar(lote, actual)' agrega las escrituras asociadas (claves únicas, referencias) y valida
+       sobre la pre-imagen (anti-orfandad) sin volver a leer el documento.
+    3. update condicionado a la update_time de la pre-imagen + Doctrina Versiones en un WriteBatch.
+    4. Resultado = pre-imagen + cambios: es exactamente lo que quedó guardado.
+    Si el documento cambió en el medio (otro escritor, Espejo atrasado) el commit falla y se
+    reintenta con una lectura fresca.
+    """
+    ref = db.collection(coleccion).document(doc_id)
+    for intento in range(INTENTOS_ACTUALIZACION):
+        # Solo el primer intento confía en el Espejo: un fallo de precondición indica que está atrasado
+        previo = await leer_preimagen(db, coleccion, doc_id, espejo if intento == 0 else None)
+        if previo is None:
+            return None
+        actual, update_time = previo
+        if cambios:
+            lote = db.batch()
+            if preparar is not None:
+                await preparar(lote, actual)
+            lote.update(ref, cambios, option=db.write_option(last_update_time=update_time))
+            marcar_version(lote, db, coleccion)
+            try:
+                await lote.commit()
+            except FailedPrecondition:
+                continue
+            except NotFound:
+                return None
+        resultado = {**actual, **cambios}
+        resultado['id'] = doc_id
+        return resultado
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                        detail="El documento cambió durante la actualización. Reintente la operación.")
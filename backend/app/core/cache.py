@@ -0,0 +1,142 @@
+# backend/app/core/cache.py
+# --- Doctrina Cache de Catálogos: lectura a través de memoria con invalidación por escritura ---
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+class _Entrada:
+    __slots__ = ("valor", "creado", "version")
+
+    def __init__(self, valor: Any, version: Any = None):
+        self.valor = valor
+        self.creado = time.monotonic()
+        self.version = version
+
+
+class CacheCatalogos:
+    """
+    Cache en memoria (por proceso) para los listados de tablas maestras.
+    - Clave: (colección, clave de consulta), p.ej. ('rubros', 'activos').
+    - Fresco hasta 'ttl' segundos; luego, durante 'ventana_stale' segundos se sirve
+      el valor viejo y se revalida en segundo plano (stale-while-revalidate).
+    - Cualquier escritura del proceso invalida la colección completa.
+    - Una sola carga en vuelo por clave: los pedidos concurrentes la comparten.
+    - 'version' (Doctrina Versiones): la entrada recuerda la versión de la colección con la que
+      se pidió; un pedido con otra versión no la usa (ni fresca ni stale) y carga de nuevo. Así el
+      ETag calculado con esa versión siempre describe el cuerpo servido, aunque la escritura
+      haya ocurrido en otro worker.
+    """
+
+    def __init__(self, ttl: float, ventana_stale: float):
+        self.ttl = ttl
+        self.ventana_stale = ventana_stale
+        self._entradas: Dict[str, Dict[Hashable, _Entrada]] = {}
+        self._generaciones: Dict[str, int] = {}
+        self._en_vuelo: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        # Contadores de observabilidad
+        self.aciertos = 0
+        self.fallos = 0
+        self.stale_servidos = 0
+        self.revalidaciones = 0
+        self.invalidaciones = 0
+
+    @property
+    def habilitado(self) -> bool:
+        return self.ttl > 0
+
+    async def obtener(self, coleccion: str, clave: Hashable, cargador: Callable[[], Awaitable[Any]],
+                      version: Any = None) -> Any:
+        """
+        Devuelve el valor cacheado o lo carga con 'cargador' (corrutina sin argumentos).
+        'version': versión leída antes de llamar (la del ETag); el valor se carga después de leerla.
+        """
+        if not self.habilitado:
+            return await cargador()
+
+        entrada = self._entradas.get(coleccion, {}).get(clave)
+        if entrada is not None and entrada.version == version:
+            edad = time.monotonic() - entrada.creado
+            if edad < self.ttl:
+                self.aciertos += 1
+                return entrada.valor
+            if edad < self.ttl + self.ventana_stale:
+                self.stale_servidos += 1
+                self._revalidar_en_fondo(coleccion, clave, cargador, version)
+                return entrada.valor
+
+        self.fallos += 1
+        return await self._cargar(coleccion, clave, cargador, version)
+
+    def tiene(self, coleccion: str) -> bool:
+        """Hay al menos una entrada cargada para la colección."""
+        return bool(self._entradas.get(coleccion))
+
+    def vigentes(self, coleccion: str, version: Any = None) -> List[Any]:
+        """
+        Valores de la colección servibles para 'version' (frescos o dentro de la ventana stale),
+        sin cargar nada: sirven para resolver lecturas puntuales (batch-get) desde memoria.
+        """
+        ahora = time.monotonic()
+        return [entrada.valor for entrada in self._entradas.get(coleccion, {}).values()
+                if entrada.version == version and ahora - entrada.creado < self.ttl + self.ventana_stale]
+
+    def invalidar(self, coleccion: str):
+        """Descarta todas las entradas de la colección (llamar tras cada escritura)."""
+        self._entradas.pop(coleccion, None)
+        # Las cargas que ya estaban en vuelo no deben repoblar con datos previos a la escritura
+        self._generaciones[coleccion] = self._generaciones.get(coleccion, 0) + 1
+        self.invalidaciones += 1
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos + self.stale_servidos
+        return {
+            "habilitado": self.habilitado,
+            "ttl_segundos": self.ttl,
+            "ventana_stale_segundos": self.ventana_stale,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "stale_servidos": self.stale_servidos,
+            "revalidaciones": self.revalidaciones,
+            "invalidaciones": self.invalidaciones,
+            "tasa_aciertos": round((self.aciertos + self.stale_servidos) / consultas, 4) if consultas else 0.0,
+            "entradas": {col: len(claves) for col, claves in self._entradas.items()},
+        }
+
+    # --- Internos ---
+
+    def _cargar(self, coleccion: str, clave: Hashable, cargador, version: Any = None) -> asyncio.Future:
+        # La versión es parte de la llave: una carga empezada para una versión anterior no se comparte
+        llave = (coleccion, clave, version)
+        futuro = self._en_vuelo.get(llave)
+        if futuro is None:
+            futuro = asyncio.ensure_future(self._ejecutar_carga(coleccion, clave, cargador, version))
+            self._en_vuelo[llave] = futuro
+        # shield: si un cliente cancela, la carga compartida sigue para los demás
+        return asyncio.shield(futuro)
+
+    async def _ejecutar_carga(self, coleccion: str, clave: Hashable, cargador, version: Any = None) -> Any:
+        generacion = self._generaciones.get(coleccion, 0)
+        try:
+            valor = await cargador()
+            if self._generaciones.get(coleccion, 0) == generacion:
+                self._entradas.setdefault(coleccion, {})[clave] = _Entrada(valor, version)
+            return valor
+        finally:
+            self._en_vuelo.pop((coleccion, clave, version), None)
+
+    def _revalidar_en_fondo(self, coleccion: str, clave: Hashable, cargador, version: Any = None):
+        if (coleccion, clave, version) in self._en_vuelo:
+            return
+        self.revalidaciones += 1
+        futuro = self._cargar(coleccion, clave, cargador, version)
+        # Un error de revalidación no rompe nada: se sigue sirviendo el valor viejo
+        futuro.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+
+# Instancia Singleton (configurable por entorno; SL_CACHE_TTL=0 deshabilita)
+cache_catalogos = CacheCatalogos(
+    ttl=float(os.getenv("SL_CACHE_TTL", "30")),
+    ventana_stale=float(os.getenv("SL_CACHE_STALE", "300")),
+)
@@ -0,0 +1,127 @@
+# backend/app/core/claves_unicas.py
+# --- Doctrina Claves Únicas: un documento determinístico por (colección, clave de negocio) ---
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import quote
+from .exportacion import documentos_por_paginas
+
+COLECCION_CLAVES = 'claves_unicas'
+
+# (doc_id del dueño, datos mínimos con la forma del documento: {campo: valor, 'baja_logica': bool})
+Dueno = Tuple[str, dict]
+
+
+def ref_clave(db, coleccion: str, valor: Any):
+    """claves_unicas/rubros:ABC. El valor se escapa ('/' no es válido en un id de documento)."""
+    return db.collection(COLECCION_CLAVES).document(f"{coleccion}:{quote(str(valor), safe='')}")
+
+
+def datos_clave(coleccion: str, campo: str, valor: Any, doc_id: str, baja_logica: bool = False) -> dict:
+    return {'coleccion': coleccion, 'campo': campo, 'valor': valor, 'doc_id': doc_id, 'baja_logica': baja_logica}
+
+
+def _dueno(datos: dict) -> Dueno:
+    return datos['doc_id'], {datos['campo']: datos['valor'], 'baja_logica': datos.get('baja_logica', False)}
+
+
+async def leer_clave(db, coleccion: str, valor: Any, transaction=None) -> Optional[Dueno]:
+    """Lectura puntual de la clave (dentro de la transacción si se indica). None: libre."""
+    snap = await ref_clave(db, coleccion, valor).get(transaction=transaction)
+    return _dueno(snap.to_dict()) if snap.exists else None
+
+
+def reservar_clave(escritor, db, coleccion: str, campo: str, valor: Any, doc_id: str, baja_logica: bool = False):
+    """create: si otra escritura tomó la clave entre la lectura y el commit, el commit falla (AlreadyExists)."""
+    escritor.create(ref_clave(db, coleccion, valor), datos_clave(coleccion, campo, valor, doc_id, baja_logica))
+
+
+async def claves_existentes(db, coleccion: str, valores: Iterable[Any]) -> Dict[Any, Dueno]:
+    """Alta masiva: get_all de las claves (lecturas puntuales agrupadas). Devuelve {valor: dueño}."""
+    from .masivo import MAX_OPERACIONES_LOTE, en_paralelo, trocear
+
+    unicos = list(dict.fromkeys(v for v in valores if v is not None))
+
+    async def leer(trozo):
+        refs = [ref_clave(db, coleccion, v) for v in trozo]
+        return [snap async for snap in db.get_all(refs) if snap.exists]
+
+    encontrados: Dict[Any, Dueno] = {}
+    for snaps in await en_paralelo([leer(t) for t in trocear(unicos, MAX_OPERACIONES_LOTE)]):
+        for snap in snaps:
+            datos = snap.to_dict()
+            encontrados[datos['valor']] = _dueno(datos)
+    return encontrados
+
+
+async def sincronizar_clave(db, lote, coleccion: str, campo: str, doc_id: str, cambios: dict,
+                            actual: Optional[dict] = None) -> Optional[Dueno]:
+    """
+    PATCH / baja / reactivación: agrega al 'lote' las escrituras que mantienen la clave al día.
+    - Cambio de clave: crea la nueva y borra la anterior si sigue siendo de este documento
+      (borrado condicionado a la update_time leída: si otro la tomó en el medio, el commit falla).
+    - Cambio de baja_logica: reescribe la clave con el nuevo estado.
+    'actual': pre-imagen del documento si el llamador ya la tiene (evita la lectura).
+    Devuelve el dueño de la clave nueva si ya está tomada por otro documento (el llamador responde 409).
+    """
+    if campo not in cambios and 'baja_logica' not in cambios:
+        return None
+    if actual is None:
+        snap = await db.collection(coleccion).document(doc_id).get(field_paths=[campo, 'baja_logica'])
+        if not snap.exists:
+            return None  # El update del mismo lote responde NotFound
+        actual = snap.to_dict()
+    valor_actual = actual.get(campo)
+    valor = cambios.get(campo, valor_actual)
+    baja_logica = cambios.get('baja_logica', actual.get('baja_logica', False))
+
+    if valor != valor_actual:
+        # Clave nueva y anterior en una sola lectura agrupada
+        ref_nueva = ref_clave(db, coleccion, valor)
+        ref_anterior = ref_clave(db, coleccion, valor_actual) if valor_actual is not None else None
+        claves = {snap.id: snap async for snap in db.get_all([r for r in (ref_nueva, ref_anterior) if r is not None])}
+        nueva = claves.get(ref_nueva.id)
+        if nueva is not None and nueva.exists and nueva.get('doc_id') != doc_id:
+            return _dueno(nueva.to_dict())
+        reservar_clave(lote, db, coleccion, campo, valor, doc_id, baja_logica)
+        anterior = claves.get(ref_anterior.id) if ref_anterior is not None else None
+        if anterior is not None and anterior.exists and anterior.get('doc_id') == doc_id:
+            lote.delete(anterior.reference, option=db.write_option(last_update_time=anterior.update_time))
+    elif valor is not None:
+        # set: también completa las claves de documentos anteriores a la doctrina
+        lote.set(ref_clave(db, coleccion, valor), datos_clave(coleccion, campo, valor, doc_id, baja_logica))
+    return None
+
+
+async def reconstruir_claves(db, coleccion: str, campo: str) -> dict:
+    """
+    Genera las claves de los documentos existentes (migración única, idempotente).
+    Ante valores repetidos la clave queda para el activo; los demás se informan como conflictos.
+    """
+    from .masivo import confirmar_lotes
+
+    query = db.collection(coleccion).select([campo, 'baja_logica'])
+    duenos: Dict[Any, Tuple[str, bool]] = {}
+    conflictos = []
+    async for doc in documentos_por_paginas(query):
+        datos = doc.to_dict()
+        valor = datos.get(campo)
+        if valor is None:
+            continue
+        baja_logica = datos.get('baja_logica', False)
+        previo = duenos.get(valor)
+        if previo is not None:
+            conflictos.append({'valor': valor, 'ids': [previo[0], doc.id]})
+            if not previo[1] or baja_logica:
+                continue  # Conserva al activo (o al primero)
+        duenos[valor] = (doc.id, baja_logica)
+
+    operaciones = list(duenos.items())
+    errores = await confirmar_lotes(
+        db, coleccion, operaciones,
+        lambda lote, op: lote.set(ref_clave(db, coleccion, op[0]), datos_clave(coleccion, campo, op[0], *op[1])),
+    )
+    return {
+        'coleccion': coleccion,
+        'claves': len(operaciones) - sum(1 for e in errores if e),
+        'errores': sum(1 for e in errores if e),
+        'conflictos': conflictos,
+    }
@@ -0,0 +1,129 @@
+# backend/app/core/contadores.py
+# --- Doctrina Contadores: reserva de bloques de códigos (hi-lo) sobre la colección 'contadores' ---
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from google.cloud.firestore_v1 import async_transactional
+
+# Códigos reservados por transacción (configurable por entorno)
+TAMANO_BLOQUE_CODIGOS = int(os.getenv("SL_BLOQUE_CODIGOS", "50"))
+
+Semilla = Callable[[], Awaitable[int]]
+
+
+class ContadorInexistente(Exception):
+    pass
+
+
+@async_transactional
+async def _reservar_bloque(transaction, contador_ref, tamano: int, semilla: Optional[Semilla], crear: bool) -> int:
+    """Avanza 'ultimo_valor' en 'tamano' y devuelve el valor previo: el bloque es (previo, previo + tamano]."""
+    snap = await contador_ref.get(transaction=transaction)
+    if snap.exists:
+        ultimo = (snap.to_dict() or {}).get('ultimo_valor', 0)
+    elif not crear:
+        raise ContadorInexistente(contador_ref.id)
+    else:
+        # Primer uso: se parte del mayor código ya cargado (si hay semilla)
+        ultimo = await semilla() if semilla is not None else 0
+    transaction.set(contador_ref, {'ultimo_valor': ultimo + tamano}, merge=True)
+    return ultimo
+
+
+class AsignadorCodigos:
+    """
+    Entrega códigos correlativos desde memoria (por proceso):
+    - Una transacción sobre contadores/{nombre} reserva un bloque de 'tamano_bloque' códigos.
+    - Los códigos del bloque se entregan sin ida y vuelta a Firestore.
+    - Dos procesos nunca reciben el mismo bloque (la transacción serializa las reservas).
+    - Un reinicio descarta lo que quedaba del bloque: puede haber huecos, nunca repetidos.
+    """
+
+    def __init__(self, nombre: str, tamano_bloque: int = TAMANO_BLOQUE_CODIGOS,
+                 maximo: Optional[int] = None, semilla: Optional[Semilla] = None, crear: bool = True):
+        self.nombre = nombre
+        self.tamano_bloque = tamano_bloque
+        self.maximo = maximo
+        self.semilla = semilla
+        self.crear = crear
+        self._siguiente = 0
+        self._tope = 0  # Exclusivo: bloque vacío al arrancar
+        self._lock = asyncio.Lock()
+        # Contadores de observabilidad
+        self.entregados = 0
+        self.recargas = 0
+        self.reservados = 0
+        self.errores_recarga = 0
+        self.segundos_recarga = 0.0
+        self.ultima_recarga: Optional[float] = None
+
+    async def siguiente(self, db) -> int:
+        # Camino rápido: sin await entre la verificación y el avance (atómico en el event loop)
+        if self._siguiente < self._tope:
+            return self._entregar()
+        async with self._lock:
+            if self._siguiente >= self._tope:
+                await self._recargar(db)
+            return self._entregar()
+
+    def _entregar(self) -> int:
+        codigo = self._siguiente
+        self._siguiente += 1
+        self.entregados += 1
+        return codigo
+
+    async def _recargar(self, db):
+        inicio = time.monotonic()
+        contador_ref = db.collection('contadores').document(self.nombre)
+        try:
+            ultimo = await _reservar_bloque(db.transaction(), contador_ref, self.tamano_bloque, self.semilla, self.crear)
+        except Exception:
+            self.errores_recarga += 1
+            raise
+        finally:
+            self.segundos_recarga += time.monotonic() - inicio
+
+        tope = ultimo + self.tamano_bloque
+        if self.maximo is not None:
+            tope = min(tope, self.maximo)
+        if ultimo >= tope:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail=f"Se agotaron los códigos de '{self.nombre}' (máximo {self.maximo}).")
+        self._siguiente, self._tope = ultimo + 1, tope + 1
+        self.recargas += 1
+        self.reservados += tope - ultimo
+        self.ultima_recarga = time.time()
+
+    def estadisticas(self) -> dict:
+        return {
+            "tamano_bloque": self.tamano_bloque,
+            "codigos_entregados": self.entregados,
+            "codigos_reservados": self.reservados,
+            "disponibles_en_bloque": max(self._tope - self._siguiente, 0),
+            "recargas": self.recargas,
+            "errores_recarga": self.errores_recarga,
+            "segundos_recarga_promedio": round(self.segundos_recarga / self.recargas, 4) if self.recargas else 0.0,
+            "ultima_recarga": self.ultima_recarga,
+        }
+
+
+# Registro por proceso: un asignador por documento de 'contadores'
+_asignadores: Dict[str, AsignadorCodigos] = {}
+
+
+def asignador(nombre: str, **opciones) -> AsignadorCodigos:
+    """Devuelve (o crea con 'opciones') el asignador de contadores/{nombre}."""
+    if nombre not in _asignadores:
+        _asignadores[nombre] = AsignadorCodigos(nombre, **opciones)
+    return _asignadores[nombre]
+
+
+def descartar_asignador(nombre: str):
+    """Quita un asignador del registro (p.ej. su contador no existe: no acumular nombres arbitrarios)."""
+    _asignadores.pop(nombre, None)
+
+
+def estadisticas_contadores() -> dict:
+    return {nombre: a.estadisticas() for nombre, a in _asignadores.items()}
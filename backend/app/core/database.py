@@ -0,0 +1,90 @@
+# backend/app/core/database.py
+# --- Doctrina Conexión Única: un solo cliente Firestore por proceso ---
+import os
+import threading
+from google.cloud import firestore
+from google.oauth2 import service_account
+
+# La ruta puede sobreescribirse por entorno (despliegues fuera de la PC de desarrollo)
+RUTA_LLAVE_DEFAULT = "C:/dev/Sonido_Liquido_V4/service-account-v4.json"
+
+
+class ConexionFirestore:
+    """
+    Proveedor compartido de la conexión a Firestore.
+    Los clientes se crean de forma perezosa (primer uso) y una única vez por proceso,
+    de modo que cada worker de uvicorn abre un solo canal gRPC y carga la llave una vez.
+    - obtener_db_async(): AsyncClient usado por los servicios (rutas async def).
+    - obtener_db(): Client síncrono para scripts y listeners en hilos propios.
+    """
+
+    def __init__(self, ruta_llave: str):
+        self.ruta_llave = ruta_llave
+        self._credenciales = None
+        self._credenciales_intentadas = False
+        self._db = None
+        self._db_async = None
+        self._lock = threading.Lock()
+
+    def _obtener_credenciales(self):
+        # Llamar siempre con self._lock tomado
+        if not self._credenciales_intentadas:
+            try:
+                self._credenciales = service_account.Credentials.from_service_account_file(self.ruta_llave)
+            except Exception as e:
+                print(f"ERROR CRÍTICO: No se pudo cargar la llave de Firestore desde {self.ruta_llave}")
+                print(f"Error: {e}")
+                self._credenciales = None
+            self._credenciales_intentadas = True
+        return self._credenciales
+
+    def obtener_db(self):
+        """Devuelve el cliente síncrono compartido (o None si la llave no pudo cargarse)."""
+        with self._lock:
+            if self._db is None:
+                credentials = self._obtener_credenciales()
+                if credentials is not None:
+                    self._db = firestore.Client(credentials=credentials)
+            return self._db
+
+    def obtener_db_async(self):
+        """
+        Devuelve el AsyncClient compartido (o None si la llave no pudo cargarse).
+        Debe crearse dentro del event loop que lo va a usar (lifespan de main.py).
+        """
+        with self._lock:
+            if self._db_async is None:
+                credentials = self._obtener_credenciales()
+                if credentials is not None:
+                    self._db_async = firestore.AsyncClient(credentials=credentials)
+            return self._db_async
+
+    async def precalentar(self) -> bool:
+        """
+        Abre el canal gRPC y obtiene el token OAuth antes de servir tráfico,
+        para que el primer request no pague ese costo.
+        """
+        db = self.obtener_db_async()
+        if db is None:
+            return False
+
+        try:
+            # Lectura puntual barata: el documento no necesita existir
+            await db.collection('contadores').document('_precalentamiento').get()
+            return True
+        except Exception as e:
+            print(f"ADVERTENCIA: Falló el precalentamiento de Firestore: {e}")
+            return False
+
+    def cerrar(self):
+        """Libera el transporte de los clientes al apagar el proceso."""
+        with self._lock:
+            for cliente in (self._db, self._db_async):
+                if cliente is not None:
+                    cliente.close()
+            self._db = None
+            self._db_async = None
+
+
+# Instancia Singleton del Proveedor
+conexion_firestore = ConexionFirestore(os.getenv("SL_FIRESTORE_LLAVE", RUTA_LLAVE_DEFAULT))
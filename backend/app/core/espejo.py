@@ -0,0 +1,107 @@
+# backend/app/core/espejo.py
+# --- Doctrina Espejo: copia viva en memoria de tablas maestras chicas ---
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+
+
+class EspejoColeccion:
+    """
+    Mantiene una copia en memoria, siempre actualizada, de una colección chica
+    suscribiéndose con on_snapshot (cliente síncrono; el SDK corre el listener en su propio hilo).
+    Indexa por id de documento y por clave de negocio (p.ej. 'codigo_iva').
+    Cada worker recibe los cambios por el mismo listener: no hace falta TTL para ser coherente.
+    """
+
+    def __init__(self, coleccion: str, campo_clave: str, modelo: Type[BaseModel]):
+        self.coleccion = coleccion
+        self.campo_clave = campo_clave
+        self.modelo = modelo
+        self.version = 0  # Se incrementa con cada snapshot que trae cambios
+        self.huella = ''  # Hash del contenido: igual en todos los workers con la misma copia
+        self._tiempos: Dict[str, Any] = {}  # update_time por id
+        self._por_id: Dict[str, BaseModel] = {}
+        self._por_clave: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._listo = threading.Event()
+        self._watch = None
+
+    # --- Ciclo de vida ---
+
+    def iniciar(self, db_sync):
+        self._watch = db_sync.collection(self.coleccion).on_snapshot(self._al_cambiar)
+
+    def esperar_listo(self, timeout: float) -> bool:
+        """Bloquea hasta recibir el snapshot inicial (usar fuera del event loop)."""
+        return self._listo.wait(timeout)
+
+    def detener(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        self._listo.clear()
+
+    @property
+    def listo(self) -> bool:
+        return self._listo.is_set()
+
+    # --- Callback del listener (hilo del SDK) ---
+
+    def _al_cambiar(self, docs, cambios, read_time):
+        with self._lock:
+            for cambio in cambios:
+                doc = cambio.document
+                self._tiempos.pop(doc.id, None)
+                anterior = self._por_id.pop(doc.id, None)
+                if anterior is not None:
+                    clave_anterior = getattr(anterior, self.campo_clave)
+                    if self._por_clave.get(clave_anterior) == doc.id:
+                        del self._por_clave[clave_anterior]
+
+                if cambio.type.name == 'REMOVED':
+                    continue
+
+                datos = doc.to_dict()
+                datos['id'] = doc.id
+                try:
+                    item = self.modelo.model_validate(datos)
+                except Exception as e:
+                    print(f"ADVERTENCIA: Documento inválido en espejo '{self.coleccion}/{doc.id}': {e}")
+                    continue
+                self._por_id[doc.id] = item
+                self._por_clave[getattr(item, self.campo_clave)] = doc.id
+                self._tiempos[doc.id] = doc.update_time
+            self.version += 1
+            tiempos = sorted((i, str(t)) for i, t in self._tiempos.items())
+            self.huella = hashlib.sha1(repr(tiempos).encode('utf-8')).hexdigest()[:12]
+        self._listo.set()
+
+    # --- Consultas locales (cero lecturas a Firestore) ---
+
+    def listar(self, estado: str = 'activos') -> List[BaseModel]:
+        with self._lock:
+            items = list(self._por_id.values())
+        # Doctrina VIL (Filtro de Tres Vías)
+        if estado == 'activos':
+            return [i for i in items if not i.baja_logica]
+        if estado == 'inactivos':
+            return [i for i in items if i.baja_logica]
+        return items
+
+    def obtener(self, id: str) -> Optional[BaseModel]:
+        with self._lock:
+            return self._por_id.get(id)
+
+    def preimagen(self, id: str) -> Optional[Tuple[dict, Any]]:
+        """(datos, update_time) según la copia local: pre-imagen de un PATCH sin lectura (Doctrina Escritura con Retorno)."""
+        with self._lock:
+            item = self._por_id.get(id)
+            if item is None:
+                return None
+            return item.model_dump(exclude={'id'}), self._tiempos[id]
+
+    def buscar_por_clave(self, valor: str) -> Optional[BaseModel]:
+        with self._lock:
+            id_doc = self._por_clave.get(valor)
+            return self._por_id.get(id_doc) if id_doc is not None else None
@@ -0,0 +1,133 @@
+# backend/app/core/estadisticas.py
+# --- Doctrina Estadísticas: count / sum / avg resueltos por Firestore (sin transferir documentos) ---
+# Cada agregación es un solo RPC que recorre entradas de índice (1 lectura facturada cada 1000).
+# Los agrupados son una agregación por valor del grupo, en paralelo con tope de concurrencia.
+# Los resultados se cachean poco tiempo (por proceso): un tablero que refresca no repite las consultas.
+import os
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException, status
+from google.cloud.firestore_v1.base_query import FieldFilter
+from pydantic import BaseModel
+from .cache import CacheCatalogos
+from .exportacion import documentos_por_paginas
+from .masivo import en_paralelo
+
+# Máximo de grupos por consulta (una agregación por grupo)
+MAX_GRUPOS_ESTADISTICAS = 1000
+
+# Cache corto, aparte del de catálogos: las estadísticas toleran segundos de atraso
+cache_estadisticas = CacheCatalogos(
+    ttl=float(os.getenv("SL_STATS_TTL", "60")),
+    ventana_stale=float(os.getenv("SL_STATS_STALE", "0")),
+)
+
+
+class Estadistica(BaseModel):
+    """Resultado de una agregación: cantidad de documentos y, si se pidieron, sumas y promedios por campo."""
+    cantidad: int
+    sumas: Dict[str, Optional[Decimal]] = {}
+    promedios: Dict[str, Optional[Decimal]] = {}
+
+
+class GrupoEstadistica(Estadistica):
+    valor: Any
+
+
+class EstadisticasModel(BaseModel):
+    coleccion: str
+    estado: str
+    total: Estadistica
+    agrupado_por: Optional[str] = None
+    grupos: List[GrupoEstadistica] = []
+
+
+def parsear_lista(texto: Optional[str], permitidos: Iterable[str], parametro: str) -> Tuple[str, ...]:
+    """'a,b' -> ('a', 'b') validando contra los campos permitidos (400 si hay desconocidos)."""
+    if not texto:
+        return ()
+    pedidos = tuple(dict.fromkeys(c.strip() for c in texto.split(',') if c.strip()))
+    desconocidos = [c for c in pedidos if c not in permitidos]
+    if desconocidos:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Campos no válidos en '{parametro}': {', '.join(desconocidos)}")
+    return pedidos
+
+
+def filtro_estado(query, estado: str):
+    """Doctrina VIL (Filtro de Tres Vías) sobre la consulta a agregar."""
+    if estado == 'activos':
+        return query.where(filter=FieldFilter("baja_logica", "==", False))
+    if estado == 'inactivos':
+        return query.where(filter=FieldFilter("baja_logica", "==", True))
+    return query
+
+
+def _decimal(valor: Any, escala: int) -> Optional[Decimal]:
+    if valor is None:
+        return None
+    if not escala:
+        return Decimal(str(valor))
+    return Decimal(str(valor)).scaleb(-escala).quantize(Decimal(1).scaleb(-escala))
+
+
+async def agregar(query, sumas: Iterable[str] = (), promedios: Iterable[str] = (),
+                  escalas: Optional[Dict[str, int]] = None) -> Estadistica:
+    """
+    count() + sum() / avg() de los campos pedidos en una sola consulta de agregación.
+    'escalas' descuenta la Doctrina Precio Entero ({campo: exponente}) para devolver importes.
+    """
+    sumas, promedios, escalas = list(sumas), list(promedios), escalas or {}
+    consulta = query.count(alias='cantidad')
+    for campo in sumas:
+        consulta = consulta.sum(campo, alias=f"suma__{campo}")
+    for campo in promedios:
+        consulta = consulta.avg(campo, alias=f"promedio__{campo}")
+    valores = {r.alias: r.value for fila in await consulta.get() for r in fila}
+    return Estadistica(
+        cantidad=int(valores.get('cantidad') or 0),
+        sumas={c: _decimal(valores.get(f"suma__{c}"), escalas.get(c, 0)) for c in sumas},
+        promedios={c: _decimal(valores.get(f"promedio__{c}"), escalas.get(c, 0)) for c in promedios},
+    )
+
+
+async def valores_de_coleccion(db, coleccion: str, campo: Optional[str] = None) -> List[Any]:
+    """Valores posibles de un grupo: ids (o el campo clave) de la colección padre, con lectura proyectada."""
+    valores = []
+    async for doc in documentos_por_paginas(db.collection(coleccion).select([campo] if campo else ['__name__'])):
+        valores.append((doc.to_dict() or {}).get(campo) if campo else doc.id)
+    return [v for v in valores if v is not None]
+
+
+async def calcular_estadisticas(db, coleccion: str, estado: str = 'activos',
+                                filtros: Optional[Dict[str, Any]] = None,
+                                sumas: Tuple[str, ...] = (), promedios: Tuple[str, ...] = (),
+                                escalas: Optional[Dict[str, int]] = None,
+                                por: Optional[str] = None, grupos: Optional[List[Any]] = None) -> EstadisticasModel:
+    """
+    Total de la colección (con estado VIL y filtros de igualdad) y, si se indica 'por',
+    la misma agregación para cada valor de 'grupos' (consultas en paralelo).
+    Cacheado por combinación de parámetros durante SL_STATS_TTL segundos.
+    """
+    filtros = {c: v for c, v in (filtros or {}).items() if v is not None}
+    grupos = list(dict.fromkeys(grupos or []))
+    if len(grupos) > MAX_GRUPOS_ESTADISTICAS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Máximo {MAX_GRUPOS_ESTADISTICAS} grupos por consulta de estadísticas.")
+
+    async def cargar() -> EstadisticasModel:
+        query = filtro_estado(db.collection(coleccion), estado)
+        for campo, valor in filtros.items():
+            query = query.where(filter=FieldFilter(campo, "==", valor))
+
+        consultas = [agregar(query, sumas, promedios, escalas)]
+        for valor in grupos:
+            consultas.append(agregar(query.where(filter=FieldFilter(por, "==", valor)), sumas, promedios, escalas))
+        total, *por_grupo = await en_paralelo(consultas)
+        return EstadisticasModel(
+            coleccion=coleccion, estado=estado, total=total, agrupado_por=por,
+            grupos=[GrupoEstadistica(valor=v, **e.model_dump()) for v, e in zip(grupos, por_grupo)],
+        )
+
+    clave = (estado, tuple(sorted(filtros.items())), sumas, promedios, por, tuple(grupos))
+    return await cache_estadisticas.obtener(coleccion, clave, cargar)
@@ -0,0 +1,94 @@
+# backend/app/core/exportacion.py
+# --- Doctrina Exportación: volcado de colecciones en streaming (memoria constante) ---
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable, Optional, Type
+from fastapi.responses import StreamingResponse
+from google.cloud.firestore_v1.field_path import FieldPath
+from pydantic import BaseModel
+
+# Documentos por consulta: cada página es un stream corto (sin deadlines de consultas eternas)
+PAGINA_EXPORTACION = 1000
+# Filas por trozo enviado al cliente
+FILAS_POR_TROZO = 100
+
+TIPOS_EXPORTACION = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+PATRON_FORMATO_EXPORTACION = '^(ndjson|csv)$'
+
+
+async def documentos_por_paginas(query, tamano: int = PAGINA_EXPORTACION):
+    """Recorre la consulta completa en páginas ordenadas por id, entregando cada documento al llegar."""
+    ultimo_id = None
+    while True:
+        pagina = query.order_by(FieldPath.document_id())
+        if ultimo_id is not None:
+            pagina = pagina.start_after({FieldPath.document_id(): ultimo_id})
+        leidos = 0
+        async for doc in pagina.limit(tamano).stream():
+            leidos += 1
+            ultimo_id = doc.id
+            yield doc
+        if leidos < tamano:
+            return
+
+
+def _celda_csv(valor) -> str:
+    # Mismo formato que acepta la Doctrina Importación: listas y sub-modelos como JSON
+    if valor is None:
+        return ''
+    if isinstance(valor, (dict, list, bool)):
+        return json.dumps(valor, ensure_ascii=False)
+    return str(valor)
+
+
+async def exportar_consulta(query, modelo: Type[BaseModel], formato: str,
+                            decodificar: Optional[Callable[[dict], dict]] = None) -> AsyncIterator[bytes]:
+    """
+    Serializa cada documento de 'query' (validado con 'modelo') como NDJSON o CSV.
+    'decodificar(datos)' adapta el formato de Firestore al del modelo (p.ej. precios enteros).
+    Solo vive en memoria un trozo de FILAS_POR_TROZO filas.
+    """
+    columnas = list(modelo.model_fields)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    if formato == 'csv':
+        escritor.writerow(columnas)
+
+    filas = 0
+    async for doc in documentos_por_paginas(query):
+        datos = doc.to_dict()
+        datos['id'] = doc.id
+        try:
+            if decodificar is not None:
+                datos = decodificar(datos)
+            item = modelo.model_validate(datos).model_dump(mode='json')
+        except Exception as e:
+            print(f"ADVERTENCIA: Documento inválido omitido en exportación '{doc.id}': {e}")
+            continue
+
+        if formato == 'csv':
+            escritor.writerow([_celda_csv(item.get(c)) for c in columnas])
+        else:
+            buffer.write(json.dumps(item, ensure_ascii=False))
+            buffer.write('\n')
+
+        filas += 1
+        if filas % FILAS_POR_TROZO == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def respuesta_exportacion(contenido: AsyncIterator[bytes], coleccion: str, formato: str) -> StreamingResponse:
+    return StreamingResponse(
+        contenido,
+        media_type=TIPOS_EXPORTACION[formato],
+        headers={'Content-Disposition': f'attachment; filename="{coleccion}.{formato}"'},
+    )
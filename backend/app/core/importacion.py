@@ -0,0 +1,254 @@
+# backend/app/core/importacion.py
+# --- Doctrina Importación: lectura en streaming + lotes encadenados (memoria acotada) ---
+import asyncio
+import codecs
+import csv
+import json
+import tempfile
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from .masivo import MAX_OPERACIONES_LOTE
+
+# Filas por trozo (la versión se mueve aparte, una vez por importación: ver 'al_terminar')
+TAMANO_LOTE_IMPORTACION = MAX_OPERACIONES_LOTE
+# Commits en vuelo mientras se lee y valida el trozo siguiente
+LOTES_EN_VUELO = 4
+# Un campo entre comillas sin cerrar no puede acumular el resto del archivo
+MAX_LINEAS_REGISTRO = 100
+# Lectura por trozos y tope en RAM del archivo recibido (el excedente va a disco)
+TAMANO_LECTURA = 1 << 16
+MAX_MEMORIA_ARCHIVO = 8 << 20
+
+Fila = Tuple[int, Any]  # (número de fila de datos, dict | Exception)
+
+
+async def guardar_cuerpo(trozos: AsyncIterator[bytes]):
+    """
+    Vuelca el cuerpo del request a un archivo temporal (en RAM hasta 8 MiB, luego en disco).
+    Necesario porque StreamingResponse escucha 'receive' mientras responde:
+    el cuerpo no puede leerse en paralelo con el envío de eventos.
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORIA_ARCHIVO)
+    async for trozo in trozos:
+        archivo.write(trozo)
+    archivo.seek(0)
+    return archivo
+
+
+async def trozos_de_archivo(archivo) -> AsyncIterator[bytes]:
+    """Lee un archivo binario por trozos sin bloquear el event loop."""
+    while True:
+        trozo = await asyncio.to_thread(archivo.read, TAMANO_LECTURA)
+        if not trozo:
+            break
+        yield trozo
+
+
+async def lineas_desde_bytes(trozos: AsyncIterator[bytes], codificacion: str = 'utf-8-sig') -> AsyncIterator[str]:
+    """Convierte un flujo de bytes en líneas de texto sin cargar el archivo completo."""
+    decodificador = codecs.getincrementaldecoder(codificacion)(errors='replace')
+    resto = ''
+    async for trozo in trozos:
+        lineas = (resto + decodificador.decode(trozo)).split('\n')
+        resto = lineas.pop()
+        for linea in lineas:
+            yield linea.rstrip('\r')
+    resto += decodificador.decode(b'', final=True)
+    if resto:
+        yield resto.rstrip('\r')
+
+
+def _anidar(encabezado: List[str], valores: List[str]) -> dict:
+    """
+    Arma el dict de una fila CSV:
+    - celdas vacías se omiten (aplican los defaults del modelo)
+    - 'a.b' en el encabezado -> {'a': {'b': ...}}
+    - celdas que empiezan con '[' o '{' se leen como JSON (listas y sub-modelos)
+    """
+    fila: dict = {}
+    for columna, valor in zip(encabezado, valores):
+        valor = valor.strip()
+        if not valor:
+            continue
+        if valor[0] in '[{':
+            try:
+                valor = json.loads(valor)
+            except ValueError:
+                pass  # Lo rechaza la validación del modelo
+        destino = fila
+        *padres, hoja = columna.split('.')
+        for padre in padres:
+            destino = destino.setdefault(padre, {})
+        destino[hoja] = valor
+    return fila
+
+
+async def filas_csv(trozos: AsyncIterator[bytes], separador: str = ',') -> AsyncIterator[Fila]:
+    """
+    Lee un CSV con encabezado fila por fila.
+    Los errores de formato no cortan la importación: se devuelven como Exception en su fila.
+    """
+    encabezado = None
+    pendiente: List[str] = []
+    numero = 0
+    async for linea in lineas_desde_bytes(trozos):
+        pendiente.append(linea)
+        registro = '\n'.join(pendiente)
+        # Comillas impares: el campo sigue en la línea siguiente
+        if registro.count('"') % 2 and len(pendiente) < MAX_LINEAS_REGISTRO:
+            continue
+        pendiente = []
+        if not registro.strip():
+            continue
+
+        if encabezado is None:
+            encabezado = [c.strip() for c in next(csv.reader([registro], delimiter=separador))]
+            continue
+
+        numero += 1
+        if registro.count('"') % 2:
+            yield numero, ValueError("Comillas sin cerrar en el registro.")
+            continue
+        valores = next(csv.reader([registro], delimiter=separador))
+        if len(valores) != len(encabezado):
+            yield numero, ValueError(f"Se esperaban {len(encabezado)} columnas y hay {len(valores)}.")
+            continue
+        yield numero, _anidar(encabezado, valores)
+
+    if pendiente and '\n'.join(pendiente).strip():
+        yield numero + 1, ValueError("Comillas sin cerrar al final del archivo.")
+
+
+async def filas_ndjson(trozos: AsyncIterator[bytes]) -> AsyncIterator[Fila]:
+    """Lee NDJSON (un objeto JSON por línea)."""
+    numero = 0
+    async for linea in lineas_desde_bytes(trozos):
+        if not linea.strip():
+            continue
+        numero += 1
+        try:
+            datos = json.loads(linea)
+        except ValueError as e:
+            yield numero, ValueError(f"JSON inválido: {e}")
+            continue
+        if not isinstance(datos, dict):
+            yield numero, ValueError("Cada línea debe ser un objeto JSON.")
+            continue
+        yield numero, datos
+
+
+async def trozos_de_filas(filas: AsyncIterator[Fila], tamano: int) -> AsyncIterator[List[Fila]]:
+    trozo: List[Fila] = []
+    async for fila in filas:
+        trozo.append(fila)
+        if len(trozo) >= tamano:
+            yield trozo
+            trozo = []
+    if trozo:
+        yield trozo
+
+
+class ResumenImportacion:
+    """Contadores de progreso y velocidad de un proceso por lotes ('etiqueta' nombra lo confirmado)."""
+
+    def __init__(self, etiqueta: str = 'creados'):
+        self.etiqueta = etiqueta
+        self.inicio = time.monotonic()
+        self.filas = 0
+        self.confirmados = 0
+        self.errores = 0
+
+    def evento(self, tipo: str) -> dict:
+        segundos = time.monotonic() - self.inicio
+        return {
+            "evento": tipo,
+            "filas": self.filas,
+            self.etiqueta: self.confirmados,
+            "errores": self.errores,
+            "segundos": round(segundos, 2),
+            "filas_por_segundo": round(self.filas / segundos, 1) if segundos > 0 else 0.0,
+        }
+
+
+async def importar_en_lotes(
+    filas: AsyncIterator[Fila],
+    preparar: Callable[[List[Fila]], Awaitable[Tuple[List[Fila], List[Fila]]]],
+    escribir: Callable[[List[Fila]], Awaitable[Optional[List[Optional[str]]]]],
+    tamano_lote: int = TAMANO_LOTE_IMPORTACION,
+    en_vuelo: int = LOTES_EN_VUELO,
+    etiqueta: str = 'creados',
+    al_terminar: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> AsyncIterator[dict]:
+    """
+    Pipeline de importación:
+    1. Lee 'tamano_lote' filas del flujo.
+    2. 'preparar(trozo)' valida y devuelve (listos, errores), ambos como [(fila, dato)].
+    3. 'escribir(listos)' confirma el trozo; hasta 'en_vuelo' corren mientras se lee y valida
+       el siguiente. Si lo reparte en varios WriteBatch devuelve, por fila, None o el error de su
+       lote (como confirmar_lotes); si devuelve None o lanza, el trozo cuenta entero.
+    4. 'al_terminar()' corre una vez, con todos los commits terminados y si alguno se confirmó
+       (Doctrina Versiones: una sola escritura de versión por importación, no una por lote).
+    Emite eventos: 'error' (uno por fila rechazada), 'progreso' (por lote confirmado) y 'fin'.
+    En memoria solo viven los trozos en vuelo, nunca el archivo completo.
+    """
+    resumen = ResumenImportacion(etiqueta)
+    pendientes: List[Tuple[asyncio.Task, List[Fila]]] = []
+    terminado = False
+
+    async def esperar_mas_antiguo():
+        tarea, listos = pendientes.pop(0)
+        try:
+            errores = await tarea
+        except Exception as e:
+            errores = [f"Error al confirmar el lote: {e}"] * len(listos)
+        eventos = []
+        for (fila, _), error in zip(listos, errores or [None] * len(listos)):
+            if error is None:
+                resumen.confirmados += 1
+            else:
+                resumen.errores += 1
+                eventos.append({"evento": "error", "fila": fila, "detalle": error})
+        return eventos + [resumen.evento("progreso")]
+
+    try:
+        async for trozo in trozos_de_filas(filas, tamano_lote):
+            resumen.filas += len(trozo)
+            listos, errores = await preparar(trozo)
+            resumen.errores += len(errores)
+            for fila, detalle in errores:
+                yield {"evento": "error", "fila": fila, "detalle": detalle}
+
+            if listos:
+                pendientes.append((asyncio.ensure_future(escribir(listos)), listos))
+            while len(pendientes) >= en_vuelo:
+                for evento in await esperar_mas_antiguo():
+                    yield evento
+            if not listos:
+                yield resumen.evento("progreso")
+
+        while pendientes:
+            for evento in await esperar_mas_antiguo():
+                yield evento
+        terminado = True
+        if al_terminar is not None and resumen.confirmados:
+            await al_terminar()
+        yield resumen.evento("fin")
+    finally:
+        # Corte del cliente: los commits ya enviados terminan solos; no dejar excepciones sin leer
+        for tarea, _ in pendientes:
+            tarea.add_done_callback(lambda t: t.cancelled() or t.exception())
+        if al_terminar is not None and not terminado and (resumen.confirmados or pendientes):
+            cierre = asyncio.ensure_future(_al_terminar_en_fondo([t for t, _ in pendientes], al_terminar))
+            cierre.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def _al_terminar_en_fondo(tareas: List[asyncio.Task], al_terminar: Callable[[], Awaitable[Any]]):
+    """Importación cortada: 'al_terminar' corre igual, cuando terminan los commits que quedaron en vuelo."""
+    await asyncio.gather(*tareas, return_exceptions=True)
+    await al_terminar()
+
+
+async def eventos_ndjson(eventos: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Serializa eventos como NDJSON para StreamingResponse."""
+    async for evento in eventos:
+        yield (json.dumps(evento, ensure_ascii=False, default=str) + '\n').encode('utf-8')
@@ -0,0 +1,127 @@
+# backend/app/core/lectura.py
+# --- Doctrina Lectura Confiable: validación por página (TypeAdapter precompilado) y JSON directo ---
+# Lo leído de nuestra propia base se valida una sola vez, con la página completa en una llamada a
+# pydantic-core (el bucle corre en Rust), y sale serializado a bytes con el serializador compilado
+# del modelo. La respuesta es un Response ya armado: FastAPI no vuelve a validar ni a serializar
+# contra el response_model (que queda para la documentación OpenAPI).
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Generic, Iterable, List, Optional, Type, TypeVar
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+M = TypeVar('M', bound=BaseModel)
+
+
+class LecturaPorIds(BaseModel, Generic[M]):
+    """Resultado de un batch-get: encontrados en el orden pedido + ids inexistentes."""
+    items: List[M]
+    faltantes: List[str]
+
+
+@lru_cache(maxsize=256)
+def adaptador_lista(modelo: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter(List[modelo]), construido (y compilado) una sola vez por modelo o proyección."""
+    return TypeAdapter(List[modelo])
+
+
+def validar_documentos(modelo: Type[BaseModel], docs: Iterable,
+                       decodificar: Optional[Callable[[dict], dict]] = None) -> List[BaseModel]:
+    """
+    Snapshots -> modelos con el id adjunto. Mismo resultado que model_validate por documento
+    (alias, coerción de Decimal), en una sola validación de la lista.
+    'decodificar(datos)' adapta el formato de Firestore al del modelo (p.ej. precios enteros).
+    """
+    filas = []
+    for doc in docs:
+        datos = doc.to_dict()
+        if decodificar is not None:
+            datos = decodificar(datos)
+        datos['id'] = doc.id
+        filas.append(datos)
+    return adaptador_lista(modelo).validate_python(filas)
+
+
+def json_lista(items: List[BaseModel]) -> bytes:
+    """Lista homogénea de modelos (completos o recortados) -> JSON en bytes."""
+    if not items:
+        return b'[]'
+    return adaptador_lista(type(items[0])).dump_json(items)
+
+
+def responder(response: Response, contenido: Any) -> Response:
+    """
+    Cuerpo JSON ya serializado para un modelo, una lista de modelos o una Pagina (cuerpo memoizado:
+    las páginas del cache de catálogos se serializan una sola vez). Conserva las cabeceras ya
+    publicadas en 'response' (ETag, cursor).
+    """
+    from .paginacion import Pagina
+
+    if isinstance(contenido, Pagina):
+        cuerpo = contenido.json()
+    elif isinstance(contenido, BaseModel):
+        cuerpo = contenido.__pydantic_serializer__.to_json(contenido)
+    else:
+        cuerpo = json_lista(list(contenido))
+    cabeceras = {k: v for k, v in response.headers.items() if k.lower() != 'content-length'}
+    return Response(content=cuerpo, media_type='application/json', headers=cabeceras)
+
+
+
+async def modelos_por_ids(db, coleccion: str, modelo: Type[BaseModel], ids: List[str],
+                          mascara: Optional[List[str]] = None) -> Dict[str, BaseModel]:
+    """get_all agrupado + validación de la página entera: {id: modelo} de los existentes."""
+    from .masivo import leer_documentos
+
+    snaps = await leer_documentos(db, coleccion, ids, mascara)
+    return {item.id: item for item in validar_documentos(modelo, snaps.values())}
+
+
+async def en_cache_catalogos(db, coleccion: str, modelo: Type[BaseModel],
+                             campos=None) -> Optional[Callable[[str], Optional[BaseModel]]]:
+    """
+    Búsqueda por id sobre los listados ya cacheados de la colección (Doctrina Cache de Catálogos),
+    para usar como 'en_memoria' de leer_por_ids. Solo se usan páginas de modelos completos cargadas
+    con la versión vigente; sin nada cacheado devuelve None y no lee la versión.
+    """
+    from .cache import cache_catalogos
+    from .proyeccion import recortar
+    from .versiones import version_vigente
+
+    if not cache_catalogos.tiene(coleccion):
+        return None
+    version = await version_vigente(db, coleccion)
+    indice: Dict[str, BaseModel] = {}
+    for valor in cache_catalogos.vigentes(coleccion, version):
+        for item in getattr(valor, 'items', ()):
+            if type(item) is modelo:
+                indice[item.id] = item
+    if not indice:
+        return None
+
+    def en_memoria(doc_id: str) -> Optional[BaseModel]:
+        item = indice.get(doc_id)
+        return recortar(item, campos) if item is not None else None
+
+    return en_memoria
+
+
+async def leer_por_ids(modelo: Type[BaseModel], ids: List[str],
+                       leer: Callable[[List[str]], Awaitable[Dict[str, BaseModel]]],
+                       en_memoria: Optional[Callable[[str], Optional[BaseModel]]] = None) -> LecturaPorIds:
+    """
+    Batch-get: primero la copia en memoria ('en_memoria(id)', p.ej. el Espejo) y después una
+    lectura agrupada ('leer(ids)' -> {id: modelo}, un get_all de hasta 500 refs por RPC) para el resto.
+    Respeta el orden pedido; los ids repetidos se devuelven una vez.
+    """
+    orden = list(dict.fromkeys(ids))
+    encontrados: Dict[str, BaseModel] = {}
+    if en_memoria is not None:
+        for doc_id in orden:
+            item = en_memoria(doc_id)
+            if item is not None:
+                encontrados[doc_id] = item
+    pendientes = [doc_id for doc_id in orden if doc_id not in encontrados]
+    if pendientes:
+        encontrados.update(await leer(pendientes))
+    return LecturaPorIds[modelo](items=[encontrados[i] for i in orden if i in encontrados],
+                                 faltantes=[i for i in orden if i not in encontrados])
@@ -0,0 +1,266 @@
+# backend/app/core/masivo.py
+# --- Doctrina Operaciones Masivas: ABR agrupado (Claves Únicas) y WriteBatch troceados ---
+import asyncio
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from .claves_unicas import claves_existentes, datos_clave, ref_clave, reservar_clave
+from .versiones import confirmar_version
+
+# Límites de Firestore
+MAX_OPERACIONES_LOTE = 500   # escrituras por WriteBatch
+
+# Límites propios
+MAX_ITEMS_MASIVO = 10000     # items por request masivo
+CONCURRENCIA_MASIVA = 8      # RPCs simultáneos (consultas o commits)
+
+
+class ResultadoItemMasivo(BaseModel):
+    """Resultado por item de una operación masiva (mismo orden que la entrada)."""
+    indice: int
+    status: str  # 'CREADO' | 'EXISTE_ACTIVO' | 'EXISTE_INACTIVO' | 'BAJA' | 'REACTIVADO' | 'SIN_CAMBIOS'
+                 # | 'NO_ENCONTRADO' | 'TIENE_HIJOS_ACTIVOS' | 'ERROR'
+    id: Optional[str] = None
+    detalle: Optional[Any] = None
+
+
+class IdsMasivo(BaseModel):
+    """Cuerpo de las operaciones masivas por id (baja / reactivación / batch-get)."""
+    ids: List[str]
+
+
+def trocear(items: List[Any], tamano: int) -> Iterable[List[Any]]:
+    for inicio in range(0, len(items), tamano):
+        yield items[inicio:inicio + tamano]
+
+
+def validar_tamano_masivo(items: List[Any]):
+    if len(items) > MAX_ITEMS_MASIVO:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Máximo {MAX_ITEMS_MASIVO} items por operación masiva.")
+
+
+async def en_paralelo(corrutinas: List[Any], limite: int = CONCURRENCIA_MASIVA) -> List[Any]:
+    """asyncio.gather con tope de concurrencia (no saturar el canal gRPC)."""
+    semaforo = asyncio.Semaphore(limite)
+
+    async def con_tope(corrutina):
+        async with semaforo:
+            return await corrutina
+
+    return await asyncio.gather(*(con_tope(c) for c in corrutinas))
+
+
+async def confirmar_lotes(db, coleccion: str, operaciones: List[Any],
+                          aplicar: Callable[[Any, Any], None], ops_por_item: int = 1,
+                          cierre: Optional[Callable[[Any, List[Any]], None]] = None,
+                          versionar: bool = True, versiones: Iterable[str] = ()) -> List[Optional[str]]:
+    """
+    Confirma 'operaciones' en WriteBatch troceados dentro del límite de 500 escrituras
+    y los envía en paralelo.
+    'aplicar(lote, operacion)' agrega las escrituras de cada item.
+    'cierre(lote, trozo)' agrega escrituras agregadas por lote (p.ej. contadores de referencias);
+    deben entrar en el presupuesto de 'ops_por_item'.
+    Doctrina Versiones: con 'versionar', la versión de la colección se mueve una sola vez, después
+    de los lotes y si alguno se confirmó (no una escritura al mismo documento por lote).
+    'versiones': otras colecciones a mover en ese mismo commit (p.ej. los padres cuyos contadores de
+    referencias tocó 'cierre'; se recorre después de los lotes, así el cierre puede completarla).
+    Devuelve, por operación, None si se confirmó o el texto del error de su lote.
+    """
+    por_lote = max(1, MAX_OPERACIONES_LOTE // ops_por_item)
+    trozos = list(trocear(operaciones, por_lote))
+
+    async def confirmar(trozo):
+        lote = db.batch()
+        for operacion in trozo:
+            aplicar(lote, operacion)
+        if cierre is not None:
+            cierre(lote, trozo)
+        try:
+            await lote.commit()
+            return [None] * len(trozo)
+        except Exception as e:
+            return [f"Error al confirmar el lote: {e}"] * len(trozo)
+
+    errores: List[Optional[str]] = []
+    for resultado in await en_paralelo([confirmar(t) for t in trozos]):
+        errores.extend(resultado)
+    if versionar and any(e is None for e in errores):
+        await confirmar_version(db, coleccion, *sorted(set(versiones) - {coleccion}))
+    return errores
+
+
+async def crear_masivo(db, coleccion: str, campo_clave: str, registros: List[dict],
+                       conflicto: Callable[[str, dict], Tuple[str, Any]],
+                       extra: Optional[Callable[[Any, Any, dict], None]] = None,
+                       ops_por_item: int = 1,
+                       cierre: Optional[Callable[[Any, List[dict]], None]] = None,
+                       versiones: Iterable[str] = ()) -> List[ResultadoItemMasivo]:
+    """
+    Alta masiva con Doctrina ABR agrupada:
+    1. Duplicados contra la base: lectura agrupada de las claves únicas (get_all, no una transacción por item).
+    2. Duplicados dentro del mismo request: gana la primera aparición; las repeticiones se resuelven
+       recién con su lote confirmado (si falló, se informan como ERROR).
+    3. Escritura en WriteBatch troceados; cada alta crea su clave en el mismo lote.
+    'conflicto(doc_id, datos)' traduce un duplicado a (status, detalle) con el payload propio del módulo.
+    'extra(lote, ref, datos)' agrega escrituras adicionales por item (p.ej. contadores).
+    'cierre(lote, registros)' agrega escrituras una vez por lote con los registros que confirma
+    (p.ej. los Increment de referencias agregados por padre: un solo write por documento padre);
+    'versiones' pasa a confirmar_lotes las colecciones padre que el cierre haya tocado.
+    Un alta concurrente sobre la misma clave hace fallar el create de la clave: su lote se informa como ERROR.
+    """
+    existentes = await claves_existentes(db, coleccion, (r.get(campo_clave) for r in registros))
+
+    resultados: List[ResultadoItemMasivo] = []
+    pendientes = []
+    # clave -> posición en 'pendientes' de su primera aparición; (indice, posición) de las repeticiones
+    primeras: Dict[Any, int] = {}
+    repetidos: List[Tuple[int, int]] = []
+    for indice, datos in enumerate(registros):
+        clave = datos.get(campo_clave)
+        if clave in existentes:
+            doc_id, previo = existentes[clave]
+            estado, detalle = conflicto(doc_id, previo)
+            resultados.append(ResultadoItemMasivo(indice=indice, status=estado, id=doc_id, detalle=detalle))
+            continue
+        if clave in primeras:
+            repetidos.append((indice, primeras[clave]))
+            resultados.append(None)
+            continue
+
+        ref = db.collection(coleccion).document()
+        primeras[clave] = len(pendientes)
+        pendientes.append((indice, ref, datos))
+        resultados.append(ResultadoItemMasivo(indice=indice, status='CREADO', id=ref.id))
+
+    def aplicar(lote, pendiente):
+        _, ref, datos = pendiente
+        # 'extra' corre antes del create: puede completar 'datos' (p.ej. el id soberano)
+        if extra is not None:
+            extra(lote, ref, datos)
+        lote.create(ref, datos)
+        reservar_clave(lote, db, coleccion, campo_clave, datos.get(campo_clave), ref.id, datos.get('baja_logica', False))
+
+    cierre_lote = None
+    if cierre is not None:
+        def cierre_lote(lote, trozo):
+            cierre(lote, [datos for _, _, datos in trozo])
+
+    errores = await confirmar_lotes(db, coleccion, pendientes, aplicar, ops_por_item + 1, cierre_lote,
+                                    versiones=versiones)
+    for (indice, _, _), error in zip(pendientes, errores):
+        if error is not None:
+            resultados[indice] = ResultadoItemMasivo(indice=indice, status='ERROR', detalle=error)
+    for indice, posicion in repetidos:
+        _, ref, datos = pendientes[posicion]
+        if errores[posicion] is None:
+            estado, detalle = conflicto(ref.id, datos)
+            resultados[indice] = ResultadoItemMasivo(indice=indice, status=estado, id=ref.id, detalle=detalle)
+        else:
+            resultados[indice] = ResultadoItemMasivo(
+                indice=indice, status='ERROR',
+                detalle=f"Repetido del item {pendientes[posicion][0]}, que no se pudo crear: {errores[posicion]}")
+    return resultados
+
+
+def id_valido(valor: Any) -> bool:
+    """Id de documento utilizable en una referencia ('/' lo convertiría en una ruta)."""
+    return isinstance(valor, str) and bool(valor) and '/' not in valor
+
+
+async def leer_documentos(db, coleccion: str, ids: Iterable[str],
+                          campos: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Lecturas puntuales agrupadas (get_all de hasta 500 refs, en paralelo): {id: snapshot} de los existentes."""
+    unicos = list(dict.fromkeys(i for i in ids if id_valido(i)))
+
+    async def leer(trozo):
+        refs = [db.collection(coleccion).document(i) for i in trozo]
+        return [snap async for snap in db.get_all(refs, field_paths=campos) if snap.exists]
+
+    encontrados: Dict[str, Any] = {}
+    for snaps in await en_paralelo([leer(t) for t in trocear(unicos, MAX_OPERACIONES_LOTE)]):
+        for snap in snaps:
+            encontrados[snap.id] = snap
+    return encontrados
+
+
+async def cambiar_estado_masivo(db, coleccion: str, campo_clave: str, ids: List[str], baja: bool,
+                                mensaje_hijos: Optional[str] = None) -> List[ResultadoItemMasivo]:
+    """
+    Baja lógica (baja=True) o reactivación masiva (Doctrina VIL) de una lista de ids:
+    1. Una lectura agrupada de todos los documentos (estado, clave, contadores y relaciones).
+    2. Anti-orfandad del conjunto sobre los contadores leídos (Doctrina Referencias): sin
+       consultar las colecciones hijas. Solo aplica a la baja.
+    3. WriteBatch troceados: estado + clave única (+ Increment en los padres si la colección es hija,
+       agregados por lote). Cada update va condicionado a la update_time leída: si el documento
+       cambió en el medio, su lote se informa como ERROR y se puede reintentar.
+    Resultado por id, en el mismo orden: BAJA / REACTIVADO, SIN_CAMBIOS (ya estaba en ese estado
+    o repetido en el request), NO_ENCONTRADO, TIENE_HIJOS_ACTIVOS o ERROR.
+    """
+    from .referencias import (
+        CAMPO_REFERENCIAS, RELACIONES, colecciones_padre, deltas_referencias, escribir_referencias,
+        hijos_activos, incrementos, resolver_padres,
+    )
+
+    relaciones = RELACIONES.get(coleccion, {})
+    campos = [campo_clave, 'baja_logica', CAMPO_REFERENCIAS] + list(relaciones)
+    leidos = await leer_documentos(db, coleccion, ids, campos)
+
+    resultados: List[ResultadoItemMasivo] = []
+    pendientes = []
+    vistos = set()
+    for indice, doc_id in enumerate(ids):
+        snap = leidos.get(doc_id)
+        if snap is None:
+            resultados.append(ResultadoItemMasivo(indice=indice, status='NO_ENCONTRADO', id=doc_id))
+            continue
+        if doc_id in vistos:
+            resultados.append(ResultadoItemMasivo(indice=indice, status='SIN_CAMBIOS', id=doc_id,
+                                                  detalle="Id repetido en el request."))
+            continue
+        vistos.add(doc_id)
+        datos = snap.to_dict()
+        if datos.get('baja_logica', False) == baja:
+            resultados.append(ResultadoItemMasivo(indice=indice, status='SIN_CAMBIOS', id=doc_id))
+            continue
+        activos = hijos_activos(datos) if baja else {}
+        if activos:
+            resultados.append(ResultadoItemMasivo(indice=indice, status='TIENE_HIJOS_ACTIVOS', id=doc_id,
+                                                  detalle={"message": mensaje_hijos, "referencias": activos}))
+            continue
+        pendientes.append((indice, snap, datos))
+        resultados.append(ResultadoItemMasivo(indice=indice, status='BAJA' if baja else 'REACTIVADO', id=doc_id))
+
+    cambio = {'baja_logica': baja}
+    cierre = None
+    padres_tocados = set()
+    ops_por_item = 2  # estado + clave única
+    if relaciones:
+        # Doctrina Referencias: padres resueltos una vez para todo el conjunto
+        deltas = {snap.id: deltas_referencias(coleccion, datos, {**datos, **cambio}) for _, snap, datos in pendientes}
+        padres = await resolver_padres(db, (p for d in deltas.values() for p in d))
+        ops_por_item += len(relaciones)
+
+        def cierre(lote, trozo):
+            agregados = Counter()
+            for _, snap, _ in trozo:
+                agregados.update(deltas[snap.id])
+            cambios = incrementos(agregados, padres)
+            escribir_referencias(lote, coleccion, cambios)
+            padres_tocados.update(colecciones_padre(cambios))
+
+    def aplicar(lote, pendiente):
+        _, snap, datos = pendiente
+        lote.update(snap.reference, cambio, option=db.write_option(last_update_time=snap.update_time))
+        valor = datos.get(campo_clave)
+        if valor is not None:
+            # set: también completa las claves de documentos anteriores a la doctrina
+            lote.set(ref_clave(db, coleccion, valor), datos_clave(coleccion, campo_clave, valor, snap.id, baja))
+
+    errores = await confirmar_lotes(db, coleccion, pendientes, aplicar, ops_por_item, cierre,
+                                    versiones=padres_tocados)
+    for (indice, snap, _), error in zip(pendientes, errores):
+        if error is not None:
+            resultados[indice] = ResultadoItemMasivo(indice=indice, status='ERROR', id=snap.id, detalle=error)
+    return resultados
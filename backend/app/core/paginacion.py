@@ -0,0 +1,109 @@
+# backend/app/core/paginacion.py
+# --- Doctrina Paginación: cursores opacos y tope de página del lado del servidor ---
+import base64
+import binascii
+import json
+import os
+from typing import Any, Callable, List, Optional
+from fastapi import HTTPException, Response, status
+from google.cloud.firestore_v1.field_path import FieldPath
+from .lectura import json_lista
+
+# Tope duro de página: ningún listado devuelve más de esto por request
+LIMITE_MAXIMO_PAGINA = int(os.getenv("SL_LIMITE_MAXIMO_PAGINA", "500"))
+
+# El cursor de la página siguiente viaja en una cabecera (el cuerpo sigue siendo la lista)
+CABECERA_CURSOR = "X-Siguiente-Cursor"
+
+
+class Pagina:
+    """Resultado de un listado paginado."""
+    __slots__ = ("items", "siguiente_cursor", "_json")
+
+    def __init__(self, items: List[Any], siguiente_cursor: Optional[str] = None):
+        self.items = items
+        self.siguiente_cursor = siguiente_cursor
+        self._json: Optional[bytes] = None
+
+    def json(self) -> bytes:
+        """Cuerpo JSON de la página (Doctrina Lectura Confiable), serializado en el primer uso."""
+        if self._json is None:
+            self._json = json_lista(self.items)
+        return self._json
+
+
+def normalizar_limite(limite: Optional[int]) -> int:
+    """Sin límite (o fuera de rango) se aplica el tope del servidor."""
+    if limite is None or limite > LIMITE_MAXIMO_PAGINA:
+        return LIMITE_MAXIMO_PAGINA
+    return max(1, limite)
+
+
+def codificar_cursor(valores: List[Any]) -> str:
+    crudo = json.dumps(valores, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> List[Any]:
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        valores = None
+    if not isinstance(valores, list) or not valores:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
+    return valores
+
+
+async def paginar_consulta(query, limite: Optional[int], cursor: Optional[str],
+                           orden: Optional[str] = None, descendente: bool = False):
+    """
+    Aplica order_by(id de documento) + start_after(cursor) + limit(n + 1) a la consulta.
+    Devuelve (snapshots de la página, cursor siguiente o None).
+    Ordenar por id no requiere índices compuestos junto a los filtros de igualdad.
+    Con 'orden' la consulta se ordena por ese campo (y por id para desempatar) y el cursor
+    lleva [valor, id]; los filtros de igualdad necesitan entonces los índices de firestore.indexes.json.
+    """
+    limite = normalizar_limite(limite)
+    direccion = 'DESCENDING' if descendente else 'ASCENDING'
+    if orden:
+        query = query.order_by(orden, direction=direccion)
+    query = query.order_by(FieldPath.document_id(), direction=direccion)
+    if cursor:
+        valores = decodificar_cursor(cursor)
+        # Un cursor de otro orden no sirve: [id] sin orden, [valor, id] con orden
+        if len(valores) != (2 if orden else 1):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido")
+        if orden:
+            query = query.start_after({orden: valores[0], FieldPath.document_id(): valores[1]})
+        else:
+            query = query.start_after({FieldPath.document_id(): valores[0]})
+
+    # Se pide uno de más para saber si existe una página siguiente sin otra lectura
+    docs = [doc async for doc in query.limit(limite + 1).stream()]
+    if len(docs) > limite:
+        docs = docs[:limite]
+        ultimo = docs[-1]
+        return docs, codificar_cursor([ultimo.get(orden), ultimo.id] if orden else [ultimo.id])
+    return docs, None
+
+
+def paginar_lista(items: List[Any], limite: Optional[int], cursor: Optional[str],
+                  clave: Callable[[Any], str] = lambda item: item.id) -> Pagina:
+    """Misma semántica que paginar_consulta, para datos ya en memoria (Espejo)."""
+    limite = normalizar_limite(limite)
+    ordenados = sorted(items, key=clave)
+    if cursor:
+        (ultimo_id,) = decodificar_cursor(cursor)[:1]
+        ordenados = [item for item in ordenados if clave(item) > ultimo_id]
+    if len(ordenados) > limite:
+        pagina = ordenados[:limite]
+        return Pagina(pagina, codificar_cursor([clave(pagina[-1])]))
+    return Pagina(ordenados)
+
+
+def aplicar_cursor(response: Response, pagina: Pagina) -> Pagina:
+    """Publica el cursor siguiente en la cabecera y devuelve la página para el cuerpo."""
+    if pagina.siguiente_cursor:
+        response.headers[CABECERA_CURSOR] = pagina.siguiente_cursor
+    return pagina
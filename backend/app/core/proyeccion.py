@@ -0,0 +1,49 @@
+# backend/app/core/proyeccion.py
+# --- Doctrina Proyección: '?fields=' baja a Firestore como select() y recorta el modelo ---
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type
+from fastapi import HTTPException, status
+from pydantic import BaseModel, create_model
+
+Campos = Optional[Tuple[str, ...]]
+
+# El id viaja siempre: las grillas lo necesitan para Editar / Baja
+CAMPO_ID = 'id'
+
+
+def parsear_campos(fields: Optional[str], modelo: Type[BaseModel]) -> Campos:
+    """
+    'nombre,codigo' -> ('id', 'codigo', 'nombre'). None o vacío: documento completo.
+    Orden del modelo: la clave de cache y el ETag no dependen del orden pedido.
+    """
+    if not fields:
+        return None
+    pedidos = {c.strip() for c in fields.split(',') if c.strip()}
+    desconocidos = pedidos - set(modelo.model_fields)
+    if desconocidos:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Campos desconocidos en 'fields': {', '.join(sorted(desconocidos))}")
+    if not pedidos:
+        return None
+    pedidos.add(CAMPO_ID)
+    return tuple(c for c in modelo.model_fields if c in pedidos)
+
+
+def campos_firestore(campos: Tuple[str, ...]) -> List[str]:
+    """Rutas para select(): el id sale del snapshot; sin otros campos se pide solo el nombre."""
+    return [c for c in campos if c != CAMPO_ID] or ['__name__']
+
+
+@lru_cache(maxsize=256)
+def modelo_proyectado(modelo: Type[BaseModel], campos: Tuple[str, ...]) -> Type[BaseModel]:
+    """Modelo recortado (mismos tipos y validaciones, solo los campos pedidos), cacheado por combinación."""
+    definicion = {c: (modelo.model_fields[c].annotation, modelo.model_fields[c]) for c in campos}
+    return create_model(f"{modelo.__name__}Proyeccion", **definicion)
+
+
+def recortar(item: BaseModel, campos: Campos) -> BaseModel:
+    """Recorta un modelo completo ya en memoria (Espejo) sin volver a validar."""
+    if campos is None:
+        return item
+    return modelo_proyectado(type(item), campos).model_construct(**item.model_dump(include=set(campos)))
+
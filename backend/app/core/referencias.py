@@ -0,0 +1,198 @@
+# backend/app/core/referencias.py
+# --- Doctrina Referencias: contadores de hijos activos en el documento padre (anti-orfandad) ---
+# padre.referencias.<colección hija> = hijos activos que lo referencian.
+# Se mantiene con Increment en la misma transacción / WriteBatch que escribe al hijo
+# (alta, reasignación, baja, reactivación). El "¿tiene hijos activos?" es una lectura puntual.
+# Los listados de los padres muestran los contadores: cada colección padre tocada mueve su versión
+# (Doctrina Versiones) junto con los Increment, así su ETag y su cache cambian con los conteos.
+# Las operaciones masivas la mueven una sola vez, después de sus lotes. El chequeo de baja usa la
+# pre-imagen del documento condicionada a su update_time (Doctrina Escritura con Retorno).
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import HTTPException, status
+from google.cloud import firestore
+from .exportacion import documentos_por_paginas
+from .versiones import marcar_version
+
+CAMPO_REFERENCIAS = 'referencias'
+
+# Colección hija -> {campo del hijo: (colección padre, campo clave del padre o None)}
+# Con campo clave, el hijo guarda la clave de negocio del padre (se resuelve por claves_unicas);
+# sin él, guarda el id del documento.
+RELACIONES = {
+    'subrubros': {
+        'rubro_id': ('rubros', None),
+    },
+    'productos': {
+        'rubro_id': ('rubros', None),
+        'subrubro_id': ('subrubros', None),
+        'condicion_iva_id': ('condiciones_iva', None),
+        'unidad_medida': ('unidades_medida', 'codigo_unidad'),
+    },
+}
+
+# (colección padre, valor guardado en el hijo)
+Padre = Tuple[str, Any]
+# (referencia del padre, delta)
+Incremento = Tuple[Any, int]
+
+
+def ruta_referencias(hijo: str) -> str:
+    return f"{CAMPO_REFERENCIAS}.{hijo}"
+
+
+def campos_relacion(hijo: str) -> List[str]:
+    """Proyección mínima para calcular las referencias de un hijo."""
+    return list(RELACIONES[hijo]) + ['baja_logica']
+
+
+def padres_activos(hijo: str, datos: Optional[dict]) -> List[Padre]:
+    """Padres que cuentan a este hijo: ninguno si no existe o está dado de baja."""
+    if not datos or datos.get('baja_logica', False):
+        return []
+    return [(coleccion, datos[campo]) for campo, (coleccion, _) in RELACIONES[hijo].items() if datos.get(campo)]
+
+
+def deltas_referencias(hijo: str, antes: Optional[dict], despues: Optional[dict]) -> Counter:
+    """Alta (antes=None), baja, reactivación o reasignación -> {padre: +n / -n} (sin ceros)."""
+    deltas = Counter()
+    deltas.update(padres_activos(hijo, despues))
+    deltas.subtract(padres_activos(hijo, antes))
+    return Counter({padre: n for padre, n in deltas.items() if n})
+
+
+async def resolver_padres(db, padres: Iterable[Padre]) -> Dict[Padre, Any]:
+    """
+    Padre -> DocumentReference, con lecturas agrupadas (get_all por colección).
+    Los padres inexistentes quedan afuera: un update sobre ellos haría fallar la escritura del hijo.
+    """
+    from .claves_unicas import claves_existentes
+    from .masivo import MAX_OPERACIONES_LOTE, en_paralelo, id_valido, trocear
+
+    por_coleccion: Dict[str, List[Any]] = {}
+    for coleccion, valor in dict.fromkeys(padres):
+        por_coleccion.setdefault(coleccion, []).append(valor)
+    claves_padre = {col: clave for rel in RELACIONES.values() for col, clave in rel.values()}
+
+    resueltos: Dict[Padre, Any] = {}
+    for coleccion, valores in por_coleccion.items():
+        if claves_padre.get(coleccion):
+            for valor, (doc_id, _) in (await claves_existentes(db, coleccion, valores)).items():
+                resueltos[(coleccion, valor)] = db.collection(coleccion).document(doc_id)
+            continue
+
+        async def leer(trozo):
+            refs = [db.collection(coleccion).document(v) for v in trozo]
+            return [snap.reference async for snap in db.get_all(refs, field_paths=['baja_logica']) if snap.exists]
+
+        ids = [v for v in valores if id_valido(v)]
+        for refs in await en_paralelo([leer(t) for t in trocear(ids, MAX_OPERACIONES_LOTE)]):
+            for ref in refs:
+                resueltos[(coleccion, ref.id)] = ref
+    return resueltos
+
+
+def incrementos(deltas: Counter, padres: Dict[Padre, Any]) -> List[Incremento]:
+    return [(padres[padre], n) for padre, n in deltas.items() if n and padre in padres]
+
+
+def colecciones_padre(cambios: Iterable[Incremento]) -> Set[str]:
+    """Colecciones padre cuyos contadores mueven 'cambios' (las que cambian de versión)."""
+    return {padre_ref.parent.id for padre_ref, delta in cambios if delta}
+
+
+def escribir_referencias(escritor, hijo: str, cambios: Iterable[Incremento], db=None):
+    """
+    Agrega los Increment a la transacción o WriteBatch del hijo (sin lectura del padre).
+    Con 'db' (escritura de un solo hijo) marca además la versión de cada colección padre tocada;
+    las masivas la mueven al final con confirmar_lotes(versiones=...).
+    """
+    cambios = list(cambios)
+    for padre_ref, delta in cambios:
+        escritor.update(padre_ref, {ruta_referencias(hijo): firestore.Increment(delta)})
+    if db is not None:
+        for coleccion in sorted(colecciones_padre(cambios)):
+            marcar_version(escritor, db, coleccion)
+
+
+async def referencias_por_altas(db, hijo: str, registros: Iterable[dict]) -> List[Incremento]:
+    """Alta de uno o varios hijos: incrementos agregados por padre."""
+    deltas = Counter()
+    for datos in registros:
+        deltas.update(padres_activos(hijo, datos))
+    return incrementos(deltas, await resolver_padres(db, deltas))
+
+
+async def referencias_por_cambio(db, hijo: str, doc_id: str, cambios: dict,
+                                 actual: Optional[dict] = None) -> List[Incremento]:
+    """
+    PATCH / baja / reactivación de un hijo: lee solo los campos de relación (si el cambio
+    los toca; con la pre-imagen 'actual' no lee) y devuelve los movimientos de contadores.
+    Hijo inexistente: [] (el update responde NotFound).
+    """
+    campos = campos_relacion(hijo)
+    if not set(campos) & cambios.keys():
+        return []
+    if actual is not None:
+        antes = {c: actual.get(c) for c in campos}
+    else:
+        snap = await db.collection(hijo).document(doc_id).get(field_paths=campos)
+        if not snap.exists:
+            return []
+        antes = snap.to_dict()
+    deltas = deltas_referencias(hijo, antes, {**antes, **cambios})
+    if not deltas:
+        return []
+    return incrementos(deltas, await resolver_padres(db, deltas))
+
+
+def hijos_activos(datos: Optional[dict]) -> Dict[str, int]:
+    """{colección hija: n} con los contadores positivos del padre."""
+    return {hijo: n for hijo, n in ((datos or {}).get(CAMPO_REFERENCIAS) or {}).items() if n > 0}
+
+
+def exigir_sin_hijos(datos: dict, mensaje: str):
+    """
+    Anti-orfandad sobre la pre-imagen del padre (Doctrina Escritura con Retorno): 409 si tiene hijos activos.
+    La baja se confirma condicionada a la update_time de esa pre-imagen: un hijo que se asocie
+    en el medio mueve el documento y la baja se relee y se vuelve a evaluar.
+    """
+    activos = hijos_activos(datos)
+    if activos:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail={"status": "TIENE_HIJOS_ACTIVOS", "message": mensaje, "referencias": activos})
+
+
+async def reconstruir_referencias(db, hijo: str) -> dict:
+    """
+    Recalcula desde cero los contadores de 'hijo' en todos sus padres (migración / reparación, idempotente).
+    Requiere las claves únicas al día (los padres por clave de negocio se resuelven con ellas).
+    """
+    from .masivo import confirmar_lotes
+
+    conteo = Counter()
+    async for doc in documentos_por_paginas(db.collection(hijo).select(campos_relacion(hijo))):
+        conteo.update(padres_activos(hijo, doc.to_dict()))
+    padres = await resolver_padres(db, conteo)
+
+    por_documento = Counter()
+    for padre, n in conteo.items():
+        if padre in padres:
+            por_documento[(padre[0], padres[padre].id)] += n
+    sin_padre = [{'coleccion': c, 'valor': v, 'hijos': n} for (c, v), n in conteo.items() if (c, v) not in padres]
+
+    ruta = ruta_referencias(hijo)
+    resumen = {'hijo': hijo, 'padres_actualizados': 0, 'errores': 0, 'sin_padre': sin_padre}
+    for coleccion in dict.fromkeys(col for col, _ in RELACIONES[hijo].values()):
+        # Cada padre queda con su valor absoluto (0 si ya no tiene hijos); solo se escriben los que difieren
+        operaciones = []
+        async for doc in documentos_por_paginas(db.collection(coleccion).select([CAMPO_REFERENCIAS])):
+            actual = ((doc.to_dict() or {}).get(CAMPO_REFERENCIAS) or {}).get(hijo)
+            nuevo = por_documento.get((coleccion, doc.id), 0)
+            if actual != nuevo:
+                operaciones.append((doc.reference, nuevo))
+        errores = await confirmar_lotes(db, coleccion, operaciones,
+                                        lambda lote, op: lote.update(op[0], {ruta: op[1]}))
+        resumen['errores'] += sum(1 for e in errores if e)
+        resumen['padres_actualizados'] += sum(1 for e in errores if not e)
+    return resumen
@@ -0,0 +1,98 @@
+# backend/app/core/versiones.py
+# --- Doctrina Versiones: contador de escrituras por colección + GET condicional (ETag) ---
+import hashlib
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Request, Response, status
+from google.cloud import firestore
+
+# Un documento por colección: versiones_colecciones/{coleccion} -> {'version': n}
+COLECCION_VERSIONES = 'versiones_colecciones'
+# Segundos que un worker reusa la versión leída para los ETag de los listados (0: leer siempre)
+TTL_VERSION = float(os.getenv("SL_VERSION_TTL", "2"))
+
+# Por proceso: colección -> (versión, momento de la lectura) y momento del último marcar_version propio
+_versiones_leidas: Dict[str, Tuple[int, float]] = {}
+_versiones_marcadas: Dict[str, float] = {}
+
+
+def marcar_version(escritor, db, coleccion: str):
+    """
+    Agrega el incremento de versión a la transacción o WriteBatch de la escritura,
+    así el cambio de datos y el de versión se confirman juntos (un solo RPC).
+    """
+    version_ref = db.collection(COLECCION_VERSIONES).document(coleccion)
+    escritor.set(version_ref, {
+        'version': firestore.Increment(1),
+        'actualizado': firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+    # La versión reusada de este worker deja de valer (su propia escritura se ve en el próximo GET)
+    _versiones_leidas.pop(coleccion, None)
+    _versiones_marcadas[coleccion] = time.monotonic()
+
+
+async def confirmar_version(db, *colecciones: str) -> bool:
+    """
+    Incremento de versión en su propio commit (un RPC para todas las colecciones indicadas).
+    Las operaciones masivas lo llaman una sola vez, después de confirmar sus lotes: los lotes
+    paralelos no compiten por el documento de versión. Un fallo no deshace lo ya confirmado:
+    se informa y la versión se mueve con la próxima escritura.
+    """
+    lote = db.batch()
+    for coleccion in colecciones:
+        marcar_version(lote, db, coleccion)
+    try:
+        await lote.commit()
+        return True
+    except Exception as e:
+        print(f"ADVERTENCIA: no se pudo mover la versión de {', '.join(colecciones)}: {e}")
+        return False
+
+
+async def obtener_version(db, coleccion: str) -> int:
+    """Lectura puntual de la versión: compartida por todos los workers."""
+    doc = await db.collection(COLECCION_VERSIONES).document(coleccion).get()
+    if doc.exists:
+        return int((doc.to_dict() or {}).get('version', 0))
+    return 0
+
+
+async def version_vigente(db, coleccion: str) -> int:
+    """
+    Versión para el ETag de los listados sin un RPC por pedido: la lectura se reusa durante
+    TTL_VERSION segundos. Las escrituras de otros workers se ven con ese atraso como máximo; las
+    de este worker, en el GET siguiente. Una lectura que empieza dentro de TTL_VERSION segundos
+    de un marcar_version propio no se reusa: pudo ser anterior al commit de esa escritura.
+    """
+    ahora = time.monotonic()
+    leida = _versiones_leidas.get(coleccion)
+    if leida is not None and ahora - leida[1] < TTL_VERSION:
+        return leida[0]
+    version = await obtener_version(db, coleccion)
+    if ahora - _versiones_marcadas.get(coleccion, float('-inf')) >= TTL_VERSION:
+        _versiones_leidas[coleccion] = (version, ahora)
+    return version
+
+
+def calcular_etag(coleccion: str, version: Any, *clave: Any) -> str:
+    """ETag débil: versión de la colección + huella de los parámetros de la consulta."""
+    huella = hashlib.sha1(repr(clave).encode('utf-8')).hexdigest()[:10]
+    return f'W/"{coleccion}-{version}-{huella}"'
+
+
+def respuesta_no_modificada(request: Request, etag: str) -> Optional[Response]:
+    """Devuelve un 304 si el cliente ya tiene esta versión (If-None-Match), si no None."""
+    recibido = request.headers.get('if-none-match')
+    if not recibido:
+        return None
+    candidatos = {valor.strip() for valor in recibido.split(',')}
+    if '*' in candidatos or etag in candidatos:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return None
+
+
+def publicar_etag(response: Response, etag: str):
+    # no-cache: el navegador guarda la respuesta pero revalida siempre con If-None-Match
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
@@ -1,5 +1,6 @@
 ﻿from google.cloud import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
+from ....core.claves_unicas import leer_clave, reservar_clave
+from ....core.versiones import marcar_version
 
 # --- Excepciones Doctrinales (Canon de Separación) ---
 class DuplicadoException(Exception):
@@ -17,8 +18,26 @@ class DuplicadoInactivoException(DuplicadoException):
     pass # status: 'EXISTE_INACTIVO'
 # --- Fin Excepciones ---
 
-@firestore.transactional
-def _transaccion_crear_iva(transaction, iva_data: dict, db):
+def _excepcion_duplicado(doc_id: str, datos_existentes: dict) -> DuplicadoException:
+    """
+    Traduce un duplicado encontrado al status de conflicto (Canon V2.4.1).
+    Compartido por la transacción y por el pre-chequeo local del Espejo.
+    """
+    if datos_existentes.get('baja_logica', False):
+        # 2.A. Duplicado INACTIVO: Reporta status para reactivación (Canon V2.4.1)
+        return DuplicadoInactivoException(
+            status='EXISTE_INACTIVO',
+            id_inactivo=doc_id,
+            campo='código'
+        )
+    # 2.B. Duplicado ACTIVO: Reporta status de conflicto (Canon V2.4.1)
+    return DuplicadoActivoException(
+        status='EXISTE_ACTIVO',
+        campo='código'
+    )
+
+@firestore.async_transactional
+async def _transaccion_crear_iva(transaction, iva_data: dict, db):
     """
     Helper transaccional (Doctrina ABR) para crear Condición IVA.
     Asegura unicidad sobre 'codigo_iva'.
@@ -26,34 +45,16 @@ def _transaccion_crear_iva(transaction, iva_data: dict, db):
     
     codigo = iva_data.get('codigo_iva')
     
-    # 1. Búsqueda de duplicados por 'codigo_iva'
-    query_ref = db.collection('condiciones_iva').where(filter=FieldFilter("codigo_iva", "==", codigo))
-    docs_existentes = query_ref.stream(transaction=transaction)
-    
-    duplicado_encontrado = None
-    doc_id = None
-    for doc in docs_existentes:
-        duplicado_encontrado = doc.to_dict()
-        doc_id = doc.id
-        break 
-
-    if duplicado_encontrado:
-        if duplicado_encontrado.get('baja_logica', False):
-            # 2.A. Duplicado INACTIVO: Reporta status para reactivación (Canon V2.4.1)
-            raise DuplicadoInactivoException(
-                status='EXISTE_INACTIVO',
-                id_inactivo=doc_id,
-                campo='código'
-            )
-        else:
-            # 2.B. Duplicado ACTIVO: Reporta status de conflicto (Canon V2.4.1)
-            raise DuplicadoActivoException(
-                status='EXISTE_ACTIVO',
-                campo='código'
-            )
+    # 1. Búsqueda de duplicados por 'codigo_iva': lectura puntual de la clave única
+    dueno = await leer_clave(db, 'condiciones_iva', codigo, transaction=transaction)
+    if dueno is not None:
+        raise _excepcion_duplicado(dueno[0], dueno[1])
 
-    # 3. No hay duplicados. Creación (Doctrina VIL).
+    # 3. No hay duplicados. Creación (Doctrina VIL) + clave única.
     nuevo_doc_ref = db.collection('condiciones_iva').document()
     transaction.create(nuevo_doc_ref, iva_data)
+    reservar_clave(transaction, db, 'condiciones_iva', 'codigo_iva', codigo, nuevo_doc_ref.id,
+                   iva_data.get('baja_logica', False))
+    marcar_version(transaction, db, 'condiciones_iva') # Doctrina Versiones (ETag)
     
     return nuevo_doc_ref.id, iva_data
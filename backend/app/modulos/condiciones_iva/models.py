@@ -1,5 +1,5 @@
 ﻿from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 from decimal import Decimal
 
 class CondicionIvaModel(BaseModel):
@@ -8,6 +8,7 @@ class CondicionIvaModel(BaseModel):
     nombre: str = Field(..., max_length=30, description="Nombre descriptivo (ej: Exento, Gravado)")
     alicuota: Decimal = Field(..., description="Valor porcentual (ej: 21.00)")
     baja_logica: bool = Field(default=False, description="Estado de baja lógica (Doctrina VIL)")
+    referencias: Optional[Dict[str, int]] = Field(None, description="Hijos activos por colección (Doctrina Referencias, solo lectura)")
 
     class Config:
         from_attributes = True 
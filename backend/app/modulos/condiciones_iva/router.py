@@ -1,7 +1,14 @@
-﻿from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+﻿from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from typing import List, Optional
 from ..condiciones_iva.models import CondicionIvaModel, CondicionIvaUpdateModel
 from ..condiciones_iva.service import condicion_iva_service, CondicionIvaService
+from ...core.estadisticas import EstadisticasModel
+from ...core.exportacion import PATRON_FORMATO_EXPORTACION, respuesta_exportacion
+from ...core.lectura import LecturaPorIds, responder
+from ...core.masivo import IdsMasivo, ResultadoItemMasivo
+from ...core.paginacion import aplicar_cursor
+from ...core.proyeccion import parsear_campos
+from ...core.versiones import calcular_etag, publicar_etag, respuesta_no_modificada
 
 # --- Inyección de Dependencia del Servicio (Patrón Canónico) ---
 def get_condicion_iva_service():
@@ -21,30 +28,139 @@ router_condiciones_iva = APIRouter(
                              response_model=CondicionIvaModel, 
                              status_code=status.HTTP_201_CREATED,
                              summary="Crear nueva Condición IVA (ABR)")
-def crear_iva(
+async def crear_iva(
     data: CondicionIvaModel, 
     service: CondicionIvaService = Depends(get_condicion_iva_service)):
     """Crea una nueva condición IVA. Aplica la Doctrina ABR sobre 'codigo_iva'."""
-    return service.crear_iva(data)
+    return await service.crear_iva(data)
+
+@router_condiciones_iva.post("/bulk", 
+                             response_model=List[ResultadoItemMasivo],
+                             summary="Alta masiva de Condiciones IVA (ABR agrupado)")
+async def crear_ivas_masivo(
+    items: List[CondicionIvaModel], 
+    service: CondicionIvaService = Depends(get_condicion_iva_service)):
+    """Crea varias condiciones IVA; devuelve un resultado por item, en el mismo orden."""
+    return await service.crear_ivas_masivo(items)
+
+@router_condiciones_iva.post("/baja-masiva", 
+                             response_model=List[ResultadoItemMasivo],
+                             summary="Baja lógica masiva de Condiciones IVA (Doctrina VIL)")
+async def baja_ivas_masiva(
+    data: IdsMasivo, 
+    service: CondicionIvaService = Depends(get_condicion_iva_service)
+):
+    """
+    Da de baja las condiciones IVA por id en WriteBatch troceados (una lectura agrupada para todo el conjunto).
+    Devuelve un resultado por id, en el mismo orden: BAJA, SIN_CAMBIOS, NO_ENCONTRADO, TIENE_HIJOS_ACTIVOS o ERROR.
+    """
+    return await service.cambiar_estado_ivas_masivo(data.ids, baja=True)
+
+@router_condiciones_iva.post("/reactivar-masivo", 
+                             response_model=List[ResultadoItemMasivo],
+                             summary="Reactivación masiva de Condiciones IVA (Doctrina VIL)")
+async def reactivar_ivas_masivo(
+    data: IdsMasivo, 
+    service: CondicionIvaService = Depends(get_condicion_iva_service)
+):
+    """
+    Reactiva las condiciones IVA por id en WriteBatch troceados.
+    Devuelve un resultado por id, en el mismo orden: REACTIVADO, SIN_CAMBIOS, NO_ENCONTRADO o ERROR.
+    """
+    return await service.cambiar_estado_ivas_masivo(data.ids, baja=False)
+
+@router_condiciones_iva.post("/batch-get", 
+                             response_model=LecturaPorIds[CondicionIvaModel],
+                             summary="Obtener Condiciones IVA por lista de ids (lectura agrupada)")
+async def obtener_ivas_por_ids(
+    data: IdsMasivo, 
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo_iva,nombre); el id va siempre"),
+    service: CondicionIvaService = Depends(get_condicion_iva_service)
+):
+    """
+    Devuelve las condiciones IVA pedidos en el orden de entrada (repetidos una vez) y los ids inexistentes en `faltantes`.
+    Con el Espejo activo se resuelven en memoria; el resto, Un get_all cada 500 ids.
+    """
+    campos = parsear_campos(fields, CondicionIvaModel)
+    return responder(response, await service.leer_ivas_por_ids(data.ids, campos))
 
 @router_condiciones_iva.get("/", 
                           response_model=List[CondicionIvaModel],
                           summary="Listar Condiciones IVA (Filtro VIL)")
-def listar_ivas(
+async def listar_ivas(
+    request: Request,
+    response: Response,
     estado: str = 'activos', 
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (con tope del servidor)"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la cabecera X-Siguiente-Cursor"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo,nombre); el id va siempre"),
     service: CondicionIvaService = Depends(get_condicion_iva_service)):
-    """Lista condiciones IVA según la Doctrina VIL (Filtro de Tres Vías)."""
-    return service.listar_ivas(estado)
+    """Lista condiciones IVA según la Doctrina VIL (Filtro de Tres Vías), paginadas por cursor."""
+    # Doctrina Versiones: GET condicional (If-None-Match -> 304 sin leer ni serializar la lista)
+    campos = parsear_campos(fields, CondicionIvaModel)
+    # El ETag y el cuerpo salen de la misma versión (el cache no sirve cuerpos de otra versión)
+    version = await service.version_listado()
+    etag = calcular_etag('condiciones_iva', version, estado, limit, cursor, campos)
+    no_modificado = respuesta_no_modificada(request, etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    pagina = await service.listar_ivas(estado, limit, cursor, campos, version)
+    publicar_etag(response, etag)
+    # Doctrina Lectura Confiable: la página sale en bytes (modelo completo o recortado por 'fields')
+    return responder(response, aplicar_cursor(response, pagina))
+
+@router_condiciones_iva.get("/export", 
+                            summary="Exportar Condiciones IVA (NDJSON / CSV en streaming)")
+async def exportar_ivas(
+    estado: str = 'todos',
+    formato: str = Query('ndjson', alias='format', pattern=PATRON_FORMATO_EXPORTACION),
+    service: CondicionIvaService = Depends(get_condicion_iva_service)
+):
+    """
+    Vuelca la colección completa (o filtrada por estado VIL) fila por fila,
+    para backups y extracciones BI. Memoria y tiempo al primer byte constantes.
+    """
+    return respuesta_exportacion(service.exportar_ivas(estado, formato), 'condiciones_iva', formato)
+
+@router_condiciones_iva.get("/stats", 
+                            response_model=EstadisticasModel,
+                            summary="Estadísticas de Condiciones IVA (agregación en Firestore)")
+async def estadisticas_ivas(
+    estado: str = 'activos', 
+    service: CondicionIvaService = Depends(get_condicion_iva_service)
+):
+    """
+    Cantidad de condiciones IVA según la Doctrina VIL ('activos', 'inactivos' o 'todos'),
+    con una consulta count() (sin transferir documentos). Cacheada unos segundos.
+    """
+    return await service.estadisticas_ivas(estado)
+
+@router_condiciones_iva.get("/{id}", 
+                          response_model=CondicionIvaModel,
+                          summary="Obtener Condición IVA por ID")
+async def obtener_iva(
+    id: str, 
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo,nombre); el id va siempre"),
+    service: CondicionIvaService = Depends(get_condicion_iva_service)):
+    """Obtiene una condición IVA (desde el Espejo en memoria si está activo)."""
+    campos = parsear_campos(fields, CondicionIvaModel)
+    iva = await service.obtener_iva(id, campos)
+    if not iva:
+        raise HTTPException(status_code=404, detail="Condición IVA no encontrada")
+    return responder(response, iva)
 
 @router_condiciones_iva.patch("/{id}", 
                               response_model=CondicionIvaModel,
                               summary="Actualizar Condición IVA (PATCH)")
-def actualizar_iva(
+async def actualizar_iva(
     id: str, 
     data: CondicionIvaUpdateModel, 
     service: CondicionIvaService = Depends(get_condicion_iva_service)):
     """Actualiza parcialmente una condición IVA (nombre, alícuota o baja_logica)."""
-    updated = service.actualizar_iva(id, data)
+    updated = await service.actualizar_iva(id, data)
     if not updated:
         raise HTTPException(status_code=404, detail="Condición IVA no encontrada")
     return updated
@@ -52,12 +168,12 @@ def actualizar_iva(
 @router_condiciones_iva.delete("/{id}", 
                               status_code=status.HTTP_204_NO_CONTENT,
                               summary="Baja Lógica (Doctrina VIL y Anti-Orfandad)")
-def baja_logica_iva(
+async def baja_logica_iva(
     id: str, 
     service: CondicionIvaService = Depends(get_condicion_iva_service)):
     """Realiza una baja lógica (Doctrina VIL) con Anti-Orfandad."""
     try:
-        if not service.baja_logica_iva(id):
+        if not await service.baja_logica_iva(id):
             raise HTTPException(status_code=404, detail="Condición IVA no encontrada")
     except HTTPException as e:
         # Re-lanzar la excepción HTTP de Anti-Orfandad
@@ -1,55 +1,84 @@
-﻿from typing import List, Optional
+﻿from typing import AsyncIterator, List, Optional
 from fastapi import HTTPException, status
+from google.api_core.exceptions import AlreadyExists
 from google.cloud.firestore_v1.base_query import FieldFilter
 from ..condiciones_iva.models import CondicionIvaModel, CondicionIvaUpdateModel
 from ..condiciones_iva.helpers.iva_helper import (
     _transaccion_crear_iva, 
+    _excepcion_duplicado,
     DuplicadoActivoException, 
     DuplicadoInactivoException,
     DuplicadoException
 )
-# --- INICIO: Adaptación ST2 (Patrón de Conexión T82) ---
+from ...core.actualizacion import actualizar_con_retorno
+from ...core.cache import cache_catalogos
+from ...core.claves_unicas import sincronizar_clave
+from ...core.estadisticas import EstadisticasModel, calcular_estadisticas
+from ...core.exportacion import exportar_consulta
+from ...core.lectura import LecturaPorIds, leer_por_ids, modelos_por_ids, validar_documentos
+from ...core.masivo import ResultadoItemMasivo, cambiar_estado_masivo, crear_masivo, validar_tamano_masivo
+from ...core.paginacion import Pagina, normalizar_limite, paginar_consulta, paginar_lista
+from ...core.proyeccion import Campos, campos_firestore, modelo_proyectado, recortar
+from ...core.referencias import exigir_sin_hijos
+from ...core.versiones import version_vigente
+from ...core.espejo import EspejoColeccion
+# --- Conexión a DB: Doctrina Conexión Única ---
+# El cliente compartido se crea en app/core/database.py y lo inyecta el lifespan de main.py.
 from google.cloud import firestore
-from google.oauth2 import service_account
-import os
 
-ruta_llave_absoluta = "C:/dev/Sonido_Liquido_V4/service-account-v4.json"
-
-try:
-    credentials = service_account.Credentials.from_service_account_file(ruta_llave_absoluta)
-    db = firestore.Client(credentials=credentials)
-except Exception as e:
-    print(f"ERROR CRÍTICO: No se pudo cargar la llave de Firestore desde {ruta_llave_absoluta}")
-    print(f"Error: {e}")
-    db = None
-# --- FIN: Adaptación ST2 ---
+# Doctrina Referencias (Anti-Orfandad)
+MENSAJE_HIJOS_ACTIVOS = "No se puede dar de baja la Condición IVA porque tiene Productos activos asociados."
 
 
 class CondicionIvaService:
     """Implementa la lógica de negocio para Condiciones IVA."""
     
     # [CANON V2.4.1] Doctrina Singleton __init__ (Obligatoria)
-    def __init__(self, db_instance: firestore.Client):
+    def __init__(self, db_instance: firestore.AsyncClient):
         self.db = db_instance
+        self.espejo = None  # Doctrina Espejo (opcional, ver activar_espejo)
+
+    # --- Doctrina Espejo: copia viva en memoria (opt-in desde el lifespan) ---
+
+    def activar_espejo(self, db_sync: firestore.Client) -> EspejoColeccion:
+        self.espejo = EspejoColeccion('condiciones_iva', 'codigo_iva', CondicionIvaModel)
+        self.espejo.iniciar(db_sync)
+        return self.espejo
+
+    def desactivar_espejo(self):
+        if self.espejo is not None:
+            self.espejo.detener()
+            self.espejo = None
+
+    def _espejo_listo(self) -> bool:
+        return self.espejo is not None and self.espejo.listo
     
     # --- CRUD BASE ---
     
-    def crear_iva(self, data: CondicionIvaModel) -> CondicionIvaModel:
+    async def crear_iva(self, data: CondicionIvaModel) -> CondicionIvaModel:
         if self.db is None: 
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
         
         try:
             # Convertimos Decimal a float para Firestore
-            iva_dict = data.model_dump(exclude={'id'}, exclude_unset=True) 
+            iva_dict = data.model_dump(exclude={'id', 'referencias'}, exclude_unset=True) 
             iva_dict['alicuota'] = float(iva_dict['alicuota'])
+
+            # Pre-chequeo ABR local (Espejo): el duplicado se rechaza sin leer Firestore.
+            # La transacción sigue siendo la garantía ante altas concurrentes.
+            if self._espejo_listo():
+                existente = self.espejo.buscar_por_clave(iva_dict.get('codigo_iva'))
+                if existente is not None:
+                    raise _excepcion_duplicado(existente.id, existente.model_dump())
             
             transaction = self.db.transaction() 
             
-            nuevo_id, datos_creados = _transaccion_crear_iva(
+            nuevo_id, datos_creados = await _transaccion_crear_iva(
                 transaction, 
                 iva_data=iva_dict, 
                 db=self.db
             )
+            cache_catalogos.invalidar('condiciones_iva')
             
             datos_creados['id'] = nuevo_id
             return CondicionIvaModel.model_validate(datos_creados)
@@ -63,10 +92,67 @@ class CondicionIvaService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
 
-    def listar_ivas(self, estado: str = 'activos') -> List[CondicionIvaModel]:
+    # --- Doctrina Operaciones Masivas: ABR agrupado + WriteBatch troceados ---
+    async def crear_ivas_masivo(self, items: List[CondicionIvaModel]) -> List[ResultadoItemMasivo]:
         if self.db is None: 
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
-        
+        validar_tamano_masivo(items)
+
+        def conflicto(doc_id: str, datos: dict):
+            # [CANON V2.4.1] Mismo status JSON de conflicto que el alta individual
+            e = _excepcion_duplicado(doc_id, datos)
+            return e.status, {"status": e.status, "id_inactivo": e.id_inactivo, "campo": e.campo}
+
+        try:
+            registros = []
+            for item in items:
+                iva_dict = item.model_dump(exclude={'id', 'referencias'}, exclude_unset=True)
+                iva_dict['alicuota'] = float(iva_dict['alicuota'])
+                registros.append(iva_dict)
+            resultados = await crear_masivo(self.db, 'condiciones_iva', 'codigo_iva', registros, conflicto=conflicto)
+            cache_catalogos.invalidar('condiciones_iva')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en alta masiva de condiciones IVA: {e}")
+
+    # --- Doctrina Exportación: streaming por páginas, sin armar la lista completa ---
+    def exportar_ivas(self, estado: str = 'todos', formato: str = 'ndjson') -> AsyncIterator[bytes]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        query = self.db.collection('condiciones_iva')
+        if estado == 'activos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", False))
+        elif estado == 'inactivos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", True))
+        return exportar_consulta(query, CondicionIvaModel, formato)
+
+    async def version_listado(self):
+        """Versión de la colección para el ETag de los listados (lectura reusada durante SL_VERSION_TTL segundos)."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        # Con Espejo, la versión sale del mismo contenido que se sirve (sin lecturas)
+        if self._espejo_listo():
+            return self.espejo.huella
+        return await version_vigente(self.db, 'condiciones_iva')
+
+    async def listar_ivas(self, estado: str = 'activos', limite: Optional[int] = None, cursor: Optional[str] = None,
+                            campos: Campos = None, version=None) -> Pagina:
+        if self.db is None: 
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        # Doctrina Espejo: si está activo, la lista sale de memoria sin lecturas
+        if self._espejo_listo():
+            pagina = paginar_lista(self.espejo.listar(estado), limite, cursor)
+            return Pagina([recortar(item, campos) for item in pagina.items], pagina.siguiente_cursor)
+
+        # Doctrina Cache de Catálogos: lectura a través de memoria
+        clave = (estado, normalizar_limite(limite), cursor, campos)
+        return await cache_catalogos.obtener('condiciones_iva', clave,
+                                             lambda: self._consultar_ivas(estado, limite, cursor, campos), version)
+
+    async def _consultar_ivas(self, estado: str, limite: Optional[int], cursor: Optional[str], campos: Campos) -> Pagina:
         try:
             query = self.db.collection('condiciones_iva') 
             
@@ -76,63 +162,155 @@ class CondicionIvaService:
             elif estado == 'inactivos':
                 query = query.where(filter=FieldFilter("baja_logica", "==", True))
             
-            docs = query.stream()
-            lista = []
-            for doc in docs:
-                datos = doc.to_dict()
-                datos['id'] = doc.id
-                lista.append(CondicionIvaModel.model_validate(datos))
-            return lista
+            # Doctrina Proyección: solo viajan y se validan los campos pedidos
+            modelo = CondicionIvaModel
+            if campos:
+                query = query.select(campos_firestore(campos))
+                modelo = modelo_proyectado(CondicionIvaModel, campos)
+
+            # Doctrina Paginación: order_by(id) + start_after(cursor) + limit
+            docs, siguiente_cursor = await paginar_consulta(query, limite, cursor)
+            # Doctrina Lectura Confiable: la página entera se valida en una sola llamada
+            return Pagina(validar_documentos(modelo, docs), siguiente_cursor)
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al listar condiciones IVA: {e}")
 
-    def actualizar_iva(self, id: str, data: CondicionIvaUpdateModel) -> Optional[CondicionIvaModel]:
+    async def obtener_iva(self, id: str, campos: Campos = None) -> Optional[CondicionIvaModel]:
+        if self.db is None: 
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        if self._espejo_listo():
+            item = self.espejo.obtener(id)
+            return recortar(item, campos) if item is not None else None
+
+        try:
+            mascara = [c for c in campos if c != 'id'] if campos else None
+            doc = await self.db.collection('condiciones_iva').document(id).get(field_paths=mascara or None)
+            if doc.exists:
+                datos = doc.to_dict()
+                datos['id'] = doc.id
+                modelo = modelo_proyectado(CondicionIvaModel, campos) if campos else CondicionIvaModel
+                return modelo.model_validate(datos)
+            return None
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener condición IVA: {e}")
+
+    async def actualizar_iva(self, id: str, data: CondicionIvaUpdateModel) -> Optional[CondicionIvaModel]:
         if self.db is None: 
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
             
         try:
-            doc_ref = self.db.collection('condiciones_iva').document(id)
             update_data = data.model_dump(exclude_unset=True) 
             
             # Convertimos Decimal a float para Firestore
             if 'alicuota' in update_data and update_data['alicuota'] is not None:
                 update_data['alicuota'] = float(update_data['alicuota'])
 
-            doc_ref.update(update_data)
-            
-            doc = doc_ref.get()
-            if doc.exists:
-                datos = doc.to_dict()
-                datos['id'] = doc.id
-                return CondicionIvaModel.model_validate(datos)
-            return None
+            async def preparar(lote, actual: dict):
+                if update_data.get('baja_logica'):
+                    # Doctrina Referencias: la baja por PATCH respeta la misma regla anti-orfandad
+                    exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+                # Doctrina Claves Únicas: la clave sigue al código y al estado (baja / reactivación)
+                dueno = await sincronizar_clave(self.db, lote, 'condiciones_iva', 'codigo_iva', id, update_data, actual)
+                if dueno is not None:
+                    e = _excepcion_duplicado(dueno[0], dueno[1])
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail={"status": e.status, "id_inactivo": e.id_inactivo, "campo": e.campo})
+
+            # Doctrina Escritura con Retorno: pre-imagen del Espejo (sin RPC) o una lectura puntual;
+            # dato + clave + versión en un WriteBatch condicionado a ella. None: no existe.
+            datos = await actualizar_con_retorno(self.db, 'condiciones_iva', id, update_data, preparar, self.espejo)
+            if datos is None:
+                return None
+            cache_catalogos.invalidar('condiciones_iva')
+            return CondicionIvaModel.model_validate(datos)
+        except HTTPException:
+            raise
+        except AlreadyExists:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="El código fue tomado por otra operación concurrente.")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al actualizar: {e}")
 
-    def baja_logica_iva(self, id: str) -> bool:
+    async def baja_logica_iva(self, id: str) -> bool:
         if self.db is None: 
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
         
         # [CANON V2.4.1] Integridad VIL (Anti-Orfandad)
-        # 1. Chequeo de Módulos Hijos (Simulado: Asumo que 'productos' es el hijo)
-        hijos_activos_query = self.db.collection('productos').where(filter=FieldFilter("condicion_iva_id", "==", id)).where(filter=FieldFilter("baja_logica", "==", False)).limit(1)
-        hijos_activos = list(hijos_activos_query.stream()) # Ejecutar la consulta
-
-        if len(hijos_activos) > 0:
-            # 2. Bloqueo de la baja por orfandad.
-            raise HTTPException(status_code=status.HTTP_409_CONFLICT, 
-                                detail={"status": "TIENE_HIJOS_ACTIVOS",
-                                        "message": "No se puede dar de baja la Condición IVA porque tiene Productos activos asociados."})
+        # 1. Chequeo de Módulos Hijos: referencias.productos de la pre-imagen (Doctrina Referencias),
+        #    sin consultar la colección de productos. 409 TIENE_HIJOS_ACTIVOS si hay asociados.
+        # 2. Precondición: si se asoció un producto después de la pre-imagen, se relee y se reevalúa.
+        async def preparar(lote, actual: dict):
+            exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+            await sincronizar_clave(self.db, lote, 'condiciones_iva', 'codigo_iva', id, {"baja_logica": True}, actual)
 
         try:
-            doc_ref = self.db.collection('condiciones_iva').document(id)
-            
-            # Doctrina VIL (Baja)
-            doc_ref.update({"baja_logica": True})
+            # Doctrina VIL (Baja) + Doctrina Escritura con Retorno
+            if await actualizar_con_retorno(self.db, 'condiciones_iva', id, {"baja_logica": True},
+                                            preparar, self.espejo) is None:
+                return False
+            cache_catalogos.invalidar('condiciones_iva')
             return True
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al dar de baja: {e}")
 
+    # --- Doctrina Estadísticas: agregaciones en Firestore ---
+    async def estadisticas_ivas(self, estado: str = 'activos') -> EstadisticasModel:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            return await calcular_estadisticas(self.db, 'condiciones_iva', estado)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al calcular estadísticas de condiciones IVA: {e}")
+
+    # --- Doctrina Lectura Agrupada: batch-get por ids ---
+    async def leer_ivas_por_ids(self, ids: List[str], campos: Campos = None) -> LecturaPorIds:
+        """Espejo primero; el resto, get_all agrupado (un RPC cada 500 ids). Orden de entrada + faltantes."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        modelo = modelo_proyectado(CondicionIvaModel, campos) if campos else CondicionIvaModel
+        mascara = campos_firestore(campos) if campos else None
+
+        async def leer(pendientes: List[str]):
+            return await modelos_por_ids(self.db, 'condiciones_iva', modelo, pendientes, mascara)
+
+        try:
+            en_memoria = None
+            if self._espejo_listo():
+                # Doctrina Espejo: los aciertos no generan lecturas
+                def en_memoria(doc_id: str):
+                    item = self.espejo.obtener(doc_id)
+                    return recortar(item, campos) if item is not None else None
+
+            return await leer_por_ids(modelo, ids, leer, en_memoria)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener condiciones IVA por ids: {e}")
+
+    # --- Doctrina Operaciones Masivas: baja / reactivación agrupadas (Doctrina VIL) ---
+    async def cambiar_estado_ivas_masivo(self, ids: List[str], baja: bool) -> List[ResultadoItemMasivo]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        try:
+            resultados = await cambiar_estado_masivo(self.db, 'condiciones_iva', 'codigo_iva', ids, baja, MENSAJE_HIJOS_ACTIVOS)
+            cache_catalogos.invalidar('condiciones_iva')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en la {'baja' if baja else 'reactivación'} masiva: {e}")
+
 # Instancia Singleton del Servicio (Adaptación ST2)
-condicion_iva_service = CondicionIvaService(db)
+condicion_iva_service = CondicionIvaService(None)
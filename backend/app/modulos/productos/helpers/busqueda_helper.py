@@ -0,0 +1,230 @@
+# backend/app/modulos/productos/helpers/busqueda_helper.py
+# --- Doctrina Búsqueda: nombre / SKU por prefijo de palabra, sin acentos ni mayúsculas ---
+# Escritura: cada producto guarda 'busqueda' = prefijos normalizados de sus palabras (consulta
+#   array_contains de respaldo mientras el índice en memoria no está cargado).
+# Lectura: índice de trigramas en memoria (por proceso), armado con una lectura proyectada y
+#   mantenido con las escrituras de este worker. Las altas, cambios de sku / nombre y cambios de
+#   estado mueven además la versión 'productos_busqueda': los demás workers la revisan cada
+#   SL_BUSQUEDA_TTL segundos y, si cambió por escrituras ajenas, rearman su índice en segundo plano.
+import heapq
+import os
+import re
+import time
+import unicodedata
+from array import array
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from ....core.exportacion import documentos_por_paginas
+from ....core.masivo import confirmar_lotes
+
+CAMPO_BUSQUEDA = 'busqueda'
+CAMPOS_BUSQUEDA = ['sku', 'nombre', 'baja_logica']
+# Documento de versiones_colecciones que solo mueven los cambios visibles en la búsqueda
+VERSION_BUSQUEDA = 'productos_busqueda'
+# Prefijos guardados en 'busqueda' desde este largo (las palabras más cortas van enteras)
+LARGO_MINIMO_CLAVE = 2
+# Cada cuánto se compara la versión de búsqueda (una lectura puntual)
+TTL_BUSQUEDA = float(os.getenv("SL_BUSQUEDA_TTL", "300"))
+
+_SEPARADORES = re.compile(r'[^a-z0-9]+')
+
+# (sku, nombre, baja_logica, ' palabras ', largo del nombre normalizado, sku compacto)
+Entrada = Tuple[str, str, bool, str, int, str]
+
+
+def normalizar(texto) -> str:
+    """'Válvula ESFÉRICA 1/2"' -> 'valvula esferica 1 2': minúsculas, sin acentos, solo [a-z0-9] y espacios."""
+    texto = str(texto or '').casefold()
+    if not texto.isascii():
+        # NFKD separa las marcas (á -> a + ´) y el paso a ASCII las descarta
+        texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(_SEPARADORES.sub(' ', texto).split())
+
+
+def _palabras(nombre_normalizado: str, sku_normalizado: str) -> List[str]:
+    del_sku = sku_normalizado.split()
+    resultado = nombre_normalizado.split() + del_sku
+    if len(del_sku) > 1:
+        resultado.append(''.join(del_sku))
+    return list(dict.fromkeys(resultado))
+
+
+def palabras(sku, nombre) -> List[str]:
+    """Palabras buscables: las del nombre, las del SKU y el SKU compacto ('AB-12' -> ab, 12, ab12)."""
+    return _palabras(normalizar(nombre), normalizar(sku))
+
+
+def claves_busqueda(sku, nombre) -> List[str]:
+    """Valor de 'busqueda': prefijos de cada palabra (desde LARGO_MINIMO_CLAVE letras), sin repetir."""
+    claves = {}
+    for palabra in palabras(sku, nombre):
+        for largo in range(min(LARGO_MINIMO_CLAVE, len(palabra)), len(palabra) + 1):
+            claves[palabra[:largo]] = None
+    return list(claves)
+
+
+@lru_cache(maxsize=65536)
+def _gramas(palabra: str) -> FrozenSet[str]:
+    """
+    Trigramas de la palabra anclada al inicio (' ab', 'abc', ...) + el bigrama inicial (' a').
+    Los gramas de un prefijo son un subconjunto de los de la palabra: alcanzan para encontrarla.
+    """
+    anclada = ' ' + palabra
+    gramas = {anclada[:2]}
+    gramas.update(anclada[i:i + 3] for i in range(len(anclada) - 2))
+    return frozenset(gramas)
+
+
+def _empieza_con(palabras_nombre: List[str], terminos: List[str]) -> bool:
+    """'valv esf' sobre 'valvula esferica 1 2': cada término es prefijo de la palabra en su misma posición."""
+    return len(terminos) <= len(palabras_nombre) and all(p.startswith(t) for p, t in zip(palabras_nombre, terminos))
+
+
+class IndiceBusqueda:
+    """
+    Índice invertido grama -> posiciones de producto (array de enteros: ~4 bytes por entrada).
+    - buscar: recorre la lista más corta entre los gramas de la consulta y verifica cada candidato
+      contra el texto normalizado (cada término es prefijo de alguna palabra). Las entradas viejas
+      que deja un cambio de nombre no se borran de las listas: la verificación las descarta.
+    - Ranking: SKU exacto > SKU por prefijo > nombre exacto > nombre que empieza con los términos > palabras
+      completas > prefijos; a igual puntaje, el nombre más corto y después el orden alfabético.
+    - version / versiones_locales: versión de búsqueda leída antes de armarlo + incrementos
+      que hizo este worker desde entonces (no obligan a rearmar).
+    """
+
+    def __init__(self, version: int = 0, ttl: float = TTL_BUSQUEDA):
+        self.version = version
+        self.versiones_locales = 0
+        self.ttl = ttl
+        self.revisado = time.monotonic()
+        self._posiciones: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._entradas: List[Entrada] = []
+        self._gramas: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # --- Escritura ---
+
+    def aplicar(self, doc_id: str, datos: dict):
+        """
+        Alta o cambio (parcial) de sku / nombre / baja_logica. Un cambio parcial de un producto
+        que el índice no tiene se ignora: entra en el próximo rearmado.
+        """
+        cambios = {c: datos[c] for c in CAMPOS_BUSQUEDA if c in datos}
+        if not cambios:
+            return
+        posicion = self._posiciones.get(doc_id)
+        previa = self._entradas[posicion] if posicion is not None else None
+        if previa is None:
+            if 'sku' not in cambios or 'nombre' not in cambios:
+                return
+            actual = {'baja_logica': False}
+        else:
+            actual = {'sku': previa[0], 'nombre': previa[1], 'baja_logica': previa[2]}
+        actual.update(cambios)
+
+        sku, nombre = str(actual['sku'] or ''), str(actual['nombre'] or '')
+        nombre_normalizado, sku_normalizado = normalizar(nombre), normalizar(sku)
+        lista = _palabras(nombre_normalizado, sku_normalizado)
+        texto = ' ' + ' '.join(lista) + ' '
+        entrada = (sku, nombre, bool(actual.get('baja_logica')), texto,
+                   len(nombre_normalizado), sku_normalizado.replace(' ', ''))
+        if posicion is None:
+            posicion = len(self._ids)
+            self._posiciones[doc_id] = posicion
+            self._ids.append(doc_id)
+            self._entradas.append(entrada)
+            previos = set()
+        else:
+            self._entradas[posicion] = entrada
+            previos = set().union(*(_gramas(p) for p in previa[3].split()))
+        for grama in set().union(*(_gramas(p) for p in lista)) - previos:
+            self._gramas.setdefault(grama, array('I')).append(posicion)
+
+    def registrar(self, cambios: Iterable[Tuple[str, dict]], versiones: int = 1):
+        """Escrituras confirmadas por este worker (y cuántas veces movieron la versión de búsqueda)."""
+        for doc_id, datos in cambios:
+            self.aplicar(doc_id, datos)
+        self.versiones_locales += versiones
+
+    # --- Vigencia ---
+
+    def vencido(self) -> bool:
+        return time.monotonic() - self.revisado >= self.ttl
+
+    def al_dia(self, version: int) -> bool:
+        """¿La versión leída se explica solo por escrituras de este worker? (entonces la adopta)."""
+        self.revisado = time.monotonic()
+        if version != self.version + self.versiones_locales:
+            return False
+        self.version, self.versiones_locales = version, 0
+        return True
+
+    # --- Lectura ---
+
+    def buscar(self, consulta: str, limite: int, estado: str = 'activos') -> List[dict]:
+        """Los 'limite' mejores productos cuyas palabras empiezan con cada término de la consulta."""
+        normalizada = normalizar(consulta)
+        terminos = list(dict.fromkeys(normalizada.split()))
+        if not terminos or not self._ids:
+            return []
+        listas = []
+        for termino in terminos:
+            for grama in _gramas(termino):
+                lista = self._gramas.get(grama)
+                if lista is None:
+                    return []
+                listas.append(lista)
+
+        terminos_en_orden = normalizada.split()
+        patrones = [' ' + t for t in terminos]
+        completos = [' ' + t + ' ' for t in terminos]
+        compacta = normalizada.replace(' ', '')
+        candidatos = []
+        for posicion in set(min(listas, key=len)):
+            sku, nombre, baja, texto, largo_nombre, sku_compacto = self._entradas[posicion]
+            # Doctrina VIL (Filtro de Tres Vías)
+            if (estado == 'activos' and baja) or (estado == 'inactivos' and not baja):
+                continue
+            if not all(p in texto for p in patrones):
+                continue
+            nombre_normalizado = texto[1:1 + largo_nombre]
+            puntaje = sum(20 if c in texto else 10 for c in completos)
+            if compacta == sku_compacto:
+                puntaje += 1000
+            elif sku_compacto.startswith(compacta):
+                puntaje += 500
+            if nombre_normalizado == normalizada:
+                puntaje += 300
+            elif _empieza_con(nombre_normalizado.split(), terminos_en_orden):
+                puntaje += 200
+            candidatos.append((-puntaje, largo_nombre, nombre_normalizado, posicion))
+
+        resultado = []
+        for menos_puntaje, _, _, posicion in heapq.nsmallest(limite, candidatos):
+            sku, nombre, baja = self._entradas[posicion][:3]
+            resultado.append({'id': self._ids[posicion], 'sku': sku, 'nombre': nombre,
+                              'baja_logica': baja, 'puntaje': -menos_puntaje})
+        return resultado
+
+
+async def reconstruir_claves_busqueda(db) -> dict:
+    """
+    Completa / corrige 'busqueda' en todos los productos (migración de los datos existentes, idempotente).
+    Lectura proyectada a sku + nombre + busqueda; solo se escriben los que difieren.
+    """
+    operaciones = []
+    leidos = 0
+    query = db.collection('productos').select(['sku', 'nombre', CAMPO_BUSQUEDA])
+    async for doc in documentos_por_paginas(query):
+        leidos += 1
+        datos = doc.to_dict() or {}
+        claves = claves_busqueda(datos.get('sku'), datos.get('nombre'))
+        if datos.get(CAMPO_BUSQUEDA) != claves:
+            operaciones.append((doc.reference, claves))
+    errores = await confirmar_lotes(db, 'productos', operaciones,
+                                    lambda lote, op: lote.update(op[0], {CAMPO_BUSQUEDA: op[1]}))
+    return {'productos': leidos, 'actualizados': sum(1 for e in errores if not e),
+            'errores': sum(1 for e in errores if e)}
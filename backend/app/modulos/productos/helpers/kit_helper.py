@@ -0,0 +1,336 @@
+# backend/app/modulos/productos/helpers/kit_helper.py
+# --- Doctrina Kits: grafo de componentes (BOM) con costo acumulado memoizado ---
+import math
+from collections import defaultdict
+from fractions import Fraction
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .producto_helper import _dividir_half_up
+
+Componentes = List[Tuple[str, Fraction]]  # [(producto_id, cantidad exacta)]
+Stock = Tuple[Dict[str, Fraction], Fraction]  # ({deposito_id: disponible}, disponible total)
+Disponibilidad = Tuple[Dict[str, int], int]  # ({deposito_id: kits armables}, kits armables en total)
+
+# Documento de versiones_colecciones que mueven los cambios de costo / BOM y las altas de kits
+VERSION_KITS = 'productos_kits'
+
+
+def componentes_exactos(componentes_kit: Iterable) -> Componentes:
+    """[{'producto_id', 'cantidad'}] -> [(id, Fraction)]; la cantidad pasa por str para no arrastrar binario."""
+    resultado = []
+    for c in componentes_kit or []:
+        producto_id = c['producto_id'] if isinstance(c, dict) else c.producto_id
+        cantidad = c['cantidad'] if isinstance(c, dict) else c.cantidad
+        resultado.append((producto_id, Fraction(str(cantidad))))
+    return resultado
+
+
+def stock_disponible(stock_depositos: Iterable, stock_comprometido) -> Stock:
+    """
+    Disponible = stock_depositos - stock_comprometido, sin negativos.
+    El comprometido no está abierto por depósito: se descuenta del total, no de cada depósito.
+    """
+    por_deposito: Dict[str, Fraction] = defaultdict(Fraction)
+    for d in stock_depositos or []:
+        deposito_id = d['deposito_id'] if isinstance(d, dict) else d.deposito_id
+        stock_real = d['stock_real'] if isinstance(d, dict) else d.stock_real
+        por_deposito[deposito_id] += Fraction(str(stock_real))
+    total = sum(por_deposito.values(), Fraction(0)) - Fraction(str(stock_comprometido or 0))
+    return {k: max(v, Fraction(0)) for k, v in por_deposito.items()}, max(total, Fraction(0))
+
+
+class GrafoKits:
+    """
+    Grafo producto -> componentes armado con una sola lectura masiva.
+    - Costos en enteros escalados (Doctrina Precio Entero); el de un kit es la suma de
+      costo(componente) * cantidad, redondeada ROUND_HALF_UP a 4 decimales.
+    - Memoización: cada sub-kit compartido se evalúa una sola vez.
+    - Ciclos: detectados con Tarjan (iterativo); los kits en ciclo, o que dependen de uno, no tienen costo.
+    - Cambios incrementales: un costo o BOM nuevo invalida solo a sus ancestros.
+    - Disponibilidad: kits armables por depósito y en total, con la misma memoización (stock
+      de cada producto cargado aparte con cargar_stock).
+    - version / versiones_locales: versión de kits leída antes de armarlo + incrementos que hizo
+      este worker desde entonces (otro valor = costos o BOM cambiados por otro worker).
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.versiones_locales = 0
+        self.costos_base: Dict[str, int] = {}
+        self.componentes: Dict[str, Componentes] = {}
+        self.padres: Dict[str, Set[str]] = defaultdict(set)
+        self.ciclos: List[List[str]] = []
+        self.en_ciclo: Set[str] = set()
+        self._memo: Dict[str, Optional[int]] = {}
+        self.stock: Dict[str, Stock] = {}
+        self._stock_informado: Dict[str, Tuple[list, object]] = {}
+        self._memo_disponible: Dict[str, Optional[Disponibilidad]] = {}
+
+    @classmethod
+    def construir(cls, registros: Iterable[Tuple[str, int, bool, Componentes]], version: int = 0) -> 'GrafoKits':
+        """registros: (id, costo escalado, es_kit, componentes exactos)."""
+        grafo = cls(version)
+        for producto_id, costo, es_kit, componentes in registros:
+            grafo.costos_base[producto_id] = costo
+            if es_kit and componentes:
+                grafo._enlazar(producto_id, componentes)
+        grafo.detectar_ciclos()
+        return grafo
+
+    def al_dia(self, version: int) -> bool:
+        """¿La versión leída se explica solo por escrituras de este worker? (entonces la adopta)."""
+        if version != self.version + self.versiones_locales:
+            return False
+        self.version, self.versiones_locales = version, 0
+        return True
+
+    # --- Estructura ---
+
+    def es_kit(self, producto_id: str) -> bool:
+        return bool(self.componentes.get(producto_id))
+
+    def kits(self) -> List[str]:
+        return list(self.componentes)
+
+    def _enlazar(self, kit_id: str, componentes: Componentes):
+        for hijo, _ in self.componentes.pop(kit_id, []):
+            self.padres[hijo].discard(kit_id)
+        if componentes:
+            self.componentes[kit_id] = componentes
+            for hijo, _ in componentes:
+                self.padres[hijo].add(kit_id)
+
+    def detectar_ciclos(self) -> List[List[str]]:
+        """Componentes fuertemente conexas (Tarjan sin recursión): cada una con más de un nodo, o con auto-referencia, es un ciclo."""
+        indice: Dict[str, int] = {}
+        minimo: Dict[str, int] = {}
+        pila: List[str] = []
+        en_pila: Set[str] = set()
+        ciclos: List[List[str]] = []
+        contador = 0
+
+        for raiz in list(self.componentes):
+            if raiz in indice:
+                continue
+            trabajo = [(raiz, 0)]
+            while trabajo:
+                nodo, siguiente = trabajo.pop()
+                if siguiente == 0:
+                    indice[nodo] = minimo[nodo] = contador
+                    contador += 1
+                    pila.append(nodo)
+                    en_pila.add(nodo)
+                hijos = self.componentes.get(nodo, [])
+                if siguiente < len(hijos):
+                    trabajo.append((nodo, siguiente + 1))
+                    hijo = hijos[siguiente][0]
+                    if hijo not in indice:
+                        trabajo.append((hijo, 0))
+                    elif hijo in en_pila:
+                        minimo[nodo] = min(minimo[nodo], indice[hijo])
+                    continue
+                # Todos los hijos visitados: cerrar el nodo
+                if minimo[nodo] == indice[nodo]:
+                    scc = []
+                    while True:
+                        miembro = pila.pop()
+                        en_pila.discard(miembro)
+                        scc.append(miembro)
+                        if miembro == nodo:
+                            break
+                    if len(scc) > 1 or any(h == nodo for h, _ in hijos):
+                        ciclos.append(scc)
+                if trabajo:
+                    padre = trabajo[-1][0]
+                    minimo[padre] = min(minimo[padre], minimo[nodo])
+
+        self.ciclos = ciclos
+        self.en_ciclo = {n for scc in ciclos for n in scc}
+        self._memo.clear()
+        self._memo_disponible.clear()
+        return ciclos
+
+    def genera_ciclo(self, kit_id: str, componentes: Componentes) -> bool:
+        """¿Usar 'componentes' en 'kit_id' lo haría depender de sí mismo?"""
+        pendientes = [hijo for hijo, _ in componentes]
+        vistos: Set[str] = set()
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo == kit_id:
+                return True
+            if nodo in vistos:
+                continue
+            vistos.add(nodo)
+            pendientes.extend(h for h, _ in self.componentes.get(nodo, []))
+        return False
+
+    def ancestros(self, producto_id: str) -> List[str]:
+        """Todos los kits que contienen (directa o indirectamente) al producto."""
+        resultado, vistos = [], {producto_id}
+        pendientes = list(self.padres.get(producto_id, ()))
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo in vistos:
+                continue
+            vistos.add(nodo)
+            resultado.append(nodo)
+            pendientes.extend(self.padres.get(nodo, ()))
+        return resultado
+
+    def faltantes(self) -> Dict[str, List[str]]:
+        """Kits con componentes que no existen en productos."""
+        return {kit: faltan for kit, comps in self.componentes.items()
+                if (faltan := [h for h, _ in comps if h not in self.costos_base])}
+
+    # --- Costos ---
+
+    def costo(self, producto_id: str) -> Optional[int]:
+        """Costo escalado (memoizado). None: producto inexistente, en ciclo o con componentes faltantes."""
+        memo = self._memo
+        if producto_id in memo:
+            return memo[producto_id]
+
+        trabajo = [(producto_id, False)]
+        while trabajo:
+            nodo, expandido = trabajo.pop()
+            if nodo in memo:
+                continue
+            if not self.es_kit(nodo):
+                memo[nodo] = self.costos_base.get(nodo)
+                continue
+            if nodo in self.en_ciclo:
+                memo[nodo] = None
+                continue
+            comps = self.componentes[nodo]
+            if not expandido:
+                trabajo.append((nodo, True))
+                trabajo.extend((hijo, False) for hijo, _ in comps if hijo not in memo)
+                continue
+
+            total = Fraction(0)
+            for hijo, cantidad in comps:
+                costo_hijo = memo.get(hijo)
+                if costo_hijo is None:
+                    total = None
+                    break
+                total += costo_hijo * cantidad
+            memo[nodo] = None if total is None else _dividir_half_up(total.numerator, total.denominator)
+        return memo[producto_id]
+
+    def costos_kits(self) -> Dict[str, Optional[int]]:
+        return {kit: self.costo(kit) for kit in self.componentes}
+
+    def aplicar_cambio(self, producto_id: str, costo: Optional[int] = None,
+                       componentes: Optional[Componentes] = None) -> Dict[str, int]:
+        """
+        Aplica un costo base y/o un BOM nuevo y recalcula solo al producto y sus ancestros.
+        Devuelve {kit_id: costo nuevo} de los kits cuyo costo cambió (incluido el propio producto).
+        """
+        if componentes is not None:
+            self._enlazar(producto_id, componentes)
+            if self.en_ciclo:
+                self.detectar_ciclos()  # Un BOM nuevo puede romper un ciclo previo
+        if costo is not None:
+            self.costos_base[producto_id] = costo
+
+        afectados = [producto_id] + self.ancestros(producto_id)
+        for nodo in afectados:
+            self._memo.pop(nodo, None)
+            self._memo_disponible.pop(nodo, None)
+        return self.pendientes_de_guardar(afectados)
+
+    def pendientes_de_guardar(self, kits: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        Kits cuyo costo calculado difiere del guardado en Firestore ('costos_base' de un kit
+        es su último costo persistido). Se asume que el llamador los guarda.
+        """
+        cambios = {}
+        for kit in (self.componentes if kits is None else kits):
+            if not self.es_kit(kit):
+                continue
+            nuevo = self.costo(kit)
+            if nuevo is not None and nuevo != self.costos_base.get(kit):
+                cambios[kit] = nuevo
+                self.costos_base[kit] = nuevo
+        return cambios
+
+    # --- Disponibilidad ---
+
+    def cargar_stock(self, producto_id: str, stock_depositos: Iterable, stock_comprometido):
+        self._stock_informado[producto_id] = (list(stock_depositos or []), stock_comprometido)
+        self.stock[producto_id] = stock_disponible(stock_depositos, stock_comprometido)
+
+    def disponibilidad(self, producto_id: str) -> Optional[Disponibilidad]:
+        """
+        Kits armables (memoizado): por depósito y en total, el mínimo entre componentes de
+        floor(disponible del componente / cantidad). Un sub-kit aporta sus propios kits armables.
+        Ningún depósito supera al total (el comprometido se descuenta solo del total).
+        None: producto inexistente, en ciclo o con componentes faltantes.
+        """
+        memo = self._memo_disponible
+        if producto_id in memo:
+            return memo[producto_id]
+
+        trabajo = [(producto_id, False)]
+        while trabajo:
+            nodo, expandido = trabajo.pop()
+            if nodo in memo:
+                continue
+            if not self.es_kit(nodo):
+                stock = self.stock.get(nodo)
+                memo[nodo] = None if stock is None else (
+                    {d: math.floor(v) for d, v in stock[0].items()}, math.floor(stock[1]))
+                continue
+            if nodo in self.en_ciclo:
+                memo[nodo] = None
+                continue
+            comps = self.componentes[nodo]
+            if not expandido:
+                trabajo.append((nodo, True))
+                trabajo.extend((hijo, False) for hijo, _ in comps if hijo not in memo)
+                continue
+
+            memo[nodo] = self._armables(comps)
+        return memo[producto_id]
+
+    def _armables(self, comps: Componentes) -> Optional[Disponibilidad]:
+        memo = self._memo_disponible
+        limitantes = [(memo.get(hijo), cantidad) for hijo, cantidad in comps if cantidad > 0]
+        if any(disp is None for disp, _ in limitantes):
+            return None
+        if not limitantes:
+            return {}, 0
+        depositos = set().union(*(disp[0] for disp, _ in limitantes))
+        total = min(math.floor(disp[1] / cantidad) for disp, cantidad in limitantes)
+        por_deposito = {
+            d: min(total, *(math.floor(disp[0].get(d, 0) / cantidad) for disp, cantidad in limitantes))
+            for d in sorted(depositos)
+        }
+        return por_deposito, total
+
+    def aplicar_stock(self, producto_id: str, stock_depositos: Optional[Iterable] = None,
+                      stock_comprometido=None) -> List[str]:
+        """
+        Actualiza el stock de un producto (lo no informado conserva el valor previo) e invalida
+        solo la disponibilidad de sus kits ancestros. Devuelve los kits afectados.
+        """
+        depositos_previos, comprometido_previo = self._stock_informado.get(producto_id, ([], 0))
+        self.cargar_stock(producto_id,
+                          depositos_previos if stock_depositos is None else stock_depositos,
+                          comprometido_previo if stock_comprometido is None else stock_comprometido)
+
+        afectados = self.ancestros(producto_id)
+        for nodo in [producto_id] + afectados:
+            self._memo_disponible.pop(nodo, None)
+        return afectados
+
+    def mover_stock(self, producto_id: str, deposito_id: str, cantidad) -> List[str]:
+        """Aplica un movimiento (delta) de un depósito sobre el stock informado."""
+        depositos_previos, _ = self._stock_informado.get(producto_id, ([], 0))
+        depositos = [dict(d) if isinstance(d, dict) else d.model_dump() for d in depositos_previos]
+        for d in depositos:
+            if d['deposito_id'] == deposito_id:
+                d['stock_real'] = Fraction(str(d['stock_real'])) + Fraction(str(cantidad))
+                break
+        else:
+            depositos.append({'deposito_id': deposito_id, 'stock_real': cantidad})
+        return self.aplicar_stock(producto_id, depositos)
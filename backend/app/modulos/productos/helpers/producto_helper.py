@@ -0,0 +1,63 @@
+# backend/app/modulos/productos/helpers/producto_helper.py
+from google.cloud import firestore
+from ....core.claves_unicas import leer_clave, reservar_clave
+from ....core.referencias import escribir_referencias
+from ....core.versiones import marcar_version
+from .busqueda_helper import VERSION_BUSQUEDA
+from .stock_helper import escribir_inventario
+
+# --- Doctrina Precio Entero: redondeo canónico en enteros escalados ---
+def _dividir_half_up(numerador: int, denominador: int) -> int:
+    """numerador / denominador redondeado ROUND_HALF_UP, en enteros (denominador > 0)."""
+    cociente, resto = divmod(abs(numerador), denominador)
+    if 2 * resto >= denominador:
+        cociente += 1
+    return cociente if numerador >= 0 else -cociente
+
+# --- Excepciones Doctrinales (ABR sobre 'sku') ---
+class DuplicadoActivoException(Exception):
+    def __init__(self, valor: str):
+        self.detail = f"SKU '{valor}' ya está en uso activo."
+        super().__init__(self.detail)
+
+class DuplicadoInactivoException(Exception):
+    def __init__(self, id_inactivo: str):
+        self.id_inactivo = id_inactivo
+        # El JSON de la "Doble Aceptación"
+        self.detail = {"status": "EXISTE_INACTIVO", "id_inactivo": id_inactivo, "campo": "sku"}
+        super().__init__("Duplicado inactivo encontrado")
+
+def _excepcion_duplicado(doc_id: str, datos_existentes: dict, sku: str) -> Exception:
+    """Traduce un SKU duplicado a la excepción doctrinal (ABR V12)."""
+    if datos_existentes.get('baja_logica', False):
+        return DuplicadoInactivoException(id_inactivo=doc_id)
+    return DuplicadoActivoException(valor=sku)
+
+@firestore.async_transactional
+async def _transaccion_crear_producto(transaction, producto_data: dict, db, referencias=(), versiones=()):
+    """
+    Helper transaccional (Doctrina ABR) para crear Producto.
+    Asegura unicidad sobre 'sku'. 'producto_data' ya viene codificado para Firestore.
+    'referencias': incrementos de los padres (Doctrina Referencias), resueltos antes de la transacción.
+    'versiones': documentos de versión adicionales que mueve el alta (p.ej. la de kits).
+    """
+    sku = producto_data.get('sku')
+
+    # 1. Búsqueda de duplicados por 'sku': lectura puntual de la clave única
+    dueno = await leer_clave(db, 'productos', sku, transaction=transaction)
+    if dueno is not None:
+        raise _excepcion_duplicado(dueno[0], dueno[1], sku)
+
+    # 2. Creación + clave única + shards de stock + contadores de los padres + Doctrina Versiones (ETag
+    #    y búsqueda) en la misma transacción
+    nuevo_doc_ref = db.collection('productos').document()
+    transaction.create(nuevo_doc_ref, producto_data)
+    reservar_clave(transaction, db, 'productos', 'sku', sku, nuevo_doc_ref.id, producto_data.get('baja_logica', False))
+    escribir_inventario(transaction, nuevo_doc_ref, producto_data.get('stock_por_deposito', {}))
+    escribir_referencias(transaction, 'productos', referencias, db)
+    marcar_version(transaction, db, 'productos')
+    marcar_version(transaction, db, VERSION_BUSQUEDA)
+    for version in versiones:
+        marcar_version(transaction, db, version)
+
+    return nuevo_doc_ref.id
@@ -0,0 +1,124 @@
+# backend/app/modulos/productos/helpers/stock_helper.py
+# --- Doctrina Stock Distribuido: contadores por depósito en shards + agregados en el producto ---
+# Un movimiento incrementa un shard al azar de su depósito y, en la misma escritura atómica, los
+# agregados del producto (stock_total / stock_por_deposito: listados, filtros, reposición).
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+from google.cloud import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from ....core.exportacion import documentos_por_paginas
+from ....core.masivo import MAX_OPERACIONES_LOTE, confirmar_lotes, en_paralelo, leer_documentos, trocear
+
+# Shards por depósito: cada movimiento incrementa uno al azar (escrituras repartidas)
+NUM_SHARDS_STOCK = 10
+SUBCOLECCION_SHARDS = 'stock_shards'
+
+
+def id_shard(deposito_id: str, numero: int) -> str:
+    return f"{deposito_id}~{numero}"
+
+
+def ruta_deposito(deposito_id: str) -> str:
+    """'stock_por_deposito.<id>' escapado (ids con caracteres no simples)."""
+    return FieldPath('stock_por_deposito', deposito_id).to_api_repr()
+
+
+def agregados_stock(stock_depositos: Iterable) -> dict:
+    """[{'deposito_id', 'stock_real'}] -> {'stock_por_deposito': {...}, 'stock_total': n} (lo que guarda el producto)."""
+    por_deposito: Dict[str, float] = {}
+    for d in stock_depositos or []:
+        por_deposito[d['deposito_id']] = por_deposito.get(d['deposito_id'], 0) + d['stock_real']
+    return {'stock_por_deposito': por_deposito, 'stock_total': sum(por_deposito.values())}
+
+
+def depositos_guardados(datos: dict) -> List[dict]:
+    """Documento -> stock_depositos del modelo. Tolera el formato previo (arreglo embebido)."""
+    por_deposito = datos.get('stock_por_deposito')
+    if por_deposito is None:
+        return list(datos.get('stock_depositos') or [])
+    return [{'deposito_id': d, 'stock_real': v} for d, v in sorted(por_deposito.items())]
+
+
+def escribir_inventario(escritor, producto_ref, por_deposito: Dict[str, float],
+                        depositos_previos: Optional[Iterable[str]] = None) -> int:
+    """
+    Fija el stock absoluto: el valor de cada depósito queda en su shard 0.
+    - Alta / importación (depositos_previos=None): el producto no tiene shards.
+    - Inventario (PATCH): cada depósito previo o nuevo se pisa en sus NUM_SHARDS_STOCK ids fijos
+      (borrados salvo el 0 de los nuevos), no a partir de la lista de shards leída: un movimiento
+      concurrente que crea un shard queda borrado (antes del inventario) o sumado (después).
+    'escritor' es un WriteBatch o una transacción. Devuelve las escrituras agregadas.
+    """
+    shards = producto_ref.collection(SUBCOLECCION_SHARDS)
+    escrituras = 0
+    if depositos_previos is not None:
+        for deposito_id in dict.fromkeys([*depositos_previos, *por_deposito]):
+            for numero in range(1 if deposito_id in por_deposito else 0, NUM_SHARDS_STOCK):
+                escritor.delete(shards.document(id_shard(deposito_id, numero)))
+                escrituras += 1
+    for deposito_id, cantidad in por_deposito.items():
+        escritor.set(shards.document(id_shard(deposito_id, 0)), {'deposito_id': deposito_id, 'stock_real': cantidad})
+        escrituras += 1
+    return escrituras
+
+
+def escribir_movimiento(escritor, producto_ref, deposito_id: str, cantidad: float):
+    """
+    Movimiento de stock sin lectura previa:
+    - Increment en un shard al azar del depósito (movimientos concurrentes no comparten documento)
+    - Increment de los agregados del producto en la misma escritura atómica
+    El update falla con NotFound si el producto no existe (el lote entero se descarta).
+    """
+    shard_ref = producto_ref.collection(SUBCOLECCION_SHARDS).document(
+        id_shard(deposito_id, random.randrange(NUM_SHARDS_STOCK)))
+    escritor.set(shard_ref, {'deposito_id': deposito_id, 'stock_real': firestore.Increment(cantidad)}, merge=True)
+    escritor.update(producto_ref, {
+        'stock_total': firestore.Increment(cantidad),
+        ruta_deposito(deposito_id): firestore.Increment(cantidad),
+    })
+
+
+async def sumar_shards(producto_ref) -> Dict[str, float]:
+    """Stock por depósito sumando los shards del producto (una consulta)."""
+    por_deposito: Dict[str, float] = {}
+    async for shard in producto_ref.collection(SUBCOLECCION_SHARDS).stream():
+        s = shard.to_dict()
+        por_deposito[s['deposito_id']] = por_deposito.get(s['deposito_id'], 0) + s.get('stock_real', 0)
+    return por_deposito
+
+
+async def consolidar_agregados(db, ids: Iterable[str]) -> Tuple[int, List[str]]:
+    """
+    Recalcula stock_total / stock_por_deposito de los productos desde sus shards (reparación).
+    Cada update va condicionado a la update_time del producto leída antes que los shards: si un
+    movimiento o un inventario lo cambió en el medio, su lote falla y esos productos quedan para reintentar.
+    Solo se escriben los que difieren; la versión del listado se mueve una vez.
+    Devuelve (productos actualizados, ids a reintentar).
+    """
+    snaps = await leer_documentos(db, 'productos', ids, ['stock_por_deposito', 'stock_total'])
+
+    async def calcular(snap):
+        por_deposito = await sumar_shards(snap.reference)
+        agregados = {'stock_por_deposito': por_deposito, 'stock_total': sum(por_deposito.values())}
+        previo = snap.to_dict() or {}
+        if all(previo.get(campo) == valor for campo, valor in agregados.items()):
+            return None
+        return snap.reference, snap.update_time, agregados
+
+    operaciones = [op for op in await en_paralelo([calcular(s) for s in snaps.values()]) if op is not None]
+    errores = await confirmar_lotes(
+        db, 'productos', operaciones,
+        lambda lote, op: lote.update(op[0], op[2], option=db.write_option(last_update_time=op[1])),
+    )
+    return sum(1 for e in errores if not e), [op[0].id for op, e in zip(operaciones, errores) if e]
+
+
+async def reconstruir_agregados_stock(db) -> dict:
+    """Recalcula los agregados de todos los productos (reparación: p.ej. datos anteriores a los shards o editados a mano)."""
+    ids = [doc.id async for doc in documentos_por_paginas(db.collection('productos').select(['stock_total']))]
+    actualizados, errores = 0, 0
+    for trozo in trocear(ids, MAX_OPERACIONES_LOTE):
+        escritos, fallidos = await consolidar_agregados(db, trozo)
+        actualizados += escritos
+        errores += len(fallidos)
+    return {'productos': len(ids), 'actualizados': actualizados, 'errores': errores}
@@ -1,6 +1,6 @@
 # backend/app/modulos/productos/models.py
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional, List, Literal, Dict
 from decimal import Decimal # <--- DOCTRINA V2.0 APLICADA
 
 # --- Sub-modelos ---
@@ -26,6 +26,11 @@ class ProductoModel(BaseModel):
     observaciones: Optional[str] = Field(None, max_length=60)
     baja_logica: bool = False
 
+    # 1.B. Clasificación (ids de documento de las tablas maestras)
+    rubro_id: Optional[str] = None
+    subrubro_id: Optional[str] = None
+    condicion_iva_id: Optional[str] = None
+
     # 2. Costos y Precios (CORREGIDO V2.0)
     precio_costo: Decimal # <-- CONFORME A DOCTRINA
     moneda_costo: str
@@ -39,6 +44,7 @@ class ProductoModel(BaseModel):
     # 4. Gestión de Stock (Multi-Depósito - SEMILLA)
     stock_minimo_pedido: float
     stock_depositos: List[StockDepositoModel] = []
+    stock_total: Optional[float] = None  # Calculado: suma de stock_depositos (Doctrina Stock Distribuido)
     stock_comprometido: float
     stock_entrante: float
 
@@ -58,6 +64,9 @@ class ProductoUpdateModel(BaseModel):
     codigo_bas: Optional[str] = Field(None, max_length=8)
     observaciones: Optional[str] = Field(None, max_length=60)
     baja_logica: Optional[bool] = None
+    rubro_id: Optional[str] = None
+    subrubro_id: Optional[str] = None
+    condicion_iva_id: Optional[str] = None
 
     # --- CORREGIDO V2.0 ---
     precio_costo: Optional[Decimal] = None
@@ -73,4 +82,83 @@ class ProductoUpdateModel(BaseModel):
     stock_comprometido: Optional[float] = None
     stock_entrante: Optional[float] = None
     es_kit: Optional[bool] = None
-    componentes_kit: Optional[List[ComponenteKitModel]] = None
\ No newline at end of file
+    componentes_kit: Optional[List[ComponenteKitModel]] = None
+
+# --- Modelo de Reprecio Masivo (Doctrina Precio Entero) ---
+class ReprecioModel(BaseModel):
+    # 1. Selección (filtros de igualdad, se resuelven en Firestore)
+    estado: str = 'activos'
+    rubro_id: Optional[str] = None
+    subrubro_id: Optional[str] = None
+    moneda_costo: Optional[str] = None
+
+    # 2. Cambio: 'porcentaje' (8 = +8%, -5.5 = -5,5%) o 'absoluto' (importe a sumar)
+    tipo: Literal['porcentaje', 'absoluto']
+    valor: Decimal
+    aplicar_a: List[Literal['precio_costo', 'precio_base_venta']] = Field(
+        default_factory=lambda: ['precio_costo', 'precio_base_venta'], min_length=1)
+
+    # 3. Simulación: calcula y resume sin escribir
+    dry_run: bool = False
+
+    @model_validator(mode='after')
+    def _porcentaje_valido(self):
+        if self.tipo == 'porcentaje' and self.valor <= -100:
+            raise ValueError("El porcentaje debe ser mayor que -100.")
+        return self
+
+
+# --- Modelos de Kits (Doctrina Kits: BOM con costo acumulado) ---
+class CostosKitsModel(BaseModel):
+    costos: Dict[str, Optional[Decimal]]  # None: kit en ciclo o con componentes faltantes
+    ciclos: List[List[str]] = []
+    faltantes: Dict[str, List[str]] = {}
+
+class RecalculoKitsModel(BaseModel):
+    kits: int
+    modificados: int
+    errores: int = 0
+    dry_run: bool = False
+    ciclos: List[List[str]] = []
+    faltantes: Dict[str, List[str]] = {}
+
+class DisponibilidadConsultaModel(BaseModel):
+    ids: List[str] = []  # Vacío: todos los kits
+    recargar: bool = False
+
+class DisponibilidadKitModel(BaseModel):
+    producto_id: str
+    total: Optional[int] = None  # None: no calculable (ver 'detalle')
+    por_deposito: Dict[str, int] = {}
+    detalle: Optional[str] = None
+
+# --- Modelos de Stock (Doctrina Stock Distribuido) ---
+class MovimientoStockModel(BaseModel):
+    producto_id: str
+    deposito_id: str = Field(..., min_length=1)
+    cantidad: float  # Positiva: ingreso. Negativa: egreso.
+
+class StockProductoModel(BaseModel):
+    producto_id: str
+    stock_total: float
+    stock_comprometido: float = 0
+    disponible: float
+    por_deposito: Dict[str, float] = {}
+    desvio: Optional[Dict[str, float]] = None  # Solo con 'verificar': agregado - suma de shards
+
+class ReposicionModel(BaseModel):
+    id: str
+    sku: str
+    nombre: str
+    stock_total: float
+    stock_comprometido: float
+    stock_minimo_pedido: float
+    faltante: float
+
+# --- Modelos de Búsqueda (Doctrina Búsqueda: índice de nombre / SKU en memoria) ---
+class ResultadoBusquedaModel(BaseModel):
+    id: str
+    sku: str
+    nombre: str
+    baja_logica: bool = False
+    puntaje: int
@@ -1,8 +1,26 @@
 # backend/app/modulos/productos/router.py
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
-from .models import ProductoModel, ProductoUpdateModel
-from .service import producto_service, ProductoService
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from decimal import Decimal
+from typing import List, Optional
+from .models import (
+    ProductoModel, ProductoUpdateModel, ReprecioModel, CostosKitsModel, RecalculoKitsModel,
+    DisponibilidadConsultaModel, DisponibilidadKitModel, MovimientoStockModel, StockProductoModel, ReposicionModel,
+    ResultadoBusquedaModel,
+)
+from .service import (
+    CAMPOS_NUMERICOS, LIMITE_BUSQUEDA, MAX_LIMITE_BUSQUEDA, PATRON_CAMPO_GRUPO, PATRON_CAMPO_PRECIO, PATRON_ORDEN,
+    producto_service, ProductoService,
+)
+from ...core.estadisticas import EstadisticasModel, parsear_lista
+from ...core.exportacion import PATRON_FORMATO_EXPORTACION, respuesta_exportacion
+from ...core.importacion import eventos_ndjson, filas_csv, filas_ndjson, guardar_cuerpo, trozos_de_archivo
+from ...core.lectura import LecturaPorIds, responder
+from ...core.masivo import IdsMasivo, ResultadoItemMasivo, validar_tamano_masivo
+from ...core.paginacion import aplicar_cursor
+from ...core.proyeccion import parsear_campos
+from ...core.versiones import calcular_etag, publicar_etag, respuesta_no_modificada
 
 # --- Adherencia V12: Inyección de Dependencia del Servicio ---
 def get_producto_service():
@@ -22,7 +40,7 @@ router_productos = APIRouter(
                         response_model=ProductoModel, 
                         status_code=status.HTTP_201_CREATED,
                         summary="Crear nuevo Producto (ABR V12)")
-def crear_producto(
+async def crear_producto(
     data: ProductoModel, 
     service: ProductoService = Depends(get_producto_service)
 ):
@@ -30,15 +48,171 @@ def crear_producto(
     Crea un nuevo producto.
     Aplica la Doctrina ABR V12 (Anti-Duplicados) sobre `codigo_producto` y la gestión de contadores.
     """
-    return service.crear_producto(data)
+    return await service.crear_producto(data)
+
+@router_productos.post("/import", 
+                       summary="Importación masiva de Productos (CSV / NDJSON en streaming)")
+async def importar_productos(
+    request: Request,
+    formato: str = Query('csv', pattern='^(csv|ndjson)$'),
+    separador: str = Query(',', min_length=1, max_length=1, description="Separador de columnas del CSV"),
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Importa el archivo enviado como cuerpo crudo del request (no multipart).
+    El cuerpo se vuelca a un temporal y se procesa en streaming por trozos.
+    - CSV: con encabezado; 'unidad_minima_empaque.descripcion' para sub-campos y
+      JSON en la celda para listas (p.ej. stock_depositos).
+    - NDJSON: un ProductoModel por línea.
+    La respuesta es NDJSON con un evento por fila rechazada, uno de progreso por lote y uno final.
+    """
+    archivo = await guardar_cuerpo(request.stream())
+    trozos = trozos_de_archivo(archivo)
+    filas = filas_csv(trozos, separador) if formato == 'csv' else filas_ndjson(trozos)
+    return StreamingResponse(eventos_ndjson(service.importar_productos(filas)),
+                             media_type="application/x-ndjson",
+                             background=BackgroundTask(archivo.close))
+
+@router_productos.post("/reprecio", 
+                       summary="Reprecio masivo por filtro (porcentaje o importe)")
+async def reprecio_masivo(
+    data: ReprecioModel,
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Aplica un cambio de precio a todos los productos que cumplen el filtro
+    (estado, rubro_id, subrubro_id, moneda_costo), en aritmética entera con ROUND_HALF_UP.
+    Con `dry_run` solo simula. La respuesta es NDJSON: errores por producto,
+    progreso por lote y un evento final con totales y una muestra de cambios.
+    Un producto modificado durante el reprecio no se pisa: se informa como CONFLICTO (409).
+    """
+    return StreamingResponse(eventos_ndjson(service.reprecio_masivo(data)),
+                             media_type="application/x-ndjson")
+
+@router_productos.get("/kits/costos", 
+                      response_model=CostosKitsModel,
+                      summary="Costo acumulado de cada kit (BOM)")
+async def costos_kits(
+    recargar: bool = False,
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Calcula el `precio_costo` acumulado de cada kit a partir de sus componentes
+    (kits anidados incluidos, cada sub-kit compartido se evalúa una vez).
+    Informa ciclos y componentes inexistentes. `recargar` relee el grafo de la base.
+    """
+    return await service.costos_kits(recargar)
+
+@router_productos.post("/kits/recalcular", 
+                       response_model=RecalculoKitsModel,
+                       summary="Guardar el costo acumulado de los kits desactualizados")
+async def recalcular_costos_kits(
+    dry_run: bool = False,
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Relee el grafo BOM y guarda `precio_costo` en los kits cuyo costo acumulado cambió.
+    """
+    return await service.recalcular_costos_kits(dry_run)
+
+@router_productos.post("/kits/disponibilidad", 
+                       response_model=List[DisponibilidadKitModel],
+                       summary="Kits armables por depósito y en total (masivo)")
+async def disponibilidad_kits(
+    consulta: DisponibilidadConsultaModel,
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Para cada kit: mínimo entre componentes de floor(disponible / cantidad), donde
+    disponible = stock_depositos - stock_comprometido. `ids` vacío: todos los kits.
+    Se resuelve en memoria sobre el índice de componentes (sin una lectura por componente).
+    """
+    validar_tamano_masivo(consulta.ids)
+    return await service.disponibilidad_kits(consulta.ids, consulta.recargar)
+
+@router_productos.post("/baja-masiva", 
+                       response_model=List[ResultadoItemMasivo],
+                       summary="Baja lógica masiva de Productos (Doctrina VIL)")
+async def baja_productos_masiva(
+    data: IdsMasivo, 
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Da de baja los productos por id en WriteBatch troceados (una lectura agrupada para todo el conjunto).
+    Devuelve un resultado por id, en el mismo orden: BAJA, SIN_CAMBIOS, NO_ENCONTRADO o ERROR.
+    """
+    return await service.cambiar_estado_productos_masivo(data.ids, baja=True)
+
+@router_productos.post("/reactivar-masivo", 
+                       response_model=List[ResultadoItemMasivo],
+                       summary="Reactivación masiva de Productos (Doctrina VIL)")
+async def reactivar_productos_masivo(
+    data: IdsMasivo, 
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Reactiva los productos por id en WriteBatch troceados.
+    Devuelve un resultado por id, en el mismo orden: REACTIVADO, SIN_CAMBIOS, NO_ENCONTRADO o ERROR.
+    """
+    return await service.cambiar_estado_productos_masivo(data.ids, baja=False)
+
+@router_productos.post("/batch-get", 
+                       response_model=LecturaPorIds[ProductoModel],
+                       summary="Obtener Productos por lista de ids (lectura agrupada)")
+async def obtener_productos_por_ids(
+    data: IdsMasivo, 
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. sku,nombre); el id va siempre"),
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Devuelve los productos pedidos en el orden de entrada (repetidos una vez) y los ids inexistentes en `faltantes`.
+    Precios decodificados a Decimal. Un get_all cada 500 ids.
+    """
+    campos = parsear_campos(fields, ProductoModel)
+    return responder(response, await service.leer_productos_por_ids(data.ids, campos))
+
+@router_productos.post("/stock/movimientos", 
+                       response_model=List[ResultadoItemMasivo],
+                       summary="Registrar movimientos de stock (contadores distribuidos)")
+async def registrar_movimientos_stock(
+    movimientos: List[MovimientoStockModel],
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Suma `cantidad` (negativa para egresos) al depósito de cada producto.
+    Cada movimiento va a un shard al azar y actualiza los agregados del producto en la misma escritura:
+    movimientos concurrentes sobre un mismo producto no se serializan en un único documento.
+    Devuelve un resultado por item, en el mismo orden: CREADO (movimiento registrado), NO_ENCONTRADO o ERROR.
+    """
+    return await service.registrar_movimientos(movimientos)
+
+@router_productos.get("/stock/reposicion", 
+                      response_model=List[ReposicionModel],
+                      summary="Productos activos por debajo del stock mínimo")
+async def reporte_reposicion(
+    service: ProductoService = Depends(get_producto_service)
+):
+    return await service.reporte_reposicion()
 
 @router_productos.get("/", 
                       response_model=List[ProductoModel],
-                      summary="Listar Productos (Filtro VIL)")
-def listar_productos(
+                      summary="Listar Productos (Filtro VIL + filtros en servidor)")
+async def listar_productos(
+    request: Request,
+    response: Response,
     estado: str = 'activos', 
     rubro_id: str = None,
     subrubro_id: str = None,
+    unidad_medida: Optional[str] = None,
+    moneda_costo: Optional[str] = None,
+    precio_min: Optional[Decimal] = Query(None, ge=0, description="Mínimo (inclusive) del precio elegido en `precio`"),
+    precio_max: Optional[Decimal] = Query(None, ge=0, description="Máximo (inclusive) del precio elegido en `precio`"),
+    precio: str = Query('precio_base_venta', pattern=PATRON_CAMPO_PRECIO, description="Precio al que se aplica el rango"),
+    orden: Optional[str] = Query(None, pattern=PATRON_ORDEN, description="Campo de orden (sku, nombre, precio_costo, precio_base_venta); '-' adelante: descendente"),
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (con tope del servidor)"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la cabecera X-Siguiente-Cursor"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. sku,nombre); el id va siempre"),
     service: ProductoService = Depends(get_producto_service)
 ):
     """
@@ -46,24 +220,142 @@ def listar_productos(
     - 'activos' (default): Solo baja_logica = false
     - 'inactivos': Solo baja_logica = true
     - 'todos': Todos los registros
+
+    Doctrina Filtros en Servidor: rubro, subrubro, unidad, moneda y el rango de precio se
+    resuelven en la consulta de Firestore (solo se leen los productos que coinciden).
+    Con rango de precio el orden es por ese precio (ascendente si no se indica `orden`).
+
+    Doctrina Paginación: si hay más resultados, la respuesta trae la cabecera
+    `X-Siguiente-Cursor`; se envía de vuelta en `cursor` (con los mismos filtros y orden)
+    para pedir la página siguiente.
+    """
+    # Doctrina Versiones: GET condicional (If-None-Match -> 304 sin leer ni serializar la lista)
+    campos = parsear_campos(fields, ProductoModel)
+    etag = calcular_etag('productos', await service.version_listado(), estado, rubro_id, subrubro_id,
+                         unidad_medida, moneda_costo, precio_min, precio_max, precio, orden, limit, cursor, campos)
+    no_modificado = respuesta_no_modificada(request, etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    pagina = await service.listar_productos(estado=estado, rubro_id=rubro_id, subrubro_id=subrubro_id,
+                                            limite=limit, cursor=cursor, campos=campos,
+                                            unidad_medida=unidad_medida, moneda_costo=moneda_costo,
+                                            precio_min=precio_min, precio_max=precio_max,
+                                            campo_precio=precio, orden=orden)
+    publicar_etag(response, etag)
+    # Doctrina Lectura Confiable: la página sale en bytes (modelo completo o recortado por 'fields')
+    return responder(response, aplicar_cursor(response, pagina))
+
+@router_productos.get("/export", 
+                      summary="Exportar Productos (NDJSON / CSV en streaming)")
+async def exportar_productos(
+    estado: str = 'todos',
+    formato: str = Query('ndjson', alias='format', pattern=PATRON_FORMATO_EXPORTACION),
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Vuelca la colección completa (o filtrada por estado VIL) fila por fila,
+    para backups y extracciones BI. Memoria y tiempo al primer byte constantes.
     """
-    return service.listar_productos(estado=estado, rubro_id=rubro_id, subrubro_id=subrubro_id)
+    return respuesta_exportacion(service.exportar_productos(estado, formato), 'productos', formato)
 
 @router_productos.get("/codigo/next", 
                       summary="Obtener próximo código de Producto (Operación Contadores)",
                       response_model=int)
-def obtener_siguiente_codigo(
+async def obtener_siguiente_codigo(
+    rubro_id: Optional[str] = Query(None, description="Correlativo propio del rubro (contadores/{rubro_id})"),
     service: ProductoService = Depends(get_producto_service)
 ):
     """
     Genera y reserva el próximo código numérico para un nuevo producto.
+    Los códigos salen de un bloque reservado en memoria (Doctrina Contadores): pueden quedar huecos, nunca repetidos.
+    """
+    return await service.obtener_siguiente_codigo(rubro_id)
+
+@router_productos.get("/stats", 
+                      response_model=EstadisticasModel,
+                      summary="Estadísticas de Productos (agregaciones en Firestore)")
+async def estadisticas_productos(
+    estado: str = 'activos', 
+    rubro_id: Optional[str] = None,
+    subrubro_id: Optional[str] = None,
+    unidad_medida: Optional[str] = None,
+    moneda_costo: Optional[str] = None,
+    sumas: Optional[str] = Query(None, description="Campos a sumar separados por coma (p.ej. stock_total,precio_costo)"),
+    promedios: Optional[str] = Query(None, description="Campos a promediar separados por coma (p.ej. precio_base_venta)"),
+    por: Optional[str] = Query(None, pattern=PATRON_CAMPO_GRUPO, description="Agrupar por rubro_id, subrubro_id, unidad_medida, moneda_costo o condicion_iva_id"),
+    valores: Optional[str] = Query(None, description="Valores del grupo separados por coma (por defecto: los de la tabla maestra)"),
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    count(), sum() y avg() resueltos por Firestore con los filtros del listado: el servidor no
+    transfiere productos (p.ej. `?moneda_costo=USD&sumas=stock_total`, `?por=subrubro_id`).
+    Los precios salen en importes con 4 decimales. Los agrupados corren en paralelo.
+    Resultados cacheados unos segundos.
+    """
+    filtros = {'rubro_id': rubro_id, 'subrubro_id': subrubro_id,
+               'unidad_medida': unidad_medida, 'moneda_costo': moneda_costo}
+    return await service.estadisticas_productos(
+        estado, filtros,
+        sumas=parsear_lista(sumas, CAMPOS_NUMERICOS, 'sumas'),
+        promedios=parsear_lista(promedios, CAMPOS_NUMERICOS, 'promedios'),
+        por=por, valores=[v.strip() for v in valores.split(',') if v.strip()] if valores else None,
+    )
+
+@router_productos.get("/buscar", 
+                      response_model=List[ResultadoBusquedaModel],
+                      summary="Buscar Productos por nombre / SKU (prefijo, sin acentos)")
+async def buscar_productos(
+    response: Response,
+    q: str = Query(..., min_length=2, max_length=60, description="Texto a buscar: comienzo de palabras del nombre o del SKU"),
+    estado: str = 'activos', 
+    limit: int = Query(LIMITE_BUSQUEDA, ge=1, le=MAX_LIMITE_BUSQUEDA, description="Cantidad máxima de resultados"),
+    recargar: bool = False,
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Búsqueda para autocompletar: cada término debe ser el comienzo de una palabra del nombre o
+    del SKU, sin distinguir acentos ni mayúsculas (`?q=valv esf` encuentra "Válvula Esférica").
+    Orden: SKU exacto, SKU por prefijo, nombre exacto, nombre por prefijo, palabras completas.
+    Se resuelve sobre un índice en memoria (sin leer productos); `recargar` lo rearma desde la base.
+    """
+    return responder(response, await service.buscar_productos(q, limit, estado, recargar))
+
+@router_productos.get("/{id}", 
+                      response_model=ProductoModel,
+                      summary="Obtener Producto por ID")
+async def obtener_producto(
+    id: str, 
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. sku,nombre); el id va siempre"),
+    service: ProductoService = Depends(get_producto_service)
+):
+    """
+    Obtiene un producto con los precios decodificados a Decimal (4 decimales).
     """
-    return service.obtener_siguiente_codigo()
+    campos = parsear_campos(fields, ProductoModel)
+    producto = await service.obtener_producto_por_id(id, campos)
+    if not producto:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return responder(response, producto)
+
+@router_productos.get("/{id}/stock", 
+                      response_model=StockProductoModel,
+                      summary="Stock de un Producto (total y por depósito)")
+async def obtener_stock(
+    id: str,
+    verificar: bool = Query(False, description="Informar el desvío de los agregados del producto respecto de los shards"),
+    service: ProductoService = Depends(get_producto_service)
+):
+    stock = await service.obtener_stock(id, verificar)
+    if stock is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return stock
 
 @router_productos.patch("/{id}", 
                         response_model=ProductoModel,
                         summary="Actualizar Producto (PATCH)")
-def actualizar_producto(
+async def actualizar_producto(
     id: str, 
     data: ProductoUpdateModel, 
     service: ProductoService = Depends(get_producto_service)
@@ -71,7 +363,7 @@ def actualizar_producto(
     """
     Actualiza parcialmente un producto (nombre, descripcion, etc.).
     """
-    updated = service.actualizar_producto(id, data)
+    updated = await service.actualizar_producto(id, data)
     if not updated:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return updated
@@ -79,7 +371,7 @@ def actualizar_producto(
 @router_productos.delete("/{id}", 
                          status_code=status.HTTP_204_NO_CONTENT,
                          summary="Baja Lógica (Doctrina VIL)")
-def baja_logica_producto(
+async def baja_logica_producto(
     id: str, 
     service: ProductoService = Depends(get_producto_service)
 ):
@@ -87,6 +379,6 @@ def baja_logica_producto(
     Realiza una baja lógica (Doctrina VIL) del producto.
     Establece baja_logica = true.
     """
-    if not service.baja_logica_producto(id):
+    if not await service.baja_logica_producto(id):
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return {}
\ No newline at end of file
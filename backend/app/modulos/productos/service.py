@@ -1,60 +1,1053 @@
 # backend/app/modulos/productos/service.py
-from typing import List, Optional
-from .models import ProductoModel, ProductoUpdateModel
+import asyncio
+from collections import Counter
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Type
+from fastapi import HTTPException, status
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1.base_query import FieldFilter
+from pydantic import BaseModel, ValidationError
+from .models import (
+    ProductoModel, ProductoUpdateModel, ReprecioModel, CostosKitsModel, RecalculoKitsModel, DisponibilidadKitModel,
+    MovimientoStockModel, StockProductoModel, ReposicionModel, ResultadoBusquedaModel,
+)
+from .helpers.producto_helper import (
+    _transaccion_crear_producto,
+    _dividir_half_up,
+    _excepcion_duplicado,
+    DuplicadoActivoException,
+    DuplicadoInactivoException,
+)
+from .helpers.busqueda_helper import (
+    CAMPO_BUSQUEDA, CAMPOS_BUSQUEDA, VERSION_BUSQUEDA, IndiceBusqueda, claves_busqueda, normalizar,
+)
+from .helpers.kit_helper import VERSION_KITS, GrafoKits, componentes_exactos
+from .helpers.stock_helper import (
+    agregados_stock,
+    depositos_guardados,
+    escribir_inventario,
+    escribir_movimiento,
+    sumar_shards,
+)
 from decimal import Decimal, Context, ROUND_HALF_UP
+from fractions import Fraction
+from ...core.actualizacion import actualizar_con_retorno
+from ...core.claves_unicas import claves_existentes, reservar_clave, sincronizar_clave
+from ...core.contadores import ContadorInexistente, asignador, descartar_asignador
+from ...core.estadisticas import EstadisticasModel, calcular_estadisticas, valores_de_coleccion
+from ...core.exportacion import documentos_por_paginas, exportar_consulta
+from ...core.importacion import TAMANO_LOTE_IMPORTACION, Fila, importar_en_lotes
+from ...core.lectura import LecturaPorIds, leer_por_ids, validar_documentos
+from ...core.masivo import (
+    MAX_OPERACIONES_LOTE, ResultadoItemMasivo, cambiar_estado_masivo, confirmar_lotes, en_paralelo, id_valido,
+    leer_documentos, validar_tamano_masivo,
+)
+from ...core.paginacion import Pagina, paginar_consulta
+from ...core.proyeccion import Campos, campos_firestore, modelo_proyectado
+from ...core.referencias import (
+    RELACIONES, colecciones_padre, escribir_referencias, incrementos, padres_activos, referencias_por_altas,
+    referencias_por_cambio, resolver_padres,
+)
+from ...core.versiones import confirmar_version, marcar_version, obtener_version, version_vigente
 
 # --- DOCTRINA V2.0: Contexto de precisión financiera canónica ---
 # Define el estándar de 4 decimales
 FOUR_PLACES = Context(prec=10, rounding=ROUND_HALF_UP).create_decimal('0.0001')
+CAMPOS_PRECIO = ('precio_costo', 'precio_base_venta')
+
+# --- Doctrina Precio Entero: en Firestore los precios son enteros escalados ---
+# 1.2345 -> 12345. Aritmética exacta, rangos y orden nativos en consultas.
+ESCALA_PRECIO_EXP = 4  # Mismo paso que FOUR_PLACES
+
+# Doctrina Contadores: el código numérico de producto entra en 'sku' (8 caracteres)
+MAXIMO_CODIGO_PRODUCTO = 99999999
+# Contadores globales de 'contadores': un rubro_id del cliente nunca los nombra
+CONTADORES_GLOBALES = ('productos', 'rubros')
+
+# Doctrina Claves Únicas: un cambio de SKU agrega hasta 2 escrituras (alta de la nueva + borrado de la anterior)
+ESCRITURAS_CLAVE = 2
+
+# Reprecio: cuántos cambios se devuelven como muestra en el resumen
+MUESTRA_REPRECIO = 20
+
+# --- Doctrina Filtros en Servidor: lo que el listado empuja a la consulta de Firestore ---
+# Igualdades combinables entre sí + un rango de precio + orden por un campo. Cada par
+# (igualdad, campo de orden) tiene su índice compuesto en backend/firestore.indexes.json
+# (firebase deploy --only firestore:indexes): Firestore los combina para cualquier conjunto
+# de igualdades sin declarar cada combinación.
+FILTROS_IGUALDAD = ('rubro_id', 'subrubro_id', 'unidad_medida', 'moneda_costo')
+CAMPOS_ORDEN = ('sku', 'nombre') + CAMPOS_PRECIO
+PATRON_ORDEN = rf"^-?({'|'.join(CAMPOS_ORDEN)})$"
+PATRON_CAMPO_PRECIO = rf"^({'|'.join(CAMPOS_PRECIO)})$"
+
+# --- Doctrina Estadísticas: campos agrupables y numéricos (sum / avg) de /productos/stats ---
+CAMPOS_GRUPO = FILTROS_IGUALDAD + ('condicion_iva_id',)
+PATRON_CAMPO_GRUPO = rf"^({'|'.join(CAMPOS_GRUPO)})$"
+CAMPOS_NUMERICOS = CAMPOS_PRECIO + ('stock_total', 'stock_comprometido', 'stock_entrante')
+
+# --- Doctrina Búsqueda: /productos/buscar ---
+LIMITE_BUSQUEDA = 20
+MAX_LIMITE_BUSQUEDA = 100
+# Consulta de respaldo (índice todavía sin cargar): candidatos leídos por la clave más larga
+MAX_CANDIDATOS_BUSQUEDA = 500
 
-# Simulación de la capa de base de datos (Firestore)
-# from core.database import db
-# db_productos = db.collection('productos')
 
 class ProductoService:
+    # Doctrina Singleton __init__: la instancia DB la inyecta el lifespan de main.py
+    def __init__(self, db_instance):
+        self.db = db_instance
+        # Doctrina Kits: grafo BOM en memoria (se arma con la primera consulta que lo necesita)
+        self._grafo_kits: Optional[GrafoKits] = None
+        # Doctrina Búsqueda: índice de nombre / SKU en memoria (carga en segundo plano con la primera búsqueda)
+        self._indice_busqueda: Optional[IndiceBusqueda] = None
+        self._carga_busqueda: Optional[asyncio.Future] = None
+        # Escrituras de este worker durante una carga (se repasan sobre el índice nuevo)
+        self._busqueda_pendientes: Optional[List[Tuple[List[Tuple[str, dict]], int]]] = None
 
     def _quantize_decimal(self, value: Decimal) -> Decimal:
         """Asegura la adherencia a la doctrina de 4 decimales."""
         return value.quantize(FOUR_PLACES)
 
+    # --- Codificación Firestore (Doctrina Precio Entero) ---
+
+    def _a_entero(self, value: Decimal) -> int:
+        """Decimal -> entero escalado (cuantiza primero: nunca se trunca)."""
+        return int(self._quantize_decimal(value).scaleb(ESCALA_PRECIO_EXP))
+
+    def _a_decimal(self, valor) -> Decimal:
+        """Entero escalado -> Decimal. Tolera el formato previo (str / float)."""
+        if isinstance(valor, int):
+            return Decimal(valor).scaleb(-ESCALA_PRECIO_EXP).quantize(FOUR_PLACES)
+        return self._quantize_decimal(Decimal(str(valor)))
+
+    def _entero_escalado(self, valor) -> int:
+        """Valor guardado -> entero escalado (sin pasar por Decimal si ya es entero)."""
+        if isinstance(valor, int):
+            return valor
+        return self._a_entero(self._a_decimal(valor or 0))
+
+    def _a_firestore(self, producto: ProductoModel) -> dict:
+        """Serializa para Firestore: precios como enteros escalados, stock como agregados por depósito."""
+        datos = producto.model_dump(exclude={'id'})
+        for campo in CAMPOS_PRECIO:
+            datos[campo] = self._a_entero(datos[campo])
+        datos.update(agregados_stock(datos.pop('stock_depositos')))
+        # Doctrina Búsqueda: prefijos normalizados de nombre y SKU (consulta de respaldo)
+        datos[CAMPO_BUSQUEDA] = claves_busqueda(datos['sku'], datos['nombre'])
+        return datos
+
+    def _decodificar_precios(self, datos: dict) -> dict:
+        for campo in CAMPOS_PRECIO:
+            valor = datos.get(campo)
+            if valor is not None:
+                datos[campo] = self._a_decimal(valor)
+        return datos
+
+    def _decodificar(self, datos: dict) -> dict:
+        """Documento -> forma del modelo: precios Decimal y stock_depositos desde los agregados."""
+        self._decodificar_precios(datos)
+        if 'stock_por_deposito' in datos or 'stock_depositos' in datos:
+            datos['stock_depositos'] = depositos_guardados(datos)
+            datos.pop('stock_por_deposito', None)
+            if datos.get('stock_total') is None:
+                datos['stock_total'] = sum(d['stock_real'] for d in datos['stock_depositos'])
+        return datos
+
+    def _rutas_firestore(self, campos: Campos) -> Optional[List[str]]:
+        """Campos del modelo -> rutas guardadas (stock_depositos vive como stock_por_deposito)."""
+        if not campos:
+            return None
+        rutas = campos_firestore(campos)
+        if 'stock_depositos' in rutas or 'stock_total' in rutas:
+            rutas = rutas + [r for r in ('stock_depositos', 'stock_por_deposito', 'stock_total') if r not in rutas]
+        return rutas
+
+    def _desde_firestore(self, docs: Iterable, modelo: Type[BaseModel] = ProductoModel) -> List[BaseModel]:
+        """
+        Decodifica un lote de snapshots en una sola pasada (id + precios + stock) y lo valida
+        entero con el TypeAdapter cacheado del modelo (Doctrina Lectura Confiable).
+        """
+        return validar_documentos(modelo, docs, self._decodificar)
+
+    # --- Async nativo (AsyncClient) ---
+
     async def crear_producto(self, producto_data: ProductoModel) -> ProductoModel:
-        # DOCTRINA V2.0: Asegurar precisión antes de persistir
-        producto_data.precio_costo = self._quantize_decimal(producto_data.precio_costo)
-        producto_data.precio_base_venta = self._quantize_decimal(producto_data.precio_base_venta)
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            # DOCTRINA V2.0: la precisión se asegura al codificar (cuantiza y escala)
+            datos = self._a_firestore(producto_data)
+            # Doctrina Referencias: contadores de rubro, subrubro, IVA y unidad en la misma transacción
+            referencias = await referencias_por_altas(self.db, 'productos', [datos])
+            transaction = self.db.transaction()
+            # Doctrina Kits: un kit nuevo es un ancestro que los grafos de otros workers no tienen
+            nuevo_id = await _transaccion_crear_producto(transaction, producto_data=datos, db=self.db,
+                                                         referencias=referencias,
+                                                         versiones=(VERSION_KITS,) if datos.get('es_kit') else ())
+            self._grafo_kits = None
+            self._registrar_busqueda([(nuevo_id, datos)])
+
+            datos = self._decodificar(datos)
+            datos['id'] = nuevo_id
+            return ProductoModel.model_validate(datos)
 
-        # Lógica de persistencia (Mock)
-        # ... (serializar Decimal a str para Firestore) ...
+        except DuplicadoActivoException as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.detail)
+        except DuplicadoInactivoException as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.detail)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
 
-        producto_data.id = "mock-firestore-id-v2" # Mock
-        print(f"Servicio v2.0: Creando producto {producto_data.sku} con precisión Decimal.")
-        return producto_data
+    async def obtener_producto_por_id(self, id: str, campos: Campos = None) -> Optional[ProductoModel]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
-    async def obtener_producto_por_id(self, id: str) -> Optional[ProductoModel]:
-        # ... (deserializar str de Firestore a Decimal) ...
-        print(f"Servicio v2.0: Obteniendo producto ID {id}")
-        return None # Mock
+        try:
+            mascara = self._rutas_firestore(campos)
+            doc = await self.db.collection('productos').document(id).get(field_paths=mascara)
+            if not doc.exists:
+                return None
+            modelo = modelo_proyectado(ProductoModel, campos) if campos else ProductoModel
+            return self._desde_firestore([doc], modelo)[0]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener producto: {e}")
+
+    async def obtener_productos_por_ids(self, ids: List[str], campos: Campos = None) -> Dict[str, ProductoModel]:
+        """
+        Lectura agrupada con get_all (un RPC por cada 500 ids, en paralelo).
+        Devuelve {id: producto}; los ids inexistentes no aparecen.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        mascara = self._rutas_firestore(campos)
+        modelo = modelo_proyectado(ProductoModel, campos) if campos else ProductoModel
+        try:
+            docs = await leer_documentos(self.db, 'productos', ids, mascara)
+            return {producto.id: producto for producto in self._desde_firestore(docs.values(), modelo)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener productos: {e}")
+
+    async def leer_productos_por_ids(self, ids: List[str], campos: Campos = None) -> LecturaPorIds:
+        """Batch-get: orden de entrada + faltantes (lectura agrupada de obtener_productos_por_ids)."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+        modelo = modelo_proyectado(ProductoModel, campos) if campos else ProductoModel
+        return await leer_por_ids(modelo, ids, lambda pendientes: self.obtener_productos_por_ids(pendientes, campos))
 
     async def obtener_producto_por_sku(self, sku: str) -> Optional[ProductoModel]:
-        # Implementación similar a obtener_producto_por_id
-        print(f"Servicio v2.0: Obteniendo producto SKU {sku}")
-        return None # Mock
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        query = self.db.collection('productos').where(filter=FieldFilter("sku", "==", sku)).limit(1)
+        docs = [doc async for doc in query.stream()]
+        return self._desde_firestore(docs)[0] if docs else None
+
+    async def listar_productos(self, estado: str = 'activos', rubro_id: str = None, subrubro_id: str = None,
+                               limite: Optional[int] = None, cursor: Optional[str] = None,
+                               campos: Campos = None, unidad_medida: str = None, moneda_costo: str = None,
+                               precio_min: Optional[Decimal] = None, precio_max: Optional[Decimal] = None,
+                               campo_precio: str = 'precio_base_venta', orden: Optional[str] = None) -> Pagina:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        # Doctrina Filtros en Servidor: un rango obliga a ordenar primero por ese campo (regla de Firestore)
+        descendente = bool(orden) and orden.startswith('-')
+        campo_orden = orden.lstrip('-') if orden else None
+        hay_rango = precio_min is not None or precio_max is not None
+        if hay_rango:
+            if campo_orden is None:
+                campo_orden = campo_precio
+            elif campo_orden != campo_precio:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Con rango de precio el orden debe ser por '{campo_precio}'.")
 
-    async def listar_productos(self, activos: bool = True) -> List[ProductoModel]:
-        # Implementación similar (bucle para deserializar Decimales)
-        print(f"Servicio v2.0: Listando productos (activos={activos})")
-        return [] # Mock
+        try:
+            query = self.db.collection('productos')
+
+            # Doctrina VIL (Filtro de Tres Vías)
+            if estado == 'activos':
+                query = query.where(filter=FieldFilter("baja_logica", "==", False))
+            elif estado == 'inactivos':
+                query = query.where(filter=FieldFilter("baja_logica", "==", True))
+            filtros = {'rubro_id': rubro_id, 'subrubro_id': subrubro_id,
+                       'unidad_medida': unidad_medida, 'moneda_costo': moneda_costo}
+            for campo in FILTROS_IGUALDAD:
+                if filtros[campo]:
+                    query = query.where(filter=FieldFilter(campo, "==", filtros[campo]))
+            # Doctrina Precio Entero: el rango se compara contra los enteros escalados guardados
+            if precio_min is not None:
+                query = query.where(filter=FieldFilter(campo_precio, ">=", self._a_entero(precio_min)))
+            if precio_max is not None:
+                query = query.where(filter=FieldFilter(campo_precio, "<=", self._a_entero(precio_max)))
+
+            # Doctrina Proyección: solo viajan y se validan los campos pedidos
+            # (el campo de orden viaja siempre: arma el cursor de la página siguiente)
+            modelo = ProductoModel
+            if campos:
+                rutas = self._rutas_firestore(campos)
+                if campo_orden and campo_orden not in rutas:
+                    rutas = [r for r in rutas if r != '__name__'] + [campo_orden]
+                query = query.select(rutas)
+                modelo = modelo_proyectado(ProductoModel, campos)
+
+            # Doctrina Paginación: order_by(campo de orden, id) + start_after(cursor) + limit
+            docs, siguiente_cursor = await paginar_consulta(query, limite, cursor, campo_orden, descendente)
+            return Pagina(self._desde_firestore(docs, modelo), siguiente_cursor)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al listar productos: {e}")
+
+    # --- Doctrina Estadísticas: agregaciones en Firestore (sin transferir productos) ---
+    async def estadisticas_productos(self, estado: str = 'activos', filtros: Optional[Dict[str, str]] = None,
+                                     sumas: Tuple[str, ...] = (), promedios: Tuple[str, ...] = (),
+                                     por: Optional[str] = None, valores: Optional[List[str]] = None) -> EstadisticasModel:
+        """
+        count() y sum() / avg() de los campos numéricos (precios en importes, no en enteros escalados),
+        con los mismos filtros de igualdad que el listado. Con 'por', una agregación por valor:
+        los de 'valores' o, para una relación (rubro, subrubro, IVA, unidad), los de la tabla maestra.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        if por and not valores and por not in RELACIONES['productos']:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Indique 'valores' para agrupar por '{por}'.")
+
+        try:
+            grupos = valores
+            if por and not grupos:
+                coleccion, campo_clave = RELACIONES['productos'][por]
+                grupos = await valores_de_coleccion(self.db, coleccion, campo_clave)
+            return await calcular_estadisticas(self.db, 'productos', estado, filtros, sumas, promedios,
+                                               escalas={c: ESCALA_PRECIO_EXP for c in CAMPOS_PRECIO},
+                                               por=por, grupos=grupos)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al calcular estadísticas de productos: {e}")
+
+    # --- Doctrina Contadores (hi-lo) ---
+    async def _mayor_sku_numerico(self) -> int:
+        """Semilla del contador global: el mayor 'sku' numérico ya cargado (lectura proyectada)."""
+        query = self.db.collection('productos').select(['sku'])
+        mayor = 0
+        async for doc in documentos_por_paginas(query):
+            sku = str((doc.to_dict() or {}).get('sku', ''))
+            if sku.isdigit():
+                mayor = max(mayor, int(sku))
+        return mayor
+
+    async def obtener_siguiente_codigo(self, rubro_id: Optional[str] = None) -> int:
+        """
+        Próximo código de producto. Sin rubro: correlativo global (contadores/productos).
+        Con rubro: correlativo del rubro (contadores/{rubro_id}, creado junto con el rubro).
+        Un rubro_id que no puede ser id de documento (vacío, con '/') o que nombra un contador global: 404.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            if rubro_id is not None:
+                if not id_valido(rubro_id) or rubro_id in CONTADORES_GLOBALES:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rubro no encontrado")
+                contador = asignador(rubro_id, crear=False)
+            else:
+                contador = asignador('productos', maximo=MAXIMO_CODIGO_PRODUCTO, semilla=self._mayor_sku_numerico)
+            return await contador.siguiente(self.db)
+        except ContadorInexistente:
+            descartar_asignador(rubro_id)
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rubro no encontrado")
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener el próximo código: {e}")
+
+    async def version_listado(self) -> int:
+        """Versión de la colección para el ETag de los listados (lectura reusada durante SL_VERSION_TTL segundos)."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        return await version_vigente(self.db, 'productos')
 
     async def actualizar_producto(self, id: str, data: ProductoUpdateModel) -> Optional[ProductoModel]:
-        # update_data = data.dict(exclude_unset=True) # Clave del PATCH
-        # DOCTRINA V2.0: Asegurar precisión en los campos que vienen
-        # ... (quantize y serializar a str) ...
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        update_data = data.model_dump(exclude_unset=True)  # Clave del PATCH
+        # DOCTRINA V2.0: precisión de 4 decimales en los precios que vienen
+        for campo in CAMPOS_PRECIO:
+            if update_data.get(campo) is not None:
+                update_data[campo] = self._a_entero(update_data[campo])
 
-        print(f"Servicio v2.0: Actualizando (PATCH) producto ID {id} con precisión Decimal.")
-        return await self.obtener_producto_por_id(id) # Mock
+        productos_ref = self.db.collection('productos')
+        doc_ref = productos_ref.document(id)
+        depositos = update_data.pop('stock_depositos', None)
+        if depositos is not None:
+            # Doctrina Stock Distribuido: un PATCH de stock es un inventario (valor absoluto)
+            update_data.update(agregados_stock(depositos))
+        busqueda = bool(set(CAMPOS_BUSQUEDA) & update_data.keys())
+        costo_o_bom = bool({'precio_costo', 'componentes_kit', 'es_kit'} & update_data.keys())
+        kits: Dict[str, int] = {}
+        en_lote = 0
+        grafo_modificado = False
+
+        async def preparar(lote, actual: dict):
+            # Corre en cada intento: todo lo que depende de la pre-imagen se recalcula
+            nonlocal kits, en_lote, grafo_modificado
+            # Escrituras del lote: update del producto + versión (las agrega actualizar_con_retorno) + cada paso
+            escrituras = 2
+            # Doctrina Búsqueda: las claves se recalculan con el sku y el nombre resultantes
+            if {'sku', 'nombre'} & update_data.keys():
+                update_data[CAMPO_BUSQUEDA] = claves_busqueda(update_data.get('sku', actual.get('sku')),
+                                                              update_data.get('nombre', actual.get('nombre')))
+            if busqueda:
+                marcar_version(lote, self.db, VERSION_BUSQUEDA)
+                escrituras += 1
+            # Doctrina ABR + Claves Únicas: el nuevo SKU no puede pisar el de otro producto
+            dueno = await sincronizar_clave(self.db, lote, 'productos', 'sku', id, update_data, actual)
+            if dueno is not None:
+                e = _excepcion_duplicado(dueno[0], dueno[1], update_data['sku'])
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.detail)
+            if 'sku' in update_data or 'baja_logica' in update_data:
+                escrituras += ESCRITURAS_CLAVE
+            if depositos is not None:
+                depositos_previos = await sumar_shards(doc_ref)
+                escrituras += escribir_inventario(lote, doc_ref, update_data['stock_por_deposito'], depositos_previos)
+            # Doctrina Referencias: reasignación, baja o reactivación mueven los contadores de los padres
+            referencias = await referencias_por_cambio(self.db, 'productos', id, update_data, actual)
+            escribir_referencias(lote, 'productos', referencias, self.db)
+            escrituras += len(referencias) + len(colecciones_padre(referencias))
+            if escrituras > MAX_OPERACIONES_LOTE:
+                raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                    detail="El inventario supera las escrituras de un lote (demasiados depósitos).")
+            # Doctrina Kits: un cambio de costo o de BOM recalcula solo los kits ancestros.
+            # Va después de las validaciones (SKU, ciclo): el grafo en memoria se modifica solo
+            # si el PATCH llega al commit (si no, se descarta más abajo)
+            if costo_o_bom:
+                if grafo_modificado:
+                    self._grafo_kits = None  # Reintento: el grafo ya tiene aplicado el intento anterior
+                grafo_modificado = True
+                kits = await self._propagar_a_kits(id, update_data, actual)
+                if id in kits:
+                    update_data['precio_costo'] = kits.pop(id)  # El costo de un kit es el calculado
+                marcar_version(lote, self.db, VERSION_KITS)
+                escrituras += 1
+            # Los kits ancestros completan el lote; el resto va en lotes aparte después del commit
+            en_lote = MAX_OPERACIONES_LOTE - escrituras
+            for kit_id, costo in list(kits.items())[:en_lote]:
+                lote.update(productos_ref.document(kit_id), {'precio_costo': costo})
+
+        try:
+            # Doctrina Escritura con Retorno: dato + claves + inventario + referencias + versiones en un
+            # WriteBatch condicionado a la pre-imagen; la respuesta sale de ella (sin releer)
+            datos = await actualizar_con_retorno(self.db, 'productos', id, update_data, preparar)
+            if datos is None:
+                if grafo_modificado:
+                    self._grafo_kits = None
+                return None
+            if busqueda:
+                self._registrar_busqueda([(id, update_data)])
+            if costo_o_bom:
+                self._registrar_kits()
+            ancestros = list(kits.items())[en_lote:]
+            if ancestros:
+                await confirmar_lotes(self.db, 'productos', ancestros,
+                                      lambda l, k: l.update(productos_ref.document(k[0]), {'precio_costo': k[1]}))
+
+            # Doctrina Kits: la disponibilidad de los kits sigue al stock de sus componentes
+            if self._grafo_kits is not None and (depositos is not None or 'stock_comprometido' in update_data):
+                self._grafo_kits.aplicar_stock(id, depositos, update_data.get('stock_comprometido'))
+
+            return ProductoModel.model_validate(self._decodificar(datos))
+        except HTTPException:
+            if grafo_modificado:
+                self._grafo_kits = None  # Conflicto después de propagar (p.ej. reintentos agotados)
+            raise
+        except AlreadyExists:
+            self._grafo_kits = None
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="El SKU fue tomado por otra operación concurrente.")
+        except Exception as e:
+            self._grafo_kits = None  # El grafo pudo quedar adelantado a la base
+            raise HTTPException(status_code=500, detail=f"Error al actualizar: {e}")
 
     async def baja_logica_producto(self, id: str) -> bool:
-        print(f"Servicio v2.0: Dando de baja lógica producto ID {id}")
-        return True # Mock
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            baja = {"baja_logica": True}
+
+            async def preparar(lote, actual: dict):
+                # Clave única y contadores de los padres desde la pre-imagen (sin releer el producto)
+                await sincronizar_clave(self.db, lote, 'productos', 'sku', id, baja, actual)
+                escribir_referencias(lote, 'productos',
+                                     await referencias_por_cambio(self.db, 'productos', id, baja, actual), self.db)
+                marcar_version(lote, self.db, VERSION_BUSQUEDA)
+
+            # Doctrina Escritura con Retorno: un PATCH concurrente (p.ej. cambio de rubro) hace releer
+            if await actualizar_con_retorno(self.db, 'productos', id, baja, preparar) is None:
+                return False
+            self._registrar_busqueda([(id, baja)])
+            return True
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al dar de baja: {e}")
+
+    # --- Doctrina Operaciones Masivas: baja / reactivación agrupadas (Doctrina VIL) ---
+    async def cambiar_estado_productos_masivo(self, ids: List[str], baja: bool) -> List[ResultadoItemMasivo]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        try:
+            resultados = await cambiar_estado_masivo(self.db, 'productos', 'sku', ids, baja)
+            cambiados = [(r.id, {'baja_logica': baja}) for r in resultados if r.status in ('BAJA', 'REACTIVADO')]
+            if cambiados:
+                # Doctrina Búsqueda: la versión de búsqueda se mueve una vez, después de los lotes de estado
+                versionada = await confirmar_version(self.db, VERSION_BUSQUEDA)
+                self._registrar_busqueda(cambiados, versiones=int(versionada))
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en la {'baja' if baja else 'reactivación'} masiva: {e}")
+
+    # --- Doctrina Búsqueda: índice de nombre / SKU en memoria ---
+    def _registrar_busqueda(self, cambios: List[Tuple[str, dict]], versiones: int = 1):
+        """Altas y cambios de sku / nombre / estado ya confirmados por este worker (y las versiones que movieron)."""
+        if self._indice_busqueda is not None:
+            self._indice_busqueda.registrar(cambios, versiones)
+        if self._busqueda_pendientes is not None:
+            self._busqueda_pendientes.append((cambios, versiones))
+
+    async def _cargar_indice_busqueda(self) -> IndiceBusqueda:
+        """Versión de búsqueda + una lectura masiva proyectada a sku, nombre y estado."""
+        indice = IndiceBusqueda(await obtener_version(self.db, VERSION_BUSQUEDA))
+        async for doc in documentos_por_paginas(self.db.collection('productos').select(CAMPOS_BUSQUEDA)):
+            indice.aplicar(doc.id, doc.to_dict())
+        return indice
+
+    async def _recargar_indice_busqueda(self):
+        try:
+            indice = await self._cargar_indice_busqueda()
+            for cambios, versiones in self._busqueda_pendientes or []:
+                indice.registrar(cambios, versiones)
+            self._indice_busqueda = indice
+        finally:
+            self._busqueda_pendientes = None
+
+    def _programar_carga_busqueda(self) -> asyncio.Future:
+        """Una sola carga en vuelo por proceso; mientras tanto se sigue respondiendo con el índice anterior."""
+        if self._carga_busqueda is None or self._carga_busqueda.done():
+            self._busqueda_pendientes = []
+            self._carga_busqueda = asyncio.ensure_future(self._recargar_indice_busqueda())
+            # Un error de carga no rompe nada: la próxima búsqueda vuelve a intentar
+            self._carga_busqueda.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return self._carga_busqueda
+
+    async def indice_busqueda(self, recargar: bool = False) -> Optional[IndiceBusqueda]:
+        """
+        Índice del proceso, o None mientras se arma por primera vez. Cada SL_BUSQUEDA_TTL segundos
+        compara la versión de búsqueda (una lectura puntual): si la movieron otros workers se rearma
+        en segundo plano. 'recargar' espera un rearmado completo.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        indice = self._indice_busqueda
+        if recargar:
+            await asyncio.shield(self._programar_carga_busqueda())
+        elif indice is None:
+            self._programar_carga_busqueda()
+        elif indice.vencido() and (self._carga_busqueda is None or self._carga_busqueda.done()):
+            if not indice.al_dia(await obtener_version(self.db, VERSION_BUSQUEDA)):
+                self._programar_carga_busqueda()
+        return self._indice_busqueda
+
+    async def _buscar_en_firestore(self, consulta: str, limite: int, estado: str) -> List[dict]:
+        """
+        Respaldo sin índice en memoria: array_contains sobre 'busqueda' con el término más largo
+        (el más selectivo), proyectado y acotado; el resto de los términos y el ranking se
+        resuelven sobre los candidatos con el mismo IndiceBusqueda.
+        """
+        terminos = normalizar(consulta).split()
+        if not terminos:
+            return []
+        query = self.db.collection('productos').where(
+            filter=FieldFilter(CAMPO_BUSQUEDA, "array_contains", max(terminos, key=len)))
+        # Doctrina VIL (Filtro de Tres Vías)
+        if estado == 'activos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", False))
+        elif estado == 'inactivos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", True))
+        candidatos = IndiceBusqueda()
+        async for doc in query.select(CAMPOS_BUSQUEDA).limit(MAX_CANDIDATOS_BUSQUEDA).stream():
+            candidatos.aplicar(doc.id, doc.to_dict())
+        return candidatos.buscar(consulta, limite, estado)
+
+    async def buscar_productos(self, consulta: str, limite: int = LIMITE_BUSQUEDA, estado: str = 'activos',
+                               recargar: bool = False) -> List[ResultadoBusquedaModel]:
+        """
+        Productos cuyas palabras de nombre / SKU empiezan con cada término (sin acentos ni mayúsculas),
+        ordenados por relevancia. Se resuelve en memoria; mientras el índice se arma, con la consulta de respaldo.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            indice = await self.indice_busqueda(recargar)
+            if indice is None:
+                encontrados = await self._buscar_en_firestore(consulta, limite, estado)
+            else:
+                encontrados = indice.buscar(consulta, limite, estado)
+            return [ResultadoBusquedaModel(**r) for r in encontrados]
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al buscar productos: {e}")
+
+    # --- Doctrina Kits: BOM con costo acumulado memoizado ---
+    async def _cargar_grafo_kits(self) -> GrafoKits:
+        """Una sola lectura masiva (proyectada a costo + BOM + stock) de todos los productos."""
+        query = self.db.collection('productos').select(
+            ['precio_costo', 'es_kit', 'componentes_kit', 'stock_por_deposito', 'stock_depositos', 'stock_comprometido'])
+        # La versión se lee antes: un cambio durante la lectura masiva se ve como ajeno (rearma de más, nunca de menos)
+        version = await obtener_version(self.db, VERSION_KITS)
+        registros, stocks = [], []
+        async for doc in documentos_por_paginas(query):
+            datos = doc.to_dict()
+            registros.append((doc.id, self._entero_escalado(datos.get('precio_costo')),
+                              datos.get('es_kit', False), componentes_exactos(datos.get('componentes_kit'))))
+            stocks.append((doc.id, depositos_guardados(datos), datos.get('stock_comprometido')))
+        grafo = GrafoKits.construir(registros, version)
+        for producto_id, depositos, comprometido in stocks:
+            grafo.cargar_stock(producto_id, depositos, comprometido)
+        return grafo
+
+    async def grafo_kits(self, recargar: bool = False, validar: bool = False) -> GrafoKits:
+        """
+        Grafo BOM del proceso. Se mantiene al día con los PATCH de este worker; las escrituras de
+        otros workers se ven al recargar, tras un recálculo o con 'validar' (una lectura puntual de
+        la versión de kits: si otro worker cambió costos o BOM, se rearma antes de usarlo).
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        if self._grafo_kits is None or recargar:
+            self._grafo_kits = await self._cargar_grafo_kits()
+        elif validar and not self._grafo_kits.al_dia(await obtener_version(self.db, VERSION_KITS)):
+            self._grafo_kits = await self._cargar_grafo_kits()
+        return self._grafo_kits
+
+    def _registrar_kits(self, versiones: int = 1):
+        """Incrementos de la versión de kits hechos por este worker (no obligan a rearmar su grafo)."""
+        if self._grafo_kits is not None:
+            self._grafo_kits.versiones_locales += versiones
+
+    async def _propagar_a_kits(self, id: str, update_data: dict, actual: dict) -> dict:
+        """'actual': pre-imagen del producto (el BOM guardado)."""
+        # Los costos que se guardan salen de componentes al día (no de un grafo con cambios ajenos)
+        grafo = await self.grafo_kits(validar=True)
+        componentes = None
+        if 'componentes_kit' in update_data or 'es_kit' in update_data:
+            # Estado final del BOM = guardado + lo que trae el PATCH
+            actual = {**actual, **{k: update_data[k] for k in ('es_kit', 'componentes_kit') if k in update_data}}
+            componentes = componentes_exactos(actual.get('componentes_kit')) if actual.get('es_kit') else []
+            if grafo.genera_ciclo(id, componentes):
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="El kit no puede contenerse a sí mismo (ciclo en componentes_kit).")
+        return grafo.aplicar_cambio(id, costo=update_data.get('precio_costo'), componentes=componentes)
+
+    async def costos_kits(self, recargar: bool = False) -> CostosKitsModel:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            grafo = await self.grafo_kits(recargar)
+            return CostosKitsModel(
+                costos={kit: (self._a_decimal(c) if c is not None else None) for kit, c in grafo.costos_kits().items()},
+                ciclos=grafo.ciclos,
+                faltantes=grafo.faltantes(),
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al calcular los costos de kits: {e}")
+
+    async def recalcular_costos_kits(self, dry_run: bool = False) -> RecalculoKitsModel:
+        """Relee el grafo y guarda el costo acumulado de cada kit que quedó desactualizado."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            grafo = await self.grafo_kits(recargar=True)
+            cambios = list(grafo.pendientes_de_guardar().items())
+            errores = 0
+            if dry_run:
+                self._grafo_kits = None  # pendientes_de_guardar asumió la escritura
+            elif cambios:
+                productos_ref = self.db.collection('productos')
+                resultado = await confirmar_lotes(self.db, 'productos', cambios,
+                                                  lambda l, k: l.update(productos_ref.document(k[0]), {'precio_costo': k[1]}))
+                errores = sum(1 for e in resultado if e is not None)
+                if errores:
+                    self._grafo_kits = None
+                if errores < len(cambios) and await confirmar_version(self.db, VERSION_KITS):
+                    self._registrar_kits()
+            return RecalculoKitsModel(kits=len(grafo.kits()), modificados=len(cambios) - errores, errores=errores,
+                                      dry_run=dry_run, ciclos=grafo.ciclos, faltantes=grafo.faltantes())
+        except HTTPException:
+            raise
+        except Exception as e:
+            self._grafo_kits = None  # El grafo pudo quedar adelantado a la base
+            raise HTTPException(status_code=500, detail=f"Error al recalcular los costos de kits: {e}")
+
+    async def disponibilidad_kits(self, ids: Optional[List[str]] = None,
+                                  recargar: bool = False) -> List[DisponibilidadKitModel]:
+        """Kits armables por depósito y en total; sin 'ids' informa todos los kits."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            grafo = await self.grafo_kits(recargar)
+            resultado = []
+            for producto_id in (ids or grafo.kits()):
+                if producto_id not in grafo.costos_base:
+                    resultado.append(DisponibilidadKitModel(producto_id=producto_id, detalle="Producto inexistente."))
+                elif not grafo.es_kit(producto_id):
+                    resultado.append(DisponibilidadKitModel(producto_id=producto_id, detalle="El producto no es un kit."))
+                elif (disponible := grafo.disponibilidad(producto_id)) is None:
+                    resultado.append(DisponibilidadKitModel(
+                        producto_id=producto_id, detalle="Kit en ciclo o con componentes inexistentes."))
+                else:
+                    resultado.append(DisponibilidadKitModel(
+                        producto_id=producto_id, por_deposito=disponible[0], total=disponible[1]))
+            return resultado
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al calcular la disponibilidad de kits: {e}")
+
+    # --- Doctrina Stock Distribuido: movimientos en shards + agregados en el producto ---
+    async def registrar_movimientos(self, movimientos: List[MovimientoStockModel]) -> List[ResultadoItemMasivo]:
+        """
+        Cada movimiento incrementa un shard al azar de su depósito y los agregados del producto
+        (stock_total, stock_por_deposito) en la misma escritura atómica, sin leer ni bloquear.
+        La versión del listado se mueve una vez por pedido (no por lote).
+        Los productos inexistentes se descartan antes (una lectura get_all) para no tirar su lote.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(movimientos)
+
+        existentes = await self.obtener_productos_por_ids([m.producto_id for m in movimientos], ('id',))
+        resultados: List[Optional[ResultadoItemMasivo]] = [None] * len(movimientos)
+        pendientes = []
+        for indice, movimiento in enumerate(movimientos):
+            if movimiento.producto_id not in existentes:
+                resultados[indice] = ResultadoItemMasivo(indice=indice, status='NO_ENCONTRADO',
+                                                         id=movimiento.producto_id, detalle="Producto no encontrado.")
+            else:
+                pendientes.append((indice, movimiento))
+
+        productos_ref = self.db.collection('productos')
+        errores = await confirmar_lotes(
+            self.db, 'productos', pendientes,
+            lambda lote, p: escribir_movimiento(lote, productos_ref.document(p[1].producto_id),
+                                                p[1].deposito_id, p[1].cantidad),
+            ops_por_item=2,
+        )
+        for (indice, movimiento), error in zip(pendientes, errores):
+            resultados[indice] = ResultadoItemMasivo(indice=indice, status='ERROR' if error else 'CREADO',
+                                                     id=movimiento.producto_id, detalle=error)
+            # Doctrina Kits: la disponibilidad sigue al stock (si el grafo ya está en memoria)
+            if error is None and self._grafo_kits is not None:
+                self._grafo_kits.mover_stock(movimiento.producto_id, movimiento.deposito_id, movimiento.cantidad)
+        return resultados
+
+    async def obtener_stock(self, id: str, verificar: bool = False) -> Optional[StockProductoModel]:
+        """
+        Stock exacto de un producto: suma de sus shards (fuente de verdad).
+        'verificar' además informa el desvío por depósito de los agregados guardados en el producto.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        doc_ref = self.db.collection('productos').document(id)
+        doc, por_deposito = await asyncio.gather(
+            doc_ref.get(field_paths=['stock_por_deposito', 'stock_depositos', 'stock_comprometido']),
+            sumar_shards(doc_ref))
+        if not doc.exists:
+            return None
+        datos = self._decodificar(doc.to_dict())
+        total = sum(por_deposito.values())
+        comprometido = datos.get('stock_comprometido') or 0
+
+        desvio = None
+        if verificar:
+            agregados = {d['deposito_id']: d['stock_real'] for d in datos.get('stock_depositos', [])}
+            desvio = {d: agregados.get(d, 0) - por_deposito.get(d, 0) for d in set(agregados) | set(por_deposito)
+                      if agregados.get(d, 0) != por_deposito.get(d, 0)}
+
+        return StockProductoModel(producto_id=id, stock_total=total, stock_comprometido=comprometido,
+                                  disponible=total - comprometido, por_deposito=por_deposito, desvio=desvio)
+
+    async def reporte_reposicion(self) -> List[ReposicionModel]:
+        """
+        Productos activos cuyo disponible (stock_total - stock_comprometido) no alcanza el stock_minimo_pedido.
+        Lectura proyectada a los agregados: no se leen ni suman documentos completos.
+        """
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        query = (self.db.collection('productos')
+                 .where(filter=FieldFilter("baja_logica", "==", False))
+                 .select(['sku', 'nombre', 'stock_total', 'stock_comprometido', 'stock_minimo_pedido',
+                          'stock_por_deposito', 'stock_depositos']))
+        resultado = []
+        async for doc in documentos_por_paginas(query):
+            datos = self._decodificar(doc.to_dict())
+            total = datos.get('stock_total') or 0
+            comprometido = datos.get('stock_comprometido') or 0
+            minimo = datos.get('stock_minimo_pedido') or 0
+            if total - comprometido < minimo:
+                resultado.append(ReposicionModel(id=doc.id, sku=datos['sku'], nombre=datos['nombre'],
+                                                 stock_total=total, stock_comprometido=comprometido,
+                                                 stock_minimo_pedido=minimo, faltante=minimo - (total - comprometido)))
+        return resultado
+
+    # --- Doctrina Reprecio: cambio masivo de precios en aritmética entera ---
+    def _calculadora_reprecio(self, datos: ReprecioModel):
+        """
+        Devuelve f(lista de enteros escalados) -> lista de enteros escalados.
+        Porcentaje: v * (100 + p) / 100 como fracción exacta, redondeo ROUND_HALF_UP.
+        Absoluto: v + importe escalado (exacto).
+        """
+        if datos.tipo == 'porcentaje':
+            factor = (Fraction(100) + Fraction(datos.valor)) / 100
+            num, den = factor.numerator, factor.denominator
+            return lambda valores: [_dividir_half_up(v * num, den) for v in valores]
+        delta = self._a_entero(datos.valor)
+        return lambda valores: [v + delta for v in valores]
+
+    def reprecio_masivo(self, datos: ReprecioModel) -> AsyncIterator[dict]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        return self._reprecio_en_lotes(datos)
+
+    async def _reprecio_en_lotes(self, datos: ReprecioModel) -> AsyncIterator[dict]:
+        """
+        Selecciona productos por filtro (proyección de solo sku + precios), calcula los precios
+        nuevos por página y los confirma en WriteBatch en paralelo (Doctrina Importación).
+        Cada update va condicionado a la update_time del documento leído: si un lote falla porque
+        algún producto cambió en el medio (p.ej. un PATCH de precio), sus productos se confirman
+        uno por uno y solo los que cambiaron se informan como CONFLICTO (409), sin pisarlos.
+        Con dry_run no escribe: el evento final trae el resumen y una muestra de cambios.
+        """
+        calcular = self._calculadora_reprecio(datos)
+        campos = list(datos.aplicar_a)
+
+        query = self.db.collection('productos')
+        if datos.estado == 'activos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", False))
+        elif datos.estado == 'inactivos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", True))
+        for campo in ('rubro_id', 'subrubro_id', 'moneda_costo'):
+            valor = getattr(datos, campo)
+            if valor:
+                query = query.where(filter=FieldFilter(campo, "==", valor))
+        query = query.select(['sku'] + campos)
+
+        totales = {c: {'antes': 0, 'despues': 0} for c in campos}
+        muestra = []
+        sin_cambio = 0
+
+        async def filas():
+            numero = 0
+            async for doc in documentos_por_paginas(query):
+                numero += 1
+                yield numero, doc
+
+        async def preparar(trozo: List[Fila]) -> Tuple[List[Fila], List[Fila]]:
+            nonlocal sin_cambio
+            # Una pasada por campo sobre todo el trozo (listas de enteros)
+            registros = [(fila, doc, doc.to_dict()) for fila, doc in trozo]
+            nuevos = {}
+            for campo in campos:
+                viejos = [self._entero_escalado(r[2].get(campo)) for r in registros]
+                nuevos[campo] = (viejos, calcular(viejos))
+
+            listos, errores = [], []
+            for indice, (fila, doc, previo) in enumerate(registros):
+                cambios = {c: nuevos[c][1][indice] for c in campos if nuevos[c][1][indice] != nuevos[c][0][indice]}
+                if any(v < 0 for v in cambios.values()):
+                    errores.append((fila, f"Precio resultante negativo para SKU '{previo.get('sku')}'."))
+                    continue
+                if not cambios:
+                    sin_cambio += 1
+                    continue
+                for c in campos:
+                    totales[c]['antes'] += nuevos[c][0][indice]
+                    totales[c]['despues'] += nuevos[c][1][indice]
+                if len(muestra) < MUESTRA_REPRECIO:
+                    muestra.append({'id': doc.id, 'sku': previo.get('sku'),
+                                    **{c: {'antes': str(self._a_decimal(nuevos[c][0][indice])),
+                                           'despues': str(self._a_decimal(nuevos[c][1][indice]))} for c in campos}})
+                valores = {c: (nuevos[c][0][indice], nuevos[c][1][indice]) for c in campos}
+                listos.append((fila, (doc.reference, doc.update_time, cambios, valores)))
+            return listos, errores
+
+        def descontar(valores: dict):
+            for c, (antes, despues) in valores.items():
+                totales[c]['antes'] -= antes
+                totales[c]['despues'] -= despues
+
+        async def escribir_uno(ref, update_time, cambios, valores) -> Optional[dict]:
+            try:
+                await ref.update(cambios, option=self.db.write_option(last_update_time=update_time))
+                return None
+            except (FailedPrecondition, NotFound):
+                descontar(valores)
+                return {"status": "CONFLICTO", "codigo": status.HTTP_409_CONFLICT, "id": ref.id,
+                        "message": "El producto cambió durante el reprecio; no se modificó."}
+
+        async def escribir(listos: List[Fila]) -> Optional[List[Optional[dict]]]:
+            if datos.dry_run:
+                return None
+            lote = self.db.batch()
+            for _, (ref, update_time, cambios, _) in listos:
+                lote.update(ref, cambios, option=self.db.write_option(last_update_time=update_time))
+            try:
+                await lote.commit()
+                return None
+            except FailedPrecondition:
+                # Algún producto cambió después de leerlo: de a uno, así solo esos quedan afuera
+                return await en_paralelo([escribir_uno(*op) for _, op in listos])
+
+        async def versionar():
+            # Doctrina Versiones: una escritura de versión por reprecio, con todos los lotes confirmados
+            # (un reprecio de costos también cambia los de los componentes de los kits)
+            await confirmar_version(self.db, 'productos', *((VERSION_KITS,) if 'precio_costo' in campos else ()))
+
+        etiqueta = 'a_modificar' if datos.dry_run else 'modificados'
+        async for evento in importar_en_lotes(filas(), preparar, escribir, etiqueta=etiqueta,
+                                              al_terminar=None if datos.dry_run else versionar):
+            if evento['evento'] == 'fin':
+                if not datos.dry_run and 'precio_costo' in campos:
+                    # Doctrina Kits: los costos acumulados siguen a los de sus componentes
+                    evento['kits_recalculados'] = (await self.recalcular_costos_kits()).modificados
+                evento['dry_run'] = datos.dry_run
+                evento['sin_cambio'] = sin_cambio
+                evento['totales'] = {c: {k: str(self._a_decimal(v)) for k, v in t.items()} for c, t in totales.items()}
+                evento['muestra'] = muestra
+            yield evento
+
+    # --- Doctrina Exportación: streaming por páginas, sin armar la lista completa ---
+    def exportar_productos(self, estado: str = 'todos', formato: str = 'ndjson') -> AsyncIterator[bytes]:
+        query = self.db.collection('productos')
+        if estado == 'activos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", False))
+        elif estado == 'inactivos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", True))
+        return exportar_consulta(query, ProductoModel, formato, decodificar=self._decodificar)
+
+    # --- Doctrina Importación: archivo de proveedor en streaming (CSV / NDJSON) ---
+    async def importar_productos(self, filas: AsyncIterator[Fila],
+                                 tamano_lote: int = TAMANO_LOTE_IMPORTACION) -> AsyncIterator[dict]:
+        """
+        Valida cada trozo contra ProductoModel, aplica ABR sobre 'sku' (contra la base con
+        lecturas agrupadas de claves únicas y dentro del mismo archivo) y crea los productos en WriteBatch.
+        Emite eventos de error por fila, de progreso por lote y uno final.
+        """
+        # Único estado por archivo: los SKU ya aceptados (strings de hasta 8 caracteres)
+        vistos = set()
+        # Colecciones padre cuyos contadores de referencias movió algún lote (se versionan al final)
+        padres_tocados = set()
+
+        async def preparar(trozo: List[Fila]) -> Tuple[List[Fila], List[Fila]]:
+            validos, errores = [], []
+            for fila, datos in trozo:
+                if isinstance(datos, Exception):
+                    errores.append((fila, str(datos)))
+                    continue
+                try:
+                    producto = ProductoModel.model_validate(datos)
+                except ValidationError as e:
+                    errores.append((fila, e.errors(include_url=False, include_context=False, include_input=False)))
+                    continue
+                if producto.sku in vistos:
+                    errores.append((fila, f"SKU '{producto.sku}' repetido en el archivo."))
+                    continue
+                vistos.add(producto.sku)
+                validos.append((fila, producto))
+
+            existentes = await claves_existentes(self.db, 'productos', (p.sku for _, p in validos))
+            listos = []
+            for fila, producto in validos:
+                if producto.sku in existentes:
+                    doc_id, previo = existentes[producto.sku]
+                    estado = 'EXISTE_INACTIVO' if previo.get('baja_logica') else 'EXISTE_ACTIVO'
+                    errores.append((fila, {"status": estado, "id": doc_id, "campo": "sku"}))
+                    continue
+                # DOCTRINA V2.0: precisión de 4 decimales (enteros escalados) antes de persistir
+                listos.append((fila, self._a_firestore(producto)))
+            return listos, errores
+
+        async def escribir(listos: List[Fila]) -> List[Optional[str]]:
+            # Cada producto lleva su clave única y sus shards de stock en el mismo lote (2 + depósitos escrituras).
+            # Doctrina Referencias: cada lote suma, agregado por padre, los contadores de sus productos
+            # (una escritura por padre nuevo en el lote).
+            productos_ref = self.db.collection('productos')
+            padres = await resolver_padres(self.db, (p for _, d in listos for p in padres_activos('productos', d)))
+            lotes, lote, ops, deltas = [], self.db.batch(), 0, Counter()
+            altas = []  # (id, datos, número de lote) por fila, en orden
+
+            def cerrar():
+                cambios = incrementos(deltas, padres)
+                escribir_referencias(lote, 'productos', cambios)
+                padres_tocados.update(colecciones_padre(cambios))
+                lotes.append(lote)
+
+            for _, datos in listos:
+                por_deposito = datos['stock_por_deposito']
+                suyos = [p for p in padres_activos('productos', datos) if p in padres]
+                costo = 2 + len(por_deposito) + sum(1 for p in suyos if p not in deltas)
+                if ops and ops + costo > MAX_OPERACIONES_LOTE:
+                    cerrar()
+                    lote, ops, deltas = self.db.batch(), 0, Counter()
+                    costo = 2 + len(por_deposito) + len(suyos)
+                ref = productos_ref.document()
+                lote.create(ref, datos)
+                altas.append((ref.id, datos, len(lotes)))
+                reservar_clave(lote, self.db, 'productos', 'sku', datos['sku'], ref.id, datos.get('baja_logica', False))
+                escribir_inventario(lote, ref, por_deposito)
+                deltas.update(suyos)
+                ops += costo
+            cerrar()
+
+            async def confirmar(lote) -> Optional[str]:
+                try:
+                    await lote.commit()
+                    return None
+                except Exception as e:
+                    return f"Error al confirmar el lote: {e}"
+
+            # Un lote fallido no invalida a los demás: cada fila informa el resultado del suyo
+            errores = await en_paralelo([confirmar(lote) for lote in lotes])
+            self._grafo_kits = None
+            self._registrar_busqueda([(i, datos) for i, datos, n in altas if errores[n] is None], versiones=0)
+            return [errores[n] for _, _, n in altas]
+
+        async def versionar():
+            # Doctrina Versiones: listado, búsqueda y padres referenciados se mueven una vez por importación, no por lote
+            if await confirmar_version(self.db, 'productos', VERSION_BUSQUEDA, VERSION_KITS, *sorted(padres_tocados)):
+                self._registrar_busqueda([])
+
+        async for evento in importar_en_lotes(filas, preparar, escribir, tamano_lote, al_terminar=versionar):
+            yield evento
 
 # Instancia Singleton del Servicio
-producto_service = ProductoService()
\ No newline at end of file
+producto_service = ProductoService(None)
\ No newline at end of file
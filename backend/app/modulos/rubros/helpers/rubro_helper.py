@@ -1,7 +1,8 @@
 # backend/app/modulos/rubros/helpers/rubro_helper.py (V12.14)
-from google.cloud.firestore_v1.base_query import FieldFilter
-from google.cloud.firestore_v1 import Transaction, transactional # <-- IMPORTANTE: Importar 'transactional'
+from google.cloud.firestore_v1 import AsyncTransaction, async_transactional # <-- IMPORTANTE: Versión async de 'transactional'
 from ..models import RubroModel
+from ....core.claves_unicas import leer_clave, reservar_clave
+from ....core.versiones import marcar_version
 # Importar la instancia real de la DB
 # from core.database import db
 
@@ -19,11 +20,22 @@ class DuplicadoInactivoException(Exception):
         self.detail = {"status": "EXISTE_INACTIVO", "id_inactivo": id_inactivo, "campo": campo}
         super().__init__("Duplicado inactivo encontrado")
 
+def _excepcion_duplicado(doc_id: str, datos_existentes: dict, codigo: str) -> Exception:
+    """
+    Traduce un duplicado encontrado a la excepción doctrinal (ABR V12).
+    Compartido por la transacción y por el alta masiva.
+    """
+    if datos_existentes.get('baja_logica') == True:
+        # 2.A. Existe INACTIVO -> Lanzar Doctrina de Reactivación
+        return DuplicadoInactivoException(id_inactivo=doc_id, campo="codigo")
+    # 2.B. Existe ACTIVO -> Lanzar Conflicto
+    return DuplicadoActivoException(campo="codigo", valor=codigo)
+
 # --- INICIO: CORRECCIÓN V12.14 ---
 # ¡EL DECORADOR ESTABA COMENTADO!
-@transactional
+@async_transactional
 # --- FIN: CORRECCIÓN V12.14 ---
-def _transaccion_crear_rubro(transaction: Transaction, rubro_data: dict, db):
+async def _transaccion_crear_rubro(transaction: AsyncTransaction, rubro_data: dict, db):
     """
     Función helper que corre DENTRO de una transacción de Firestore.
     Implementa ABR V12 y la Doctrina de Contadores.
@@ -33,20 +45,10 @@ def _transaccion_crear_rubro(transaction: Transaction, rubro_data: dict, db):
     
     codigo_buscado = rubro_data.get('codigo')
 
-    # 1. Chequeo de duplicados (ABR V12)
-    query = rubros_ref.where(filter=FieldFilter("codigo", "==", codigo_buscado)).limit(1)
-    docs = list(query.stream(transaction=transaction))
-
-    if docs:
-        doc_existente = docs[0]
-        datos_existentes = doc_existente.to_dict()
-        
-        if datos_existentes.get('baja_logica') == True:
-            # 2.A. Existe INACTIVO -> Lanzar Doctrina de Reactivación
-            raise DuplicadoInactivoException(id_inactivo=doc_existente.id, campo="codigo")
-        else:
-            # 2.B. Existe ACTIVO -> Lanzar Conflicto
-            raise DuplicadoActivoException(campo="codigo", valor=codigo_buscado)
+    # 1. Chequeo de duplicados (ABR V12): lectura puntual de la clave única, sin consulta
+    dueno = await leer_clave(db, 'rubros', codigo_buscado, transaction=transaction)
+    if dueno is not None:
+        raise _excepcion_duplicado(dueno[0], dueno[1], codigo_buscado)
 
     # 3. Creación (si no hay duplicados)
     
@@ -55,9 +57,13 @@ def _transaccion_crear_rubro(transaction: Transaction, rubro_data: dict, db):
     nuevo_id = nuevo_rubro_ref.id
     rubro_data['id'] = nuevo_id
     transaction.set(nuevo_rubro_ref, rubro_data)
+    reservar_clave(transaction, db, 'rubros', 'codigo', codigo_buscado, nuevo_id, rubro_data.get('baja_logica', False))
     
     # 3.B. Crear el Contador (Doctrina ID Soberano Universal)
     contador_ref = contadores_ref.document(nuevo_id)
     transaction.set(contador_ref, {'ultimo_valor': 0})
+
+    # 3.C. Doctrina Versiones: el alta invalida los ETag de la colección
+    marcar_version(transaction, db, 'rubros')
     
     return RubroModel(**rubro_data)
\ No newline at end of file
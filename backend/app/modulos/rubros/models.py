@@ -1,7 +1,7 @@
 # backend/app/modulos/rubros/models.py (CON ALIAS)
 
 from pydantic import BaseModel, Field, AliasChoices
-from typing import Optional
+from typing import Dict, Optional
 
 class RubroModel(BaseModel):
     """
@@ -17,6 +17,8 @@ class RubroModel(BaseModel):
     nombre: str = Field(..., max_length=30, description="Nombre descriptivo", validation_alias=AliasChoices('nombre', 'name'))
     # baja_logica suele coincidir
     baja_logica: bool = Field(default=False, description="Estado de baja lógica")
+    # Doctrina Referencias: hijos activos por colección (lo mantiene el servidor, solo lectura)
+    referencias: Optional[Dict[str, int]] = Field(None, description="Hijos activos por colección (solo lectura)")
 
     class Config:
         from_attributes = True
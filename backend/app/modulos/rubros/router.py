@@ -1,8 +1,15 @@
 # backend/app/modulos/rubros/router.py
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from typing import List, Optional
 from .models import RubroModel, RubroUpdateModel
 from .service import rubro_service, RubroService
+from ...core.estadisticas import EstadisticasModel
+from ...core.exportacion import PATRON_FORMATO_EXPORTACION, respuesta_exportacion
+from ...core.lectura import LecturaPorIds, responder
+from ...core.masivo import IdsMasivo, ResultadoItemMasivo
+from ...core.paginacion import aplicar_cursor
+from ...core.proyeccion import parsear_campos
+from ...core.versiones import calcular_etag, publicar_etag, respuesta_no_modificada
 
 # --- Adherencia V12: Inyección de Dependencia del Servicio ---
 def get_rubro_service():
@@ -23,7 +30,7 @@ router_rubros = APIRouter(
                      response_model=RubroModel, 
                      status_code=status.HTTP_201_CREATED,
                      summary="Crear nuevo Rubro (ABR V12)")
-def crear_rubro(
+async def crear_rubro(
     data: RubroModel, 
     service: RubroService = Depends(get_rubro_service)
 ):
@@ -31,13 +38,74 @@ def crear_rubro(
     Crea un nuevo rubro.
     Aplica la Doctrina ABR V12 (Anti-Duplicados) sobre `codigo_rubro` y la gestión de contadores.
     """
-    return service.crear_rubro(data)
+    return await service.crear_rubro(data)
+
+@router_rubros.post("/bulk", 
+                     response_model=List[ResultadoItemMasivo],
+                     summary="Alta masiva de Rubros (ABR agrupado)")
+async def crear_rubros_masivo(
+    items: List[RubroModel], 
+    service: RubroService = Depends(get_rubro_service)
+):
+    """
+    Crea varios rubros en un solo request.
+    La Doctrina ABR se resuelve con consultas agrupadas y las altas se confirman en lotes.
+    Devuelve un resultado por item, en el mismo orden: CREADO, EXISTE_ACTIVO, EXISTE_INACTIVO o ERROR.
+    """
+    return await service.crear_rubros_masivo(items)
+
+@router_rubros.post("/baja-masiva", 
+                    response_model=List[ResultadoItemMasivo],
+                    summary="Baja lógica masiva de Rubros (Doctrina VIL)")
+async def baja_rubros_masiva(
+    data: IdsMasivo, 
+    service: RubroService = Depends(get_rubro_service)
+):
+    """
+    Da de baja los rubros por id en WriteBatch troceados (una lectura agrupada para todo el conjunto).
+    Devuelve un resultado por id, en el mismo orden: BAJA, SIN_CAMBIOS, NO_ENCONTRADO, TIENE_HIJOS_ACTIVOS o ERROR.
+    """
+    return await service.cambiar_estado_rubros_masivo(data.ids, baja=True)
+
+@router_rubros.post("/reactivar-masivo", 
+                    response_model=List[ResultadoItemMasivo],
+                    summary="Reactivación masiva de Rubros (Doctrina VIL)")
+async def reactivar_rubros_masivo(
+    data: IdsMasivo, 
+    service: RubroService = Depends(get_rubro_service)
+):
+    """
+    Reactiva los rubros por id en WriteBatch troceados.
+    Devuelve un resultado por id, en el mismo orden: REACTIVADO, SIN_CAMBIOS, NO_ENCONTRADO o ERROR.
+    """
+    return await service.cambiar_estado_rubros_masivo(data.ids, baja=False)
+
+@router_rubros.post("/batch-get", 
+                    response_model=LecturaPorIds[RubroModel],
+                    summary="Obtener Rubros por lista de ids (lectura agrupada)")
+async def obtener_rubros_por_ids(
+    data: IdsMasivo, 
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo,nombre); el id va siempre"),
+    service: RubroService = Depends(get_rubro_service)
+):
+    """
+    Devuelve los rubros pedidos en el orden de entrada (repetidos una vez) y los ids inexistentes en `faltantes`.
+    Un get_all cada 500 ids.
+    """
+    campos = parsear_campos(fields, RubroModel)
+    return responder(response, await service.leer_rubros_por_ids(data.ids, campos))
 
 @router_rubros.get("/", 
                    response_model=List[RubroModel],
                    summary="Listar Rubros (Filtro VIL)")
-def listar_rubros(
+async def listar_rubros(
+    request: Request,
+    response: Response,
     estado: str = 'activos', 
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (con tope del servidor)"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la cabecera X-Siguiente-Cursor"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo,nombre); el id va siempre"),
     service: RubroService = Depends(get_rubro_service)
 ):
     """
@@ -45,24 +113,65 @@ def listar_rubros(
     - 'activos' (default): Solo baja_logica = false
     - 'inactivos': Solo baja_logica = true
     - 'todos': Todos los registros
+
+    Doctrina Paginación: si hay más resultados, la respuesta trae la cabecera
+    `X-Siguiente-Cursor`; se envía de vuelta en `cursor` para pedir la página siguiente.
+    """
+    # Doctrina Versiones: GET condicional (If-None-Match -> 304 sin leer ni serializar la lista)
+    campos = parsear_campos(fields, RubroModel)
+    # El ETag y el cuerpo salen de la misma versión (el cache no sirve cuerpos de otra versión)
+    version = await service.version_listado()
+    etag = calcular_etag('rubros', version, estado, limit, cursor, campos)
+    no_modificado = respuesta_no_modificada(request, etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    pagina = await service.listar_rubros(estado, limit, cursor, campos, version)
+    publicar_etag(response, etag)
+    # Doctrina Lectura Confiable: la página sale en bytes (modelo completo o recortado por 'fields')
+    return responder(response, aplicar_cursor(response, pagina))
+
+@router_rubros.get("/export", 
+                   summary="Exportar Rubros (NDJSON / CSV en streaming)")
+async def exportar_rubros(
+    estado: str = 'todos',
+    formato: str = Query('ndjson', alias='format', pattern=PATRON_FORMATO_EXPORTACION),
+    service: RubroService = Depends(get_rubro_service)
+):
+    """
+    Vuelca la colección completa (o filtrada por estado VIL) fila por fila,
+    para backups y extracciones BI. Memoria y tiempo al primer byte constantes.
+    """
+    return respuesta_exportacion(service.exportar_rubros(estado, formato), 'rubros', formato)
+
+@router_rubros.get("/stats", 
+                   response_model=EstadisticasModel,
+                   summary="Estadísticas de Rubros (agregación en Firestore)")
+async def estadisticas_rubros(
+    estado: str = 'activos', 
+    service: RubroService = Depends(get_rubro_service)
+):
+    """
+    Cantidad de rubros según la Doctrina VIL ('activos', 'inactivos' o 'todos'),
+    con una consulta count() (sin transferir documentos). Cacheada unos segundos.
     """
-    return service.listar_rubros(estado)
+    return await service.estadisticas_rubros(estado)
 
 @router_rubros.get("/codigo/next", 
                     summary="Obtener próximo código de Rubro (Operación Contadores)",
                     response_model=int)
-def obtener_siguiente_codigo(
+async def obtener_siguiente_codigo(
     service: RubroService = Depends(get_rubro_service)
 ):
     """
     Genera y reserva el próximo código numérico para un nuevo rubro.
     """
-    return service.obtener_siguiente_codigo()
+    return await service.obtener_siguiente_codigo()
 
 @router_rubros.patch("/{id}", 
                       response_model=RubroModel,
                       summary="Actualizar Rubro (PATCH)")
-def actualizar_rubro(
+async def actualizar_rubro(
     id: str, 
     data: RubroUpdateModel, 
     service: RubroService = Depends(get_rubro_service)
@@ -70,7 +179,7 @@ def actualizar_rubro(
     """
     Actualiza parcialmente un rubro (nombre o baja_logica).
     """
-    updated = service.actualizar_rubro(id, data)
+    updated = await service.actualizar_rubro(id, data)
     if not updated:
         raise HTTPException(status_code=404, detail="Rubro no encontrado")
     return updated
@@ -78,7 +187,7 @@ def actualizar_rubro(
 @router_rubros.delete("/{id}", 
                       status_code=status.HTTP_204_NO_CONTENT,
                       summary="Baja Lógica (Doctrina VIL)")
-def baja_logica_rubro(
+async def baja_logica_rubro(
     id: str, 
     service: RubroService = Depends(get_rubro_service)
 ):
@@ -86,6 +195,6 @@ def baja_logica_rubro(
     Realiza una baja lógica (Doctrina VIL) del rubro.
     Establece baja_logica = true.
     """
-    if not service.baja_logica_rubro(id):
+    if not await service.baja_logica_rubro(id):
         raise HTTPException(status_code=404, detail="Rubro no encontrado")
     return {} # No content
\ No newline at end of file
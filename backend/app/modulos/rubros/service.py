@@ -1,25 +1,31 @@
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from fastapi import HTTPException, status
+from google.api_core.exceptions import AlreadyExists
 from google.cloud.firestore_v1.base_query import FieldFilter
 from .models import RubroModel, RubroUpdateModel
-from .helpers.rubro_helper import _transaccion_crear_rubro, DuplicadoActivoException, DuplicadoInactivoException
+from .helpers.rubro_helper import _transaccion_crear_rubro, _excepcion_duplicado, DuplicadoActivoException, DuplicadoInactivoException
+from ...core.actualizacion import actualizar_con_retorno
+from ...core.cache import cache_catalogos
+from ...core.claves_unicas import sincronizar_clave
+from ...core.contadores import asignador
+from ...core.estadisticas import EstadisticasModel, calcular_estadisticas
+from ...core.exportacion import exportar_consulta
+from ...core.lectura import LecturaPorIds, en_cache_catalogos, leer_por_ids, modelos_por_ids, validar_documentos
+from ...core.masivo import ResultadoItemMasivo, cambiar_estado_masivo, crear_masivo, validar_tamano_masivo
+from ...core.paginacion import Pagina, normalizar_limite, paginar_consulta, paginar_lista
+from ...core.proyeccion import Campos, campos_firestore, modelo_proyectado
+from ...core.referencias import exigir_sin_hijos
+from ...core.versiones import version_vigente
 
-# --- INICIO: Conexión a DB Real (Patrón Rubros Blindado) ---
-from google.cloud import firestore
-from google.oauth2 import service_account
-import os
+# Doctrina Contadores: 'codigo' tiene 3 caracteres; bloques chicos para no quemar el rango en reinicios
+MAXIMO_CODIGO_RUBRO = 999
+BLOQUE_CODIGOS_RUBRO = 10
 
-ruta_llave_absoluta = "C:/dev/Sonido_Liquido_V4/service-account-v4.json"
+# Doctrina Referencias (Anti-Orfandad)
+MENSAJE_HIJOS_ACTIVOS = "No se puede dar de baja el Rubro porque tiene Subrubros o Productos activos asociados."
 
-try:
-    credentials = service_account.Credentials.from_service_account_file(ruta_llave_absoluta)
-    db = firestore.Client(credentials=credentials)
-except Exception as e:
-    print(f"ERROR CRÍTICO: No se pudo cargar la llave de Firestore desde {ruta_llave_absoluta}")
-    print(f"Error: {e}")
-    db = None
-
-# --- FIN: Conexión a DB Real ---
+# --- Conexión a DB: Doctrina Conexión Única ---
+# El cliente compartido se crea en app/core/database.py y lo inyecta el lifespan de main.py.
 
 
 class RubroService:
@@ -28,22 +34,23 @@ class RubroService:
         self.db = db_instance
 
     # --- CORREGIDO: Se aplica la Doctrina V12.13 (Patrón SubRubros) ---
-    def crear_rubro(self, data: RubroModel) -> RubroModel:
+    async def crear_rubro(self, data: RubroModel) -> RubroModel:
         if self.db is None:
               raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
         try:
-            rubro_dict = data.model_dump(exclude={'id'}, exclude_unset=True)
+            rubro_dict = data.model_dump(exclude={'id', 'referencias'}, exclude_unset=True)
 
             # 1. Se crea el objeto de transacción
             transaction = self.db.transaction()
 
             # 2. Se llama al helper DECORADO, pasándole la 'transaction'
-            nuevo_rubro = _transaccion_crear_rubro(
+            nuevo_rubro = await _transaccion_crear_rubro(
                 transaction,
                 rubro_data=rubro_dict,
                 db=self.db
             )
+            cache_catalogos.invalidar('rubros')
 
             return nuevo_rubro
 
@@ -54,11 +61,61 @@ class RubroService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
 
-    # --- Síncrono (def) y 'await' eliminado ---
-    def listar_rubros(self, estado: str = 'activos') -> List[RubroModel]:
+    # --- Doctrina Operaciones Masivas: ABR agrupado + WriteBatch troceados ---
+    async def crear_rubros_masivo(self, items: List[RubroModel]) -> List[ResultadoItemMasivo]:
         if self.db is None:
               raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(items)
+
+        def conflicto(doc_id: str, datos: dict):
+            e = _excepcion_duplicado(doc_id, datos, datos.get('codigo'))
+            return ('EXISTE_INACTIVO' if isinstance(e, DuplicadoInactivoException) else 'EXISTE_ACTIVO'), e.detail
+
+        def contador(lote, ref, datos: dict):
+            # Doctrina ID Soberano Universal: cada rubro nace con su contador
+            datos['id'] = ref.id
+            lote.set(self.db.collection('contadores').document(ref.id), {'ultimo_valor': 0})
 
+        try:
+            registros = [item.model_dump(exclude={'id', 'referencias'}, exclude_unset=True) for item in items]
+            resultados = await crear_masivo(self.db, 'rubros', 'codigo', registros,
+                                            conflicto=conflicto, extra=contador, ops_por_item=2)
+            cache_catalogos.invalidar('rubros')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en alta masiva de rubros: {e}")
+
+    # --- Doctrina Exportación: streaming por páginas, sin armar la lista completa ---
+    def exportar_rubros(self, estado: str = 'todos', formato: str = 'ndjson') -> AsyncIterator[bytes]:
+        if self.db is None:
+              raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        query = self.db.collection('rubros')
+        if estado == 'activos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", False))
+        elif estado == 'inactivos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", True))
+        return exportar_consulta(query, RubroModel, formato)
+
+    async def version_listado(self) -> int:
+        """Versión de la colección para el ETag de los listados (lectura reusada durante SL_VERSION_TTL segundos)."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        return await version_vigente(self.db, 'rubros')
+
+    # --- Async nativo (AsyncClient): no consume tokens del threadpool ---
+    async def listar_rubros(self, estado: str = 'activos', limite: Optional[int] = None, cursor: Optional[str] = None,
+                              campos: Campos = None, version: Optional[int] = None) -> Pagina:
+        if self.db is None:
+              raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        # Doctrina Cache de Catálogos: lectura a través de memoria
+        clave = (estado, normalizar_limite(limite), cursor, campos)
+        return await cache_catalogos.obtener('rubros', clave,
+                                             lambda: self._consultar_rubros(estado, limite, cursor, campos), version)
+
+    async def _consultar_rubros(self, estado: str, limite: Optional[int], cursor: Optional[str], campos: Campos) -> Pagina:
         try:
             query = self.db.collection('rubros')
             if estado == 'activos':
@@ -66,56 +123,152 @@ class RubroService:
             elif estado == 'inactivos':
                 query = query.where(filter=FieldFilter("baja_logica", "==", True))
 
-            docs = query.stream()
-            lista = []
+            # Doctrina Proyección: solo viajan y se validan los campos pedidos
+            modelo = RubroModel
+            if campos:
+                query = query.select(campos_firestore(campos))
+                modelo = modelo_proyectado(RubroModel, campos)
+
+            # Doctrina Paginación: order_by(id) + start_after(cursor) + limit
+            docs, siguiente_cursor = await paginar_consulta(query, limite, cursor)
             
             # --- INICIO REPARACIÓN DOCTRINAL (FALLO CRÍTICO ID) ---
             # Se debe adjuntar el ID del documento al diccionario antes de validar
             # para que el frontend pueda operar (Editar/Baja).
-            for doc in docs:
-                datos = doc.to_dict()
-                datos['id'] = doc.id 
-                lista.append(RubroModel.model_validate(datos))
+            # Doctrina Lectura Confiable: la página entera se valida en una sola llamada
+            lista = validar_documentos(modelo, docs)
             # --- FIN REPARACIÓN DOCTRINAL ---
                 
-            return lista
+            return Pagina(lista, siguiente_cursor)
 
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al listar rubros: {e}")
 
-    # --- Síncrono (def) y 'await' eliminados ---
-    def actualizar_rubro(self, id: str, data: RubroUpdateModel) -> Optional[RubroModel]:
+    # --- Async nativo (AsyncClient) ---
+    async def actualizar_rubro(self, id: str, data: RubroUpdateModel) -> Optional[RubroModel]:
         if self.db is None:
               raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
         try:
-            doc_ref = self.db.collection('rubros').document(id)
             update_data = data.model_dump(exclude_unset=True)
 
-            doc_ref.update(update_data)
+            async def preparar(lote, actual: dict):
+                if update_data.get('baja_logica'):
+                    # Doctrina Referencias: la baja por PATCH respeta la misma regla anti-orfandad
+                    exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+                # Doctrina Claves Únicas: la clave sigue al código y al estado (baja / reactivación)
+                dueno = await sincronizar_clave(self.db, lote, 'rubros', 'codigo', id, update_data, actual)
+                if dueno is not None:
+                    e = _excepcion_duplicado(dueno[0], dueno[1], update_data['codigo'])
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.detail)
 
-            doc = doc_ref.get()
-            if doc.exists:
-                # --- REPARACIÓN DOCTRINAL (FALLO ID): Asegurar retorno de ID ---
-                datos = doc.to_dict()
-                datos['id'] = doc.id
-                return RubroModel.model_validate(datos)
-                # --- FIN REPARACIÓN DOCTRINAL ---
-            return None
+            # Doctrina Escritura con Retorno: dato + clave + versión en un WriteBatch condicionado
+            # a la pre-imagen; el resultado sale de ella (sin releer). None: no existe.
+            datos = await actualizar_con_retorno(self.db, 'rubros', id, update_data, preparar)
+            if datos is None:
+                return None
+            cache_catalogos.invalidar('rubros')
+            # --- REPARACIÓN DOCTRINAL (FALLO ID): el resultado ya trae el ID ---
+            return RubroModel.model_validate(datos)
+        except HTTPException:
+            raise
+        except AlreadyExists:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="El código fue tomado por otra operación concurrente.")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al actualizar: {e}")
 
-    # --- Síncrono (def) y 'await' eliminado ---
-    def baja_logica_rubro(self, id: str) -> bool:
+    # --- Async nativo (AsyncClient) ---
+    async def baja_logica_rubro(self, id: str) -> bool:
         if self.db is None:
               raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
         try:
-            doc_ref = self.db.collection('rubros').document(id)
-            doc_ref.update({"baja_logica": True})
+            async def preparar(lote, actual: dict):
+                # Doctrina Referencias (Anti-Orfandad): contadores de la pre-imagen del rubro
+                exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+                await sincronizar_clave(self.db, lote, 'rubros', 'codigo', id, {"baja_logica": True}, actual)
+
+            # Doctrina Escritura con Retorno: un hijo asociado en el medio hace releer y reevaluar
+            if await actualizar_con_retorno(self.db, 'rubros', id, {"baja_logica": True}, preparar) is None:
+                return False
+            cache_catalogos.invalidar('rubros')
             return True
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al dar de baja: {e}")
 
+    # --- Doctrina Contadores (hi-lo) ---
+    async def _mayor_codigo(self) -> int:
+        """Semilla del contador: el mayor 'codigo' numérico ya cargado."""
+        query = self.db.collection('rubros').select(['codigo'])
+        codigos = [(doc.to_dict() or {}).get('codigo', '') async for doc in query.stream()]
+        return max((int(c) for c in codigos if str(c).isdigit()), default=0)
+
+    async def obtener_siguiente_codigo(self) -> int:
+        if self.db is None:
+              raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            contador = asignador('rubros', tamano_bloque=BLOQUE_CODIGOS_RUBRO,
+                                 maximo=MAXIMO_CODIGO_RUBRO, semilla=self._mayor_codigo)
+            return await contador.siguiente(self.db)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener el próximo código: {e}")
+
+    # --- Doctrina Estadísticas: agregaciones en Firestore ---
+    async def estadisticas_rubros(self, estado: str = 'activos') -> EstadisticasModel:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            return await calcular_estadisticas(self.db, 'rubros', estado)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al calcular estadísticas de rubros: {e}")
+
+    # --- Doctrina Lectura Agrupada: batch-get por ids ---
+    async def leer_rubros_por_ids(self, ids: List[str], campos: Campos = None) -> LecturaPorIds:
+        """Listados cacheados primero; el resto, get_all agrupado (un RPC cada 500 ids). Orden de entrada + faltantes."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        modelo = modelo_proyectado(RubroModel, campos) if campos else RubroModel
+        mascara = campos_firestore(campos) if campos else None
+
+        async def leer(pendientes: List[str]):
+            return await modelos_por_ids(self.db, 'rubros', modelo, pendientes, mascara)
+
+        try:
+            # Doctrina Cache de Catálogos: los ids ya presentes en un listado cacheado no generan lecturas
+            en_memoria = await en_cache_catalogos(self.db, 'rubros', RubroModel, campos)
+            return await leer_por_ids(modelo, ids, leer, en_memoria)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener rubros por ids: {e}")
+
+    # --- Doctrina Operaciones Masivas: baja / reactivación agrupadas (Doctrina VIL) ---
+    async def cambiar_estado_rubros_masivo(self, ids: List[str], baja: bool) -> List[ResultadoItemMasivo]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        try:
+            resultados = await cambiar_estado_masivo(self.db, 'rubros', 'codigo', ids, baja, MENSAJE_HIJOS_ACTIVOS)
+            cache_catalogos.invalidar('rubros')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en la {'baja' if baja else 'reactivación'} masiva: {e}")
+
 # Instancia Singleton del Servicio
-rubro_service = RubroService(db)
+rubro_service = RubroService(None)
@@ -1,7 +1,9 @@
 # backend/app/modulos/subrubros/helpers/subrubro_helper.py
 from google.cloud import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
 import json # Importar json para la carga de detalles
+from ....core.claves_unicas import leer_clave, reservar_clave
+from ....core.referencias import escribir_referencias
+from ....core.versiones import marcar_version
 
 # --- Excepciones Doctrinales (Replicación ABR V12) ---
 class DuplicadoException(Exception):
@@ -15,49 +17,51 @@ class DuplicadoInactivoException(DuplicadoException):
     pass
 # --- Fin Excepciones ---
 
-@firestore.transactional
-def _transaccion_crear_subrubro(transaction, subrubro_data: dict, db):
+def _excepcion_duplicado(doc_id: str, datos_existentes: dict, codigo: str) -> DuplicadoException:
+    """
+    Traduce un duplicado encontrado a la excepción doctrinal (ABR V12).
+    Compartido por la transacción y por el alta masiva.
+    """
+    if datos_existentes.get('baja_logica', False):
+        # 2.A. Duplicado INACTIVO (ABR V12)
+        # *** CORRECCIÓN CANON V2.3: Devolver JSON Estructurado ***
+        return DuplicadoInactivoException(
+            detail={
+                "status": "EXISTE_INACTIVO",
+                "id_inactivo": doc_id,
+                "campo": "código" # El campo que causó el duplicado
+            }
+        )
+    # 2.B. Duplicado ACTIVO (ABR V12)
+    # *** CORRECCIÓN CANON V2.3: Devolver JSON Estructurado ***
+    return DuplicadoActivoException(
+        detail={
+            "status": "EXISTE_ACTIVO",
+            "message": f"Código '{codigo}' ya está en uso activo."
+        }
+    )
+
+@firestore.async_transactional
+async def _transaccion_crear_subrubro(transaction, subrubro_data: dict, db, referencias=()):
     """
     Helper transaccional (Patrón Rubros V12) para crear SubRubro.
     Asegura unicidad de 'codigo_subrubro' (Doctrina ABR).
+    'referencias': incremento del rubro padre (Doctrina Referencias), resuelto antes de la transacción.
     """
 
     codigo = subrubro_data.get('codigo_subrubro')
 
-    # 1. Búsqueda de duplicados por 'codigo_subrubro'
-    query_ref = db.collection('subrubros').where(filter=FieldFilter("codigo_subrubro", "==", codigo))
-    docs_existentes = query_ref.stream(transaction=transaction)
-
-    duplicado_encontrado = None
-    doc_id = None
-    for doc in docs_existentes:
-        duplicado_encontrado = doc.to_dict()
-        doc_id = doc.id
-        break
-
-    if duplicado_encontrado:
-        if duplicado_encontrado.get('baja_logica', False):
-            # 2.A. Duplicado INACTIVO (ABR V12)
-            # *** CORRECCIÓN CANON V2.3: Devolver JSON Estructurado ***
-            raise DuplicadoInactivoException(
-                detail={
-                    "status": "EXISTE_INACTIVO",
-                    "id_inactivo": doc_id,
-                    "campo": "código" # El campo que causó el duplicado
-                }
-            )
-        else:
-            # 2.B. Duplicado ACTIVO (ABR V12)
-            # *** CORRECCIÓN CANON V2.3: Devolver JSON Estructurado ***
-            raise DuplicadoActivoException(
-                detail={
-                    "status": "EXISTE_ACTIVO",
-                    "message": f"Código '{codigo}' ya está en uso activo."
-                }
-            )
-
-    # 3. No hay duplicados. Creación (Doctrina VIL).
+    # 1. Búsqueda de duplicados por 'codigo_subrubro': lectura puntual de la clave única
+    dueno = await leer_clave(db, 'subrubros', codigo, transaction=transaction)
+    if dueno is not None:
+        raise _excepcion_duplicado(dueno[0], dueno[1], codigo)
+
+    # 3. No hay duplicados. Creación (Doctrina VIL) + clave única.
     nuevo_doc_ref = db.collection('subrubros').document()
     transaction.create(nuevo_doc_ref, subrubro_data)
+    reservar_clave(transaction, db, 'subrubros', 'codigo_subrubro', codigo, nuevo_doc_ref.id,
+                   subrubro_data.get('baja_logica', False))
+    escribir_referencias(transaction, 'subrubros', referencias, db)
+    marcar_version(transaction, db, 'subrubros') # Doctrina Versiones (ETag)
 
     return nuevo_doc_ref.id, subrubro_data
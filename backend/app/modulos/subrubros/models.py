@@ -1,11 +1,13 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 
 class SubRubroModel(BaseModel):
     id: Optional[str] = None
     codigo_subrubro: str = Field(..., max_length=10) # Identificador de negocio único
     nombre: str = Field(..., max_length=50)
+    rubro_id: Optional[str] = None # Rubro padre (Doctrina Referencias)
     baja_logica: bool = False
+    referencias: Optional[Dict[str, int]] = None # Hijos activos por colección (solo lectura)
 
     class Config:
         orm_mode = True
@@ -13,4 +15,5 @@ class SubRubroModel(BaseModel):
 class SubRubroUpdateModel(BaseModel):
     codigo_subrubro: Optional[str] = Field(None, max_length=10)
     nombre: Optional[str] = Field(None, max_length=50)
+    rubro_id: Optional[str] = None
     baja_logica: Optional[bool] = None
\ No newline at end of file
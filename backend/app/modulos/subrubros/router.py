@@ -1,7 +1,14 @@
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response
 from .models import SubRubroModel, SubRubroUpdateModel
 from .service import subrubro_service, SubRubroService
+from ...core.estadisticas import EstadisticasModel
+from ...core.exportacion import PATRON_FORMATO_EXPORTACION, respuesta_exportacion
+from ...core.lectura import LecturaPorIds, responder
+from ...core.masivo import IdsMasivo, ResultadoItemMasivo
+from ...core.paginacion import aplicar_cursor
+from ...core.proyeccion import parsear_campos
+from ...core.versiones import calcular_etag, publicar_etag, respuesta_no_modificada
 
 # [INICIO Patrón Singleton V3 (Backend)]
 # Instancia del servicio (importada desde service.py)
@@ -15,23 +22,113 @@ router_subrubros = APIRouter(
 )
 
 @router_subrubros.post("/", response_model=SubRubroModel, status_code=status.HTTP_201_CREATED)
-def crear_subrubro(data: SubRubroModel, service: SubRubroService = Depends(get_subrubro_service)):
+async def crear_subrubro(data: SubRubroModel, service: SubRubroService = Depends(get_subrubro_service)):
     try:
-        return service.crear_subrubro(data)
+        return await service.crear_subrubro(data)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error inesperado al crear subrubro: {e}")
 
+@router_subrubros.post("/bulk", response_model=List[ResultadoItemMasivo])
+async def crear_subrubros_masivo(items: List[SubRubroModel], service: SubRubroService = Depends(get_subrubro_service)):
+    # Alta masiva: un resultado por item (CREADO / EXISTE_ACTIVO / EXISTE_INACTIVO / ERROR)
+    try:
+        return await service.crear_subrubros_masivo(items)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error inesperado en alta masiva de subrubros: {e}")
+
+@router_subrubros.post("/baja-masiva", response_model=List[ResultadoItemMasivo])
+async def baja_subrubros_masiva(data: IdsMasivo, service: SubRubroService = Depends(get_subrubro_service)):
+    # Baja masiva: un resultado por id (BAJA / SIN_CAMBIOS / NO_ENCONTRADO / TIENE_HIJOS_ACTIVOS / ERROR)
+    try:
+        return await service.cambiar_estado_subrubros_masivo(data.ids, baja=True)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error inesperado en baja masiva de subrubros: {e}")
+
+@router_subrubros.post("/reactivar-masivo", response_model=List[ResultadoItemMasivo])
+async def reactivar_subrubros_masivo(data: IdsMasivo, service: SubRubroService = Depends(get_subrubro_service)):
+    # Reactivación masiva: un resultado por id (REACTIVADO / SIN_CAMBIOS / NO_ENCONTRADO / ERROR)
+    try:
+        return await service.cambiar_estado_subrubros_masivo(data.ids, baja=False)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error inesperado en reactivación masiva de subrubros: {e}")
+
+@router_subrubros.post("/batch-get", response_model=LecturaPorIds[SubRubroModel])
+async def obtener_subrubros_por_ids(
+    data: IdsMasivo,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo_subrubro,nombre); el id va siempre"),
+    service: SubRubroService = Depends(get_subrubro_service),
+):
+    # Lectura agrupada: encontrados en el orden de entrada + ids inexistentes en 'faltantes'
+    try:
+        campos = parsear_campos(fields, SubRubroModel)
+        return responder(response, await service.leer_subrubros_por_ids(data.ids, campos))
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error inesperado al obtener subrubros por ids: {e}")
+
 @router_subrubros.get("/lista", response_model=List[SubRubroModel])
-def listar_subrubros(estado: str = 'activos', service: SubRubroService = Depends(get_subrubro_service)):
+async def listar_subrubros(
+    request: Request,
+    response: Response,
+    estado: str = 'activos',
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (con tope del servidor)"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la cabecera X-Siguiente-Cursor"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo,nombre); el id va siempre"),
+    service: SubRubroService = Depends(get_subrubro_service)
+):
     # --- LÍNEA CORREGIDA (Sin rubro_id) ---
-    return service.listar_subrubros(estado=estado)
+    # Doctrina Paginación: cursor siguiente en la cabecera X-Siguiente-Cursor
+    # Doctrina Versiones: GET condicional (If-None-Match -> 304 sin leer ni serializar la lista)
+    campos = parsear_campos(fields, SubRubroModel)
+    # El ETag y el cuerpo salen de la misma versión (el cache no sirve cuerpos de otra versión)
+    version = await service.version_listado()
+    etag = calcular_etag('subrubros', version, estado, limit, cursor, campos)
+    no_modificado = respuesta_no_modificada(request, etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    pagina = await service.listar_subrubros(estado=estado, limite=limit, cursor=cursor, campos=campos, version=version)
+    publicar_etag(response, etag)
+    # Doctrina Lectura Confiable: la página sale en bytes (modelo completo o recortado por 'fields')
+    return responder(response, aplicar_cursor(response, pagina))
+
+@router_subrubros.get("/stats", response_model=EstadisticasModel)
+async def estadisticas_subrubros(
+    estado: str = 'activos',
+    por_rubro: bool = Query(False, description="Una cantidad por rubro (una agregación por rubro, en paralelo)"),
+    service: SubRubroService = Depends(get_subrubro_service),
+):
+    # Doctrina Estadísticas: count() en Firestore, cacheado unos segundos
+    try:
+        return await service.estadisticas_subrubros(estado, por_rubro)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error inesperado al calcular estadísticas de subrubros: {e}")
+
+@router_subrubros.get("/export")
+async def exportar_subrubros(
+    estado: str = 'todos',
+    formato: str = Query('ndjson', alias='format', pattern=PATRON_FORMATO_EXPORTACION),
+    service: SubRubroService = Depends(get_subrubro_service)
+):
+    # Doctrina Exportación: volcado fila por fila (backups / BI), memoria constante
+    return respuesta_exportacion(service.exportar_subrubros(estado, formato), 'subrubros', formato)
 
 @router_subrubros.put("/{id}", response_model=SubRubroModel)
-def actualizar_subrubro(id: str, data: SubRubroUpdateModel, service: SubRubroService = Depends(get_subrubro_service)):
+async def actualizar_subrubro(id: str, data: SubRubroUpdateModel, service: SubRubroService = Depends(get_subrubro_service)):
     try:
-        actualizado = service.actualizar_subrubro(id, data)
+        actualizado = await service.actualizar_subrubro(id, data)
         if actualizado is None:
             raise HTTPException(status_code=404, detail="SubRubro no encontrado")
         return actualizado
@@ -41,9 +138,9 @@ def actualizar_subrubro(id: str, data: SubRubroUpdateModel, service: SubRubroSer
         raise HTTPException(status_code=500, detail=f"Error inesperado al actualizar subrubro: {e}")
 
 @router_subrubros.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def baja_logica_subrubro(id: str, service: SubRubroService = Depends(get_subrubro_service)):
+async def baja_logica_subrubro(id: str, service: SubRubroService = Depends(get_subrubro_service)):
     try:
-        if not service.baja_logica_subrubro(id):
+        if not await service.baja_logica_subrubro(id):
             raise HTTPException(status_code=404, detail="SubRubro no encontrado")
         return
     except HTTPException as e:
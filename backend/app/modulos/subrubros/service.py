@@ -1,26 +1,30 @@
-from typing import List, Optional
+from collections import Counter
+from typing import AsyncIterator, List, Optional
 from fastapi import HTTPException, status
+from google.api_core.exceptions import AlreadyExists
 from google.cloud.firestore_v1.base_query import FieldFilter
 from .models import SubRubroModel, SubRubroUpdateModel
-from .helpers.subrubro_helper import _transaccion_crear_subrubro, DuplicadoActivoException, DuplicadoInactivoException
+from .helpers.subrubro_helper import _transaccion_crear_subrubro, _excepcion_duplicado, DuplicadoActivoException, DuplicadoInactivoException
+from ...core.actualizacion import actualizar_con_retorno
+from ...core.cache import cache_catalogos
+from ...core.claves_unicas import sincronizar_clave
+from ...core.estadisticas import EstadisticasModel, calcular_estadisticas, valores_de_coleccion
+from ...core.exportacion import exportar_consulta
+from ...core.lectura import LecturaPorIds, en_cache_catalogos, leer_por_ids, modelos_por_ids, validar_documentos
+from ...core.masivo import ResultadoItemMasivo, cambiar_estado_masivo, crear_masivo, validar_tamano_masivo
+from ...core.paginacion import Pagina, normalizar_limite, paginar_consulta, paginar_lista
+from ...core.proyeccion import Campos, campos_firestore, modelo_proyectado
+from ...core.referencias import (
+    colecciones_padre, escribir_referencias, exigir_sin_hijos, incrementos, padres_activos,
+    referencias_por_altas, referencias_por_cambio, resolver_padres,
+)
+from ...core.versiones import version_vigente
 
-# --- INICIO: Conexión a DB Real (Patrón Rubros Blindado) ---
-from google.cloud import firestore
-from google.oauth2 import service_account
-import os 
+# Doctrina Referencias (Anti-Orfandad)
+MENSAJE_HIJOS_ACTIVOS = "No se puede dar de baja el SubRubro porque tiene Productos activos asociados."
 
-ruta_llave_absoluta = "C:/dev/Sonido_Liquido_V4/service-account-v4.json"
-
-try:
-    credentials = service_account.Credentials.from_service_account_file(ruta_llave_absoluta)
-    db = firestore.Client(credentials=credentials)
-except Exception as e:
-    print(f"ERROR CRÍTICO: No se pudo cargar la llave de Firestore desde {ruta_llave_absoluta}")
-    print(f"Error: {e}")
-    db = None 
-
-# [Helper 'run_in_transaction' ELIMINADO]
-# --- FIN: Conexión a DB Real ---
+# --- Conexión a DB: Doctrina Conexión Única ---
+# El cliente compartido se crea en app/core/database.py y lo inyecta el lifespan de main.py.
 
 
 class SubRubroService:
@@ -28,25 +32,29 @@ class SubRubroService:
     def __init__(self, db_instance):
         self.db = db_instance
     
-    # Esta función NO es async, porque llama a la transacción (sync)
-    def crear_subrubro(self, data: SubRubroModel) -> SubRubroModel:
+    # Async nativo: la transacción corre sobre AsyncClient (async_transactional)
+    async def crear_subrubro(self, data: SubRubroModel) -> SubRubroModel:
         if self.db is None: # Uso de self.db
                 raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
         
         try:
             # Convertimos a dict para evitar el error '_read_only' del decorador
-            subrubro_dict = data.model_dump(exclude={'id'}, exclude_unset=True) 
+            subrubro_dict = data.model_dump(exclude={'id', 'referencias'}, exclude_unset=True) 
+            # Doctrina Referencias: el incremento del rubro padre viaja en la misma transacción
+            referencias = await referencias_por_altas(self.db, 'subrubros', [subrubro_dict])
             
             # Creamos el objeto de transacción
             transaction = self.db.transaction() # Uso de self.db
             
             # === CORRECCIÓN DE ERROR 500 (Respuesta de Tupla) ===
             # El helper devuelve una tupla (doc_id, subrubro_data_dict)
-            doc_id, subrubro_data_dict = _transaccion_crear_subrubro(
+            doc_id, subrubro_data_dict = await _transaccion_crear_subrubro(
                 transaction, # <-- Pasamos la transacción
                 subrubro_data=subrubro_dict,
-                db=self.db # Uso de self.db 
+                db=self.db, # Uso de self.db 
+                referencias=referencias
             )
+            cache_catalogos.invalidar('subrubros')
             
             # Asignamos el ID de Firestore al dict ANTES de validar el modelo
             subrubro_data_dict['id'] = doc_id 
@@ -62,11 +70,67 @@ class SubRubroService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
 
-    # Esta función NO es async (corrige el error 'object generator')
-    def listar_subrubros(self, estado: str = 'activos') -> List[SubRubroModel]:
+    # --- Doctrina Operaciones Masivas: ABR agrupado + WriteBatch troceados ---
+    async def crear_subrubros_masivo(self, items: List[SubRubroModel]) -> List[ResultadoItemMasivo]:
+        if self.db is None:
+                raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(items)
+
+        def conflicto(doc_id: str, datos: dict):
+            e = _excepcion_duplicado(doc_id, datos, datos.get('codigo_subrubro'))
+            return e.detail['status'], e.detail
+
+        try:
+            registros = [item.model_dump(exclude={'id', 'referencias'}, exclude_unset=True) for item in items]
+            # Doctrina Referencias: rubros padre resueltos una vez; cada lote incrementa
+            # (agregado por rubro) los contadores de las altas que confirma
+            padres = await resolver_padres(self.db, (p for r in registros for p in padres_activos('subrubros', r)))
+            padres_tocados = set()
+
+            def referencias(lote, confirmados: List[dict]):
+                deltas = Counter(p for datos in confirmados for p in padres_activos('subrubros', datos))
+                cambios = incrementos(deltas, padres)
+                escribir_referencias(lote, 'subrubros', cambios)
+                padres_tocados.update(colecciones_padre(cambios))
+
+            resultados = await crear_masivo(self.db, 'subrubros', 'codigo_subrubro', registros, conflicto=conflicto,
+                                            ops_por_item=2, cierre=referencias, versiones=padres_tocados)
+            cache_catalogos.invalidar('subrubros')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en alta masiva de subrubros: {e}")
+
+    # --- Doctrina Exportación: streaming por páginas, sin armar la lista completa ---
+    def exportar_subrubros(self, estado: str = 'todos', formato: str = 'ndjson') -> AsyncIterator[bytes]:
+        if self.db is None:
+                raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        query = self.db.collection('subrubros')
+        if estado == 'activos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", False))
+        elif estado == 'inactivos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", True))
+        return exportar_consulta(query, SubRubroModel, formato)
+
+    async def version_listado(self) -> int:
+        """Versión de la colección para el ETag de los listados (lectura reusada durante SL_VERSION_TTL segundos)."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        return await version_vigente(self.db, 'subrubros')
+
+    # Async nativo (AsyncClient) + Doctrina Paginación
+    async def listar_subrubros(self, estado: str = 'activos', limite: Optional[int] = None, cursor: Optional[str] = None,
+                                 campos: Campos = None, version: Optional[int] = None) -> Pagina:
         if self.db is None: # Uso de self.db
                 raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
-        
+
+        # Doctrina Cache de Catálogos: lectura a través de memoria
+        clave = (estado, normalizar_limite(limite), cursor, campos)
+        return await cache_catalogos.obtener('subrubros', clave,
+                                             lambda: self._consultar_subrubros(estado, limite, cursor, campos), version)
+
+    async def _consultar_subrubros(self, estado: str, limite: Optional[int], cursor: Optional[str], campos: Campos) -> Pagina:
         try:
             query = self.db.collection('subrubros') # Uso de self.db
             if estado == 'activos':
@@ -74,44 +138,136 @@ class SubRubroService:
             elif estado == 'inactivos':
                 query = query.where(filter=FieldFilter("baja_logica", "==", True))
             
-            docs = query.stream() # <-- 'await' ELIMINADO
-            lista = []
-            for doc in docs:
-                lista.append(SubRubroModel.model_validate(doc.to_dict())) 
-            return lista
+            # Doctrina Proyección: solo viajan y se validan los campos pedidos
+            modelo = SubRubroModel
+            if campos:
+                query = query.select(campos_firestore(campos))
+                modelo = modelo_proyectado(SubRubroModel, campos)
+
+            # Doctrina Paginación: order_by(id) + start_after(cursor) + limit
+            docs, siguiente_cursor = await paginar_consulta(query, limite, cursor)
+            # Se adjunta el ID del documento (Reparación Doctrinal, igual que Rubros);
+            # Doctrina Lectura Confiable: la página entera se valida en una sola llamada
+            return Pagina(validar_documentos(modelo, docs), siguiente_cursor)
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al listar subrubros: {e}")
 
-    # Convertida a función síncrona (def) y 'await' eliminados
-    def actualizar_subrubro(self, id: str, data: SubRubroUpdateModel) -> Optional[SubRubroModel]:
+    # Async nativo (AsyncClient)
+    async def actualizar_subrubro(self, id: str, data: SubRubroUpdateModel) -> Optional[SubRubroModel]:
         if self.db is None: # Uso de self.db
                 raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
         
         try:
-            doc_ref = self.db.collection('subrubros').document(id) # Uso de self.db
             update_data = data.model_dump(exclude_unset=True) 
-            
-            doc_ref.update(update_data) # <-- 'await' ELIMINADO
-            
-            doc = doc_ref.get() # <-- 'await' ELIMINADO
-            if doc.exists:
-                return SubRubroModel.model_validate(doc.to_dict()) 
-            return None
+
+            async def preparar(lote, actual: dict):
+                if update_data.get('baja_logica'):
+                    # Doctrina Referencias: la baja por PATCH respeta la misma regla anti-orfandad
+                    exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+                # Doctrina Claves Únicas: la clave sigue al código y al estado (baja / reactivación)
+                dueno = await sincronizar_clave(self.db, lote, 'subrubros', 'codigo_subrubro', id, update_data, actual)
+                if dueno is not None:
+                    e = _excepcion_duplicado(dueno[0], dueno[1], update_data['codigo_subrubro'])
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.detail)
+                # Doctrina Referencias: reasignación de rubro, baja o reactivación mueven el contador del padre
+                escribir_referencias(lote, 'subrubros',
+                                     await referencias_por_cambio(self.db, 'subrubros', id, update_data, actual), self.db)
+
+            # Doctrina Escritura con Retorno: dato + clave + contadores + versión en un WriteBatch
+            # condicionado a la pre-imagen; el resultado sale de ella (sin releer). None: no existe.
+            datos = await actualizar_con_retorno(self.db, 'subrubros', id, update_data, preparar)
+            if datos is None:
+                return None
+            cache_catalogos.invalidar('subrubros')
+            return SubRubroModel.model_validate(datos)
+        except HTTPException:
+            raise
+        except AlreadyExists:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="El código fue tomado por otra operación concurrente.")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al actualizar: {e}")
 
-    # Convertida a función síncrona (def) y 'await' eliminado
-    def baja_logica_subrubro(self, id: str) -> bool:
+    # Async nativo (AsyncClient)
+    async def baja_logica_subrubro(self, id: str) -> bool:
         if self.db is None: # Uso de self.db
                 raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
         
         try:
-            doc_ref = self.db.collection('subrubros').document(id) # Uso de self.db
-            doc_ref.update({"baja_logica": True}) # <-- 'await' ELIMINADO
+            baja = {"baja_logica": True}
+
+            async def preparar(lote, actual: dict):
+                # Doctrina Referencias (Anti-Orfandad): contadores de la pre-imagen del subrubro
+                exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+                await sincronizar_clave(self.db, lote, 'subrubros', 'codigo_subrubro', id, baja, actual)
+                # Como hijo: deja de contar en su rubro
+                escribir_referencias(lote, 'subrubros',
+                                     await referencias_por_cambio(self.db, 'subrubros', id, baja, actual), self.db)
+
+            # Doctrina Escritura con Retorno: un hijo asociado en el medio hace releer y reevaluar
+            if await actualizar_con_retorno(self.db, 'subrubros', id, baja, preparar) is None:
+                return False
+            cache_catalogos.invalidar('subrubros')
             return True
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al dar de baja: {e}")
 
+    # --- Doctrina Estadísticas: agregaciones en Firestore ---
+    async def estadisticas_subrubros(self, estado: str = 'activos', por_rubro: bool = False) -> EstadisticasModel:
+        """Cantidad de subrubros; con 'por_rubro', una cantidad por cada rubro (en paralelo)."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            grupos = await valores_de_coleccion(self.db, 'rubros') if por_rubro else None
+            return await calcular_estadisticas(self.db, 'subrubros', estado,
+                                               por='rubro_id' if por_rubro else None, grupos=grupos)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al calcular estadísticas de subrubros: {e}")
+
+    # --- Doctrina Lectura Agrupada: batch-get por ids ---
+    async def leer_subrubros_por_ids(self, ids: List[str], campos: Campos = None) -> LecturaPorIds:
+        """Listados cacheados primero; el resto, get_all agrupado (un RPC cada 500 ids). Orden de entrada + faltantes."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        modelo = modelo_proyectado(SubRubroModel, campos) if campos else SubRubroModel
+        mascara = campos_firestore(campos) if campos else None
+
+        async def leer(pendientes: List[str]):
+            return await modelos_por_ids(self.db, 'subrubros', modelo, pendientes, mascara)
+
+        try:
+            # Doctrina Cache de Catálogos: los ids ya presentes en un listado cacheado no generan lecturas
+            en_memoria = await en_cache_catalogos(self.db, 'subrubros', SubRubroModel, campos)
+            return await leer_por_ids(modelo, ids, leer, en_memoria)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener subrubros por ids: {e}")
+
+    # --- Doctrina Operaciones Masivas: baja / reactivación agrupadas (Doctrina VIL) ---
+    async def cambiar_estado_subrubros_masivo(self, ids: List[str], baja: bool) -> List[ResultadoItemMasivo]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        try:
+            resultados = await cambiar_estado_masivo(self.db, 'subrubros', 'codigo_subrubro', ids, baja, MENSAJE_HIJOS_ACTIVOS)
+            cache_catalogos.invalidar('subrubros')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en la {'baja' if baja else 'reactivación'} masiva: {e}")
+
 # Instancia Singleton del Servicio
-subrubro_service = SubRubroService(db)
+subrubro_service = SubRubroService(None)
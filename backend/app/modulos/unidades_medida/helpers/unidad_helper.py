@@ -1,6 +1,7 @@
 ﻿# backend/app/modulos/unidades_medida/helpers/unidad_helper.py
 from google.cloud import firestore
-from google.cloud.firestore_v1.base_query import FieldFilter
+from ....core.claves_unicas import leer_clave, reservar_clave
+from ....core.versiones import marcar_version
 
 # --- Excepciones Doctrinales (Replicación ABR V12) ---
 class DuplicadoException(Exception):
@@ -14,8 +15,28 @@ class DuplicadoInactivoException(DuplicadoException):
     pass
 # --- Fin Excepciones ---
 
-@firestore.transactional
-def _transaccion_crear_unidad(transaction, unidad_data: dict, db):
+def _excepcion_duplicado(doc_id: str, datos_existentes: dict, codigo: str) -> DuplicadoException:
+    """
+    Traduce un duplicado encontrado a la excepción doctrinal (ABR V12).
+    Compartido por la transacción y por el pre-chequeo local del Espejo.
+    """
+    if datos_existentes.get('baja_logica', False):
+        # 2.A. Duplicado INACTIVO (ABR V12)
+        # --- REPARACIÓN G-U-19: Enviar JSON (como SubRubros) ---
+        json_payload = {
+            "status": "EXISTE_INACTIVO", 
+            "id_inactivo": doc_id, 
+            "campo": "código"
+        }
+        return DuplicadoInactivoException(detail=json_payload)
+        # --- FIN REPARACIÓN G-U-19 ---
+    # 2.B. Duplicado ACTIVO (ABR V12)
+    return DuplicadoActivoException(
+        detail=f"Código '{codigo}' ya está en uso activo."
+    )
+
+@firestore.async_transactional
+async def _transaccion_crear_unidad(transaction, unidad_data: dict, db):
     """
     Helper transaccional (Patrón Rubros V12) para crear Unidad de Medida.
     Asegura unicidad de 'codigo_unidad' (Doctrina ABR).
@@ -23,36 +44,16 @@ def _transaccion_crear_unidad(transaction, unidad_data: dict, db):
 
     codigo = unidad_data.get('codigo_unidad')
 
-    # 1. Búsqueda de duplicados por 'codigo_unidad'
-    query_ref = db.collection('unidades_medida').where(filter=FieldFilter("codigo_unidad", "==", codigo))
-    docs_existentes = query_ref.stream(transaction=transaction)
-
-    duplicado_encontrado = None
-    doc_id = None
-    for doc in docs_existentes:
-        duplicado_encontrado = doc.to_dict()
-        doc_id = doc.id
-        break
-
-    if duplicado_encontrado:
-        if duplicado_encontrado.get('baja_logica', False):
-            # 2.A. Duplicado INACTIVO (ABR V12)
-            # --- REPARACIÓN G-U-19: Enviar JSON (como SubRubros) ---
-            json_payload = {
-                "status": "EXISTE_INACTIVO", 
-                "id_inactivo": doc_id, 
-                "campo": "código"
-            }
-            raise DuplicadoInactivoException(detail=json_payload)
-            # --- FIN REPARACIÓN G-U-19 ---
-        else:
-            # 2.B. Duplicado ACTIVO (ABR V12)
-            raise DuplicadoActivoException(
-                detail=f"Código '{codigo}' ya está en uso activo."
-            )
-
-    # 3. No hay duplicados. Creación (Doctrina VIL).
+    # 1. Búsqueda de duplicados por 'codigo_unidad': lectura puntual de la clave única
+    dueno = await leer_clave(db, 'unidades_medida', codigo, transaction=transaction)
+    if dueno is not None:
+        raise _excepcion_duplicado(dueno[0], dueno[1], codigo)
+
+    # 3. No hay duplicados. Creación (Doctrina VIL) + clave única.
     nuevo_doc_ref = db.collection('unidades_medida').document()
     transaction.create(nuevo_doc_ref, unidad_data)
+    reservar_clave(transaction, db, 'unidades_medida', 'codigo_unidad', codigo, nuevo_doc_ref.id,
+                   unidad_data.get('baja_logica', False))
+    marcar_version(transaction, db, 'unidades_medida') # Doctrina Versiones (ETag)
 
     return nuevo_doc_ref.id, unidad_data
@@ -1,6 +1,6 @@
 # backend/app/modulos/unidades_medida/models.py
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 
 class UnidadMedidaModel(BaseModel):
     """
@@ -10,6 +10,7 @@ class UnidadMedidaModel(BaseModel):
     codigo_unidad: str = Field(..., max_length=4, description="Clave de negocio única (ej: KG, UN)")
     nombre: str = Field(..., max_length=30, description="Nombre descriptivo (ej: Kilogramos)")
     baja_logica: bool = Field(default=False, description="Estado de baja lógica (Doctrina VIL)")
+    referencias: Optional[Dict[str, int]] = Field(None, description="Hijos activos por colección (Doctrina Referencias, solo lectura)")
 
     class Config:
         from_attributes = True # Reemplaza orm_mode
@@ -1,8 +1,15 @@
-# backend/app/modulos/unidades_medida/router.py
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+﻿# backend/app/modulos/unidades_medida/router.py
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from typing import List, Optional
 from .models import UnidadMedidaModel, UnidadMedidaUpdateModel
 from .service import unidad_medida_service, UnidadMedidaService
+from ...core.estadisticas import EstadisticasModel
+from ...core.exportacion import PATRON_FORMATO_EXPORTACION, respuesta_exportacion
+from ...core.lectura import LecturaPorIds, responder
+from ...core.masivo import IdsMasivo, ResultadoItemMasivo
+from ...core.paginacion import aplicar_cursor
+from ...core.proyeccion import parsear_campos
+from ...core.versiones import calcular_etag, publicar_etag, respuesta_no_modificada
 
 # --- Adherencia V12: Inyección de Dependencia del Servicio ---
 def get_unidad_medida_service():
@@ -22,7 +29,7 @@ router_unidades_medida = APIRouter(
                            response_model=UnidadMedidaModel, 
                            status_code=status.HTTP_201_CREATED,
                            summary="Crear nueva Unidad de Medida (ABR V12)")
-def crear_unidad(
+async def crear_unidad(
     data: UnidadMedidaModel, 
     service: UnidadMedidaService = Depends(get_unidad_medida_service)
 ):
@@ -30,13 +37,73 @@ def crear_unidad(
     Crea una nueva unidad de medida.
     Aplica la Doctrina ABR V12 (Anti-Duplicados) sobre `codigo_unidad`.
     """
-    return service.crear_unidad(data)
+    return await service.crear_unidad(data)
+
+@router_unidades_medida.post("/bulk", 
+                           response_model=List[ResultadoItemMasivo],
+                           summary="Alta masiva de Unidades de Medida (ABR agrupado)")
+async def crear_unidades_masivo(
+    items: List[UnidadMedidaModel], 
+    service: UnidadMedidaService = Depends(get_unidad_medida_service)
+):
+    """
+    Crea varias unidades de medida en un solo request.
+    Devuelve un resultado por item, en el mismo orden: CREADO, EXISTE_ACTIVO, EXISTE_INACTIVO o ERROR.
+    """
+    return await service.crear_unidades_masivo(items)
+
+@router_unidades_medida.post("/baja-masiva", 
+                             response_model=List[ResultadoItemMasivo],
+                             summary="Baja lógica masiva de Unidades de Medida (Doctrina VIL)")
+async def baja_unidades_masiva(
+    data: IdsMasivo, 
+    service: UnidadMedidaService = Depends(get_unidad_medida_service)
+):
+    """
+    Da de baja las unidades de medida por id en WriteBatch troceados (una lectura agrupada para todo el conjunto).
+    Devuelve un resultado por id, en el mismo orden: BAJA, SIN_CAMBIOS, NO_ENCONTRADO, TIENE_HIJOS_ACTIVOS o ERROR.
+    """
+    return await service.cambiar_estado_unidades_masivo(data.ids, baja=True)
+
+@router_unidades_medida.post("/reactivar-masivo", 
+                             response_model=List[ResultadoItemMasivo],
+                             summary="Reactivación masiva de Unidades de Medida (Doctrina VIL)")
+async def reactivar_unidades_masivo(
+    data: IdsMasivo, 
+    service: UnidadMedidaService = Depends(get_unidad_medida_service)
+):
+    """
+    Reactiva las unidades de medida por id en WriteBatch troceados.
+    Devuelve un resultado por id, en el mismo orden: REACTIVADO, SIN_CAMBIOS, NO_ENCONTRADO o ERROR.
+    """
+    return await service.cambiar_estado_unidades_masivo(data.ids, baja=False)
+
+@router_unidades_medida.post("/batch-get", 
+                             response_model=LecturaPorIds[UnidadMedidaModel],
+                             summary="Obtener Unidades de Medida por lista de ids (lectura agrupada)")
+async def obtener_unidades_por_ids(
+    data: IdsMasivo, 
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo_unidad,nombre); el id va siempre"),
+    service: UnidadMedidaService = Depends(get_unidad_medida_service)
+):
+    """
+    Devuelve las unidades de medida pedidos en el orden de entrada (repetidos una vez) y los ids inexistentes en `faltantes`.
+    Con el Espejo activo se resuelven en memoria; el resto, Un get_all cada 500 ids.
+    """
+    campos = parsear_campos(fields, UnidadMedidaModel)
+    return responder(response, await service.leer_unidades_por_ids(data.ids, campos))
 
 @router_unidades_medida.get("/", 
                           response_model=List[UnidadMedidaModel],
                           summary="Listar Unidades (Filtro VIL)")
-def listar_unidades(
+async def listar_unidades(
+    request: Request,
+    response: Response,
     estado: str = 'activos', 
+    limit: Optional[int] = Query(None, ge=1, description="Tamaño de página (con tope del servidor)"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco de la cabecera X-Siguiente-Cursor"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo,nombre); el id va siempre"),
     service: UnidadMedidaService = Depends(get_unidad_medida_service)
 ):
     """
@@ -44,13 +111,71 @@ def listar_unidades(
     - 'activos' (default): Solo baja_logica = false
     - 'inactivos': Solo baja_logica = true
     - 'todos': Todos los registros
+
+    Doctrina Paginación: cursor siguiente en la cabecera `X-Siguiente-Cursor`.
+    """
+    # Doctrina Versiones: GET condicional (If-None-Match -> 304 sin leer ni serializar la lista)
+    campos = parsear_campos(fields, UnidadMedidaModel)
+    # El ETag y el cuerpo salen de la misma versión (el cache no sirve cuerpos de otra versión)
+    version = await service.version_listado()
+    etag = calcular_etag('unidades_medida', version, estado, limit, cursor, campos)
+    no_modificado = respuesta_no_modificada(request, etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    pagina = await service.listar_unidades(estado, limit, cursor, campos, version)
+    publicar_etag(response, etag)
+    # Doctrina Lectura Confiable: la página sale en bytes (modelo completo o recortado por 'fields')
+    return responder(response, aplicar_cursor(response, pagina))
+
+@router_unidades_medida.get("/export", 
+                          summary="Exportar Unidades de Medida (NDJSON / CSV en streaming)")
+async def exportar_unidades(
+    estado: str = 'todos',
+    formato: str = Query('ndjson', alias='format', pattern=PATRON_FORMATO_EXPORTACION),
+    service: UnidadMedidaService = Depends(get_unidad_medida_service)
+):
+    """
+    Vuelca la colección completa (o filtrada por estado VIL) fila por fila,
+    para backups y extracciones BI. Memoria y tiempo al primer byte constantes.
+    """
+    return respuesta_exportacion(service.exportar_unidades(estado, formato), 'unidades_medida', formato)
+
+@router_unidades_medida.get("/stats", 
+                            response_model=EstadisticasModel,
+                            summary="Estadísticas de Unidades de Medida (agregación en Firestore)")
+async def estadisticas_unidades(
+    estado: str = 'activos', 
+    service: UnidadMedidaService = Depends(get_unidad_medida_service)
+):
+    """
+    Cantidad de unidades de medida según la Doctrina VIL ('activos', 'inactivos' o 'todos'),
+    con una consulta count() (sin transferir documentos). Cacheada unos segundos.
+    """
+    return await service.estadisticas_unidades(estado)
+
+@router_unidades_medida.get("/{id}", 
+                          response_model=UnidadMedidaModel,
+                          summary="Obtener Unidad por ID")
+async def obtener_unidad(
+    id: str, 
+    response: Response,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por coma (p.ej. codigo,nombre); el id va siempre"),
+    service: UnidadMedidaService = Depends(get_unidad_medida_service)
+):
     """
-    return service.listar_unidades(estado)
+    Obtiene una unidad de medida (desde el Espejo en memoria si está activo).
+    """
+    campos = parsear_campos(fields, UnidadMedidaModel)
+    unidad = await service.obtener_unidad(id, campos)
+    if not unidad:
+        raise HTTPException(status_code=404, detail="Unidad no encontrada")
+    return responder(response, unidad)
 
 @router_unidades_medida.patch("/{id}", 
                              response_model=UnidadMedidaModel,
                              summary="Actualizar Unidad (PATCH)")
-def actualizar_unidad(
+async def actualizar_unidad(
     id: str, 
     data: UnidadMedidaUpdateModel, 
     service: UnidadMedidaService = Depends(get_unidad_medida_service)
@@ -58,7 +183,7 @@ def actualizar_unidad(
     """
     Actualiza parcialmente una unidad de medida (nombre o baja_logica).
     """
-    updated = service.actualizar_unidad(id, data)
+    updated = await service.actualizar_unidad(id, data)
     if not updated:
         raise HTTPException(status_code=404, detail="Unidad no encontrada")
     return updated
@@ -66,7 +191,7 @@ def actualizar_unidad(
 @router_unidades_medida.delete("/{id}", 
                               status_code=status.HTTP_204_NO_CONTENT,
                               summary="Baja Lógica (Doctrina VIL)")
-def baja_logica_unidad(
+async def baja_logica_unidad(
     id: str, 
     service: UnidadMedidaService = Depends(get_unidad_medida_service)
 ):
@@ -74,6 +199,6 @@ def baja_logica_unidad(
     Realiza una baja lógica (Doctrina VIL) de la unidad.
     Establece baja_logica = true.
     """
-    if not service.baja_logica_unidad(id):
+    if not await service.baja_logica_unidad(id):
         raise HTTPException(status_code=404, detail="Unidad no encontrada")
     return {} # No content
\ No newline at end of file
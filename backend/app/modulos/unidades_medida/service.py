@@ -1,50 +1,79 @@
 ﻿# backend/app/modulos/unidades_medida/service.py (CORRECCIÓN DE ESTABILIDAD)
 
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from fastapi import HTTPException, status
+from google.api_core.exceptions import AlreadyExists
 from google.cloud.firestore_v1.base_query import FieldFilter
 from .models import UnidadMedidaModel, UnidadMedidaUpdateModel
 from .helpers.unidad_helper import (
     _transaccion_crear_unidad,
+    _excepcion_duplicado,
     DuplicadoActivoException,
     DuplicadoInactivoException
 )
+from ...core.actualizacion import actualizar_con_retorno
+from ...core.cache import cache_catalogos
+from ...core.claves_unicas import sincronizar_clave
+from ...core.estadisticas import EstadisticasModel, calcular_estadisticas
+from ...core.exportacion import exportar_consulta
+from ...core.lectura import LecturaPorIds, leer_por_ids, modelos_por_ids, validar_documentos
+from ...core.masivo import ResultadoItemMasivo, cambiar_estado_masivo, crear_masivo, validar_tamano_masivo
+from ...core.paginacion import Pagina, normalizar_limite, paginar_consulta, paginar_lista
+from ...core.proyeccion import Campos, campos_firestore, modelo_proyectado, recortar
+from ...core.referencias import exigir_sin_hijos
+from ...core.versiones import version_vigente
+from ...core.espejo import EspejoColeccion
 
-# --- INICIO: Conexión a DB Real (Patrón Canónico) ---
-from google.cloud import firestore
-from google.oauth2 import service_account
-import os
+# Doctrina Referencias (Anti-Orfandad)
+MENSAJE_HIJOS_ACTIVOS = "No se puede dar de baja la Unidad de Medida porque tiene Productos activos asociados."
 
-ruta_llave_absoluta = "C:/dev/Sonido_Liquido_V4/service-account-v4.json"
-
-try:
-    credentials = service_account.Credentials.from_service_account_file(ruta_llave_absoluta)
-    db = firestore.Client(credentials=credentials)
-except Exception as e:
-    print(f"ERROR CRÍTICO: No se pudo cargar la llave de Firestore desde {ruta_llave_absoluta}")
-    print(f"Error: {e}")
-    db = None
-# --- FIN: Conexión a DB Real ---
+# --- Conexión a DB: Doctrina Conexión Única ---
+# El cliente compartido se crea en app/core/database.py y lo inyecta el lifespan de main.py.
 
 class UnidadMedidaService:
     # REFUERZO DE DOCTRINA: Constructor explícito para evitar AttributeError: 'XyzService' object has no attribute 'db'
     def __init__(self, db_instance):
         self.db = db_instance
+        self.espejo = None  # Doctrina Espejo (opcional, ver activar_espejo)
+
+    # --- Doctrina Espejo: copia viva en memoria (opt-in desde el lifespan) ---
+
+    def activar_espejo(self, db_sync) -> EspejoColeccion:
+        self.espejo = EspejoColeccion('unidades_medida', 'codigo_unidad', UnidadMedidaModel)
+        self.espejo.iniciar(db_sync)
+        return self.espejo
+
+    def desactivar_espejo(self):
+        if self.espejo is not None:
+            self.espejo.detener()
+            self.espejo = None
 
-    def crear_unidad(self, data: UnidadMedidaModel) -> UnidadMedidaModel:
+    def _espejo_listo(self) -> bool:
+        return self.espejo is not None and self.espejo.listo
+
+    async def crear_unidad(self, data: UnidadMedidaModel) -> UnidadMedidaModel:
         if self.db is None: # Uso de self.db
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
         try:
-            unidad_dict = data.model_dump(exclude={'id'}, exclude_unset=True)
+            unidad_dict = data.model_dump(exclude={'id', 'referencias'}, exclude_unset=True)
+
+            # Pre-chequeo ABR local (Espejo): el duplicado se rechaza sin leer Firestore.
+            # La transacción sigue siendo la garantía ante altas concurrentes.
+            if self._espejo_listo():
+                codigo = unidad_dict.get('codigo_unidad')
+                existente = self.espejo.buscar_por_clave(codigo)
+                if existente is not None:
+                    raise _excepcion_duplicado(existente.id, existente.model_dump(), codigo)
 
             transaction = self.db.transaction() # Uso de self.db
 
-            nuevo_id, datos_creados = _transaccion_crear_unidad(
+            nuevo_id, datos_creados = await _transaccion_crear_unidad(
                 transaction,
                 unidad_data=unidad_dict,
                 db=self.db # Uso de self.db
             )
+            cache_catalogos.invalidar('unidades_medida')
 
             datos_creados['id'] = nuevo_id
             return UnidadMedidaModel.model_validate(datos_creados)
@@ -56,10 +85,62 @@ class UnidadMedidaService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error interno del servidor: {e}")
 
-    def listar_unidades(self, estado: str = 'activos') -> List[UnidadMedidaModel]:
+    # --- Doctrina Operaciones Masivas: ABR agrupado + WriteBatch troceados ---
+    async def crear_unidades_masivo(self, items: List[UnidadMedidaModel]) -> List[ResultadoItemMasivo]:
         if self.db is None: # Uso de self.db
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(items)
+
+        def conflicto(doc_id: str, datos: dict):
+            e = _excepcion_duplicado(doc_id, datos, datos.get('codigo_unidad'))
+            return ('EXISTE_INACTIVO' if isinstance(e, DuplicadoInactivoException) else 'EXISTE_ACTIVO'), e.detail
 
+        try:
+            registros = [item.model_dump(exclude={'id', 'referencias'}, exclude_unset=True) for item in items]
+            resultados = await crear_masivo(self.db, 'unidades_medida', 'codigo_unidad', registros, conflicto=conflicto)
+            cache_catalogos.invalidar('unidades_medida')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en alta masiva de unidades: {e}")
+
+    # --- Doctrina Exportación: streaming por páginas, sin armar la lista completa ---
+    def exportar_unidades(self, estado: str = 'todos', formato: str = 'ndjson') -> AsyncIterator[bytes]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        query = self.db.collection('unidades_medida')
+        if estado == 'activos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", False))
+        elif estado == 'inactivos':
+            query = query.where(filter=FieldFilter("baja_logica", "==", True))
+        return exportar_consulta(query, UnidadMedidaModel, formato)
+
+    async def version_listado(self):
+        """Versión de la colección para el ETag de los listados (lectura reusada durante SL_VERSION_TTL segundos)."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        # Con Espejo, la versión sale del mismo contenido que se sirve (sin lecturas)
+        if self._espejo_listo():
+            return self.espejo.huella
+        return await version_vigente(self.db, 'unidades_medida')
+
+    async def listar_unidades(self, estado: str = 'activos', limite: Optional[int] = None, cursor: Optional[str] = None,
+                                campos: Campos = None, version=None) -> Pagina:
+        if self.db is None: # Uso de self.db
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        # Doctrina Espejo: si está activo, la lista sale de memoria sin lecturas
+        if self._espejo_listo():
+            pagina = paginar_lista(self.espejo.listar(estado), limite, cursor)
+            return Pagina([recortar(item, campos) for item in pagina.items], pagina.siguiente_cursor)
+
+        # Doctrina Cache de Catálogos: lectura a través de memoria
+        clave = (estado, normalizar_limite(limite), cursor, campos)
+        return await cache_catalogos.obtener('unidades_medida', clave,
+                                             lambda: self._consultar_unidades(estado, limite, cursor, campos), version)
+
+    async def _consultar_unidades(self, estado: str, limite: Optional[int], cursor: Optional[str], campos: Campos) -> Pagina:
         try:
             query = self.db.collection('unidades_medida') # Uso de self.db
 
@@ -69,48 +150,148 @@ class UnidadMedidaService:
             elif estado == 'inactivos':
                 query = query.where(filter=FieldFilter("baja_logica", "==", True))
 
-            docs = query.stream()
-            lista = []
-            for doc in docs:
-                datos = doc.to_dict()
-                datos['id'] = doc.id
-                lista.append(UnidadMedidaModel.model_validate(datos))
-            return lista
+            # Doctrina Proyección: solo viajan y se validan los campos pedidos
+            modelo = UnidadMedidaModel
+            if campos:
+                query = query.select(campos_firestore(campos))
+                modelo = modelo_proyectado(UnidadMedidaModel, campos)
 
+            # Doctrina Paginación: order_by(id) + start_after(cursor) + limit
+            docs, siguiente_cursor = await paginar_consulta(query, limite, cursor)
+            # Doctrina Lectura Confiable: la página entera se valida en una sola llamada
+            return Pagina(validar_documentos(modelo, docs), siguiente_cursor)
+
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al listar unidades: {e}")
 
-    def actualizar_unidad(self, id: str, data: UnidadMedidaUpdateModel) -> Optional[UnidadMedidaModel]:
+    async def obtener_unidad(self, id: str, campos: Campos = None) -> Optional[UnidadMedidaModel]:
         if self.db is None: # Uso de self.db
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
-        try:
-            doc_ref = self.db.collection('unidades_medida').document(id) # Uso de self.db
-            update_data = data.model_dump(exclude_unset=True)
-
-            doc_ref.update(update_data)
+        if self._espejo_listo():
+            item = self.espejo.obtener(id)
+            return recortar(item, campos) if item is not None else None
 
-            doc = doc_ref.get()
+        try:
+            mascara = [c for c in campos if c != 'id'] if campos else None
+            doc = await self.db.collection('unidades_medida').document(id).get(field_paths=mascara or None)
             if doc.exists:
                 datos = doc.to_dict()
                 datos['id'] = doc.id
-                return UnidadMedidaModel.model_validate(datos)
+                modelo = modelo_proyectado(UnidadMedidaModel, campos) if campos else UnidadMedidaModel
+                return modelo.model_validate(datos)
             return None
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener unidad: {e}")
+
+    async def actualizar_unidad(self, id: str, data: UnidadMedidaUpdateModel) -> Optional[UnidadMedidaModel]:
+        if self.db is None: # Uso de self.db
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            update_data = data.model_dump(exclude_unset=True)
+
+            async def preparar(lote, actual: dict):
+                if update_data.get('baja_logica'):
+                    # Doctrina Referencias: la baja por PATCH respeta la misma regla anti-orfandad
+                    exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+                # Doctrina Claves Únicas: la clave sigue al código y al estado (baja / reactivación)
+                dueno = await sincronizar_clave(self.db, lote, 'unidades_medida', 'codigo_unidad', id, update_data, actual)
+                if dueno is not None:
+                    e = _excepcion_duplicado(dueno[0], dueno[1], update_data['codigo_unidad'])
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=e.detail)
+
+            # Doctrina Escritura con Retorno: pre-imagen del Espejo (sin RPC) o una lectura puntual;
+            # dato + clave + versión en un WriteBatch condicionado a ella. None: no existe.
+            datos = await actualizar_con_retorno(self.db, 'unidades_medida', id, update_data, preparar, self.espejo)
+            if datos is None:
+                return None
+            cache_catalogos.invalidar('unidades_medida')
+            return UnidadMedidaModel.model_validate(datos)
+        except HTTPException:
+            raise
+        except AlreadyExists:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="El código fue tomado por otra operación concurrente.")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al actualizar: {e}")
 
-    def baja_logica_unidad(self, id: str) -> bool:
+    async def baja_logica_unidad(self, id: str) -> bool:
         if self.db is None: # Uso de self.db
             raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
 
         try:
-            doc_ref = self.db.collection('unidades_medida').document(id) # Uso de self.db
+            async def preparar(lote, actual: dict):
+                # Doctrina Referencias (Anti-Orfandad): contadores de la pre-imagen de la unidad
+                exigir_sin_hijos(actual, MENSAJE_HIJOS_ACTIVOS)
+                await sincronizar_clave(self.db, lote, 'unidades_medida', 'codigo_unidad', id, {"baja_logica": True}, actual)
 
-            # Doctrina VIL (Baja)
-            doc_ref.update({"baja_logica": True})
+            # Doctrina VIL (Baja) + Doctrina Escritura con Retorno
+            if await actualizar_con_retorno(self.db, 'unidades_medida', id, {"baja_logica": True},
+                                            preparar, self.espejo) is None:
+                return False
+            cache_catalogos.invalidar('unidades_medida')
             return True
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error al dar de baja: {e}")
 
+    # --- Doctrina Estadísticas: agregaciones en Firestore ---
+    async def estadisticas_unidades(self, estado: str = 'activos') -> EstadisticasModel:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+
+        try:
+            return await calcular_estadisticas(self.db, 'unidades_medida', estado)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al calcular estadísticas de unidades de medida: {e}")
+
+    # --- Doctrina Lectura Agrupada: batch-get por ids ---
+    async def leer_unidades_por_ids(self, ids: List[str], campos: Campos = None) -> LecturaPorIds:
+        """Espejo primero; el resto, get_all agrupado (un RPC cada 500 ids). Orden de entrada + faltantes."""
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        modelo = modelo_proyectado(UnidadMedidaModel, campos) if campos else UnidadMedidaModel
+        mascara = campos_firestore(campos) if campos else None
+
+        async def leer(pendientes: List[str]):
+            return await modelos_por_ids(self.db, 'unidades_medida', modelo, pendientes, mascara)
+
+        try:
+            en_memoria = None
+            if self._espejo_listo():
+                # Doctrina Espejo: los aciertos no generan lecturas
+                def en_memoria(doc_id: str):
+                    item = self.espejo.obtener(doc_id)
+                    return recortar(item, campos) if item is not None else None
+
+            return await leer_por_ids(modelo, ids, leer, en_memoria)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error al obtener unidades de medida por ids: {e}")
+
+    # --- Doctrina Operaciones Masivas: baja / reactivación agrupadas (Doctrina VIL) ---
+    async def cambiar_estado_unidades_masivo(self, ids: List[str], baja: bool) -> List[ResultadoItemMasivo]:
+        if self.db is None:
+            raise HTTPException(status_code=503, detail="Servicio de base de datos no disponible")
+        validar_tamano_masivo(ids)
+
+        try:
+            resultados = await cambiar_estado_masivo(self.db, 'unidades_medida', 'codigo_unidad', ids, baja, MENSAJE_HIJOS_ACTIVOS)
+            cache_catalogos.invalidar('unidades_medida')
+            return resultados
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error en la {'baja' if baja else 'reactivación'} masiva: {e}")
+
 # Instancia Singleton del Servicio: Ahora se pasa la instancia 'db'
-unidad_medida_service = UnidadMedidaService(db)
+unidad_medida_service = UnidadMedidaService(None)
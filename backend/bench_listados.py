@@ -0,0 +1,109 @@
+# backend/bench_listados.py
+# --- Doctrina Lectura Confiable: benchmark de CPU por fila de los listados (sin Firestore) ---
+# Uso (desde backend/, con el venv activo):
+#   python bench_listados.py [--filas 10000] [--repeticiones 5]
+# Compara, para páginas sintéticas con la forma guardada en Firestore:
+#   antes: model_validate por documento + validación/serialización del response_model de FastAPI
+#   ahora: validación de la página con el TypeAdapter cacheado + JSON directo en bytes
+import argparse
+import asyncio
+import json
+import time
+from decimal import Decimal
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from app.core.lectura import json_lista, validar_documentos
+from app.modulos.condiciones_iva.models import CondicionIvaModel
+from app.modulos.productos.models import ProductoModel
+from app.modulos.productos.service import producto_service
+from app.modulos.rubros.models import RubroModel
+
+
+class _Snapshot:
+    """Lo mínimo de un DocumentSnapshot que usan los listados."""
+    __slots__ = ("id", "_datos")
+
+    def __init__(self, doc_id: str, datos: dict):
+        self.id = doc_id
+        self._datos = datos
+
+    def to_dict(self) -> dict:
+        return dict(self._datos)
+
+
+def _docs_rubros(n: int):
+    return [_Snapshot(f"r{i:06d}", {'codigo': f"{i % 1000:03d}", 'nombre': f"Rubro {i}", 'baja_logica': False})
+            for i in range(n)]
+
+
+def _docs_ivas(n: int):
+    return [_Snapshot(f"i{i:06d}", {'codigo_iva': f"G{i % 100}", 'nombre': f"Gravado {i}",
+                                    'alicuota': 21.0, 'baja_logica': False}) for i in range(n)]
+
+
+def _docs_productos(n: int):
+    docs = []
+    for i in range(n):
+        producto = ProductoModel(
+            sku=f"{i:08d}", nombre=f"Producto {i}", rubro_id='R1', condicion_iva_id='G',
+            precio_costo=Decimal('12.3456'), moneda_costo='ARS', precio_base_venta=Decimal('20.5'),
+            unidad_medida='UN', unidad_minima_pedido=1, unidad_minima_empaque={'descripcion': 'caja', 'unidades': 12},
+            stock_minimo_pedido=5, stock_depositos=[{'deposito_id': 'D1', 'stock_real': i % 50}],
+            stock_comprometido=0, stock_entrante=0,
+        )
+        docs.append(_Snapshot(f"p{i:06d}", producto_service._a_firestore(producto)))
+    return docs
+
+
+def _antes(modelo, docs, decodificar=None) -> bytes:
+    """Camino previo: un model_validate por documento y el response_model de la ruta."""
+    items = []
+    for doc in docs:
+        datos = doc.to_dict()
+        if decodificar is not None:
+            datos = decodificar(datos)
+        datos['id'] = doc.id
+        items.append(modelo.model_validate(datos))
+    campo = create_model_field(name=f"Response_{modelo.__name__}", type_=List[modelo], mode="serialization")
+    contenido = asyncio.run(serialize_response(field=campo, response_content=items))
+    return JSONResponse(contenido).body
+
+
+def _ahora(modelo, docs, decodificar=None) -> bytes:
+    return json_lista(validar_documentos(modelo, docs, decodificar))
+
+
+def _medir(funcion, repeticiones: int, *args) -> float:
+    funcion(*args)  # Calentamiento (TypeAdapter, esquemas)
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(*args)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU por fila de los listados: camino previo vs Lectura Confiable.")
+    parser.add_argument("--filas", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    casos = [
+        ('rubros (AliasChoices)', RubroModel, _docs_rubros(args.filas), None),
+        ('condiciones_iva (Decimal)', CondicionIvaModel, _docs_ivas(args.filas), None),
+        ('productos (anidados)', ProductoModel, _docs_productos(args.filas), producto_service._decodificar),
+    ]
+    print(f"{'listado':28} {'antes us/fila':>14} {'ahora us/fila':>14} {'mejora':>8}")
+    for nombre, modelo, docs, decodificar in casos:
+        assert json.loads(_antes(modelo, docs, decodificar)) == json.loads(_ahora(modelo, docs, decodificar))
+        antes = _medir(_antes, args.repeticiones, modelo, docs, decodificar)
+        ahora = _medir(_ahora, args.repeticiones, modelo, docs, decodificar)
+        por_fila = 1e6 / len(docs)
+        print(f"{nombre:28} {antes * por_fila:14.2f} {ahora * por_fila:14.2f} {antes / ahora:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# backend/importar_productos.py
+# --- Doctrina Importación: CLI para cargar el maestro de productos desde un archivo de proveedor ---
+# Uso (desde backend/, con el venv activo):
+#   python importar_productos.py proveedor.csv [--separador ";"] [--lote 499] > errores.ndjson
+#   python importar_productos.py proveedor.ndjson --formato ndjson
+# El progreso sale por stderr; los errores por fila, como NDJSON, por stdout.
+import argparse
+import asyncio
+import json
+import sys
+from app.core.database import conexion_firestore
+from app.core.importacion import TAMANO_LOTE_IMPORTACION, filas_csv, filas_ndjson, trozos_de_archivo
+from app.modulos.productos.service import producto_service
+
+
+async def importar(args) -> int:
+    producto_service.db = conexion_firestore.obtener_db_async()
+    formato = args.formato or ('ndjson' if args.archivo.lower().endswith(('.ndjson', '.jsonl')) else 'csv')
+    archivo = open(args.archivo, 'rb')
+    trozos = trozos_de_archivo(archivo)
+    filas = filas_csv(trozos, args.separador) if formato == 'csv' else filas_ndjson(trozos)
+
+    final = None
+    try:
+        async for evento in producto_service.importar_productos(filas, tamano_lote=args.lote):
+            if evento["evento"] == "error":
+                print(json.dumps(evento, ensure_ascii=False, default=str), flush=True)
+            else:
+                final = evento
+                print(f"\r{evento['filas']} filas | {evento['creados']} creados | {evento['errores']} errores"
+                      f" | {evento['filas_por_segundo']} filas/s", end='', file=sys.stderr, flush=True)
+    finally:
+        archivo.close()
+        conexion_firestore.cerrar()
+
+    print(file=sys.stderr)
+    if final is not None:
+        print(f"Importación finalizada en {final['segundos']} s.", file=sys.stderr)
+    return 1 if final is None or final['errores'] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa productos desde CSV o NDJSON.")
+    parser.add_argument("archivo")
+    parser.add_argument("--formato", choices=("csv", "ndjson"), help="Por defecto, según la extensión")
+    parser.add_argument("--separador", default=",", help="Separador de columnas del CSV")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE_IMPORTACION,
+                        help=f"Filas por WriteBatch (máx. {TAMANO_LOTE_IMPORTACION})")
+    args = parser.parse_args()
+    args.lote = max(1, min(args.lote, TAMANO_LOTE_IMPORTACION))
+    sys.exit(asyncio.run(importar(args)))
+
+
+if __name__ == "__main__":
+    main()
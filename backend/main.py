@@ -1,6 +1,13 @@
 ﻿# backend/main.py
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.database import conexion_firestore
+from app.core.cache import cache_catalogos
+from app.core.contadores import estadisticas_contadores
+from app.core.paginacion import CABECERA_CURSOR
 from app.modulos.rubros.router import router_rubros
 from app.modulos.subrubros.router import router_subrubros
 from app.modulos.productos.router import router_productos
@@ -8,6 +15,55 @@ from app.modulos.unidades_medida.router import router_unidades_medida
 # --- INICIO INTEGRACIÓN HITO F1-50 (IVA) ---
 from app.modulos.condiciones_iva.router import router_condiciones_iva
 # --- FIN INTEGRACIÓN HITO F1-50 (IVA) ---
+from app.modulos.rubros.service import rubro_service
+from app.modulos.subrubros.service import subrubro_service
+from app.modulos.productos.service import producto_service
+from app.modulos.unidades_medida.service import unidad_medida_service
+from app.modulos.condiciones_iva.service import condicion_iva_service
+
+# Servicios Singleton que reciben la conexión compartida
+SERVICIOS_CON_DB = (
+    rubro_service,
+    subrubro_service,
+    producto_service,
+    unidad_medida_service,
+    condicion_iva_service,
+)
+
+# Doctrina Espejo (opt-in): tablas maestras chicas servidas desde memoria
+ESPEJO_MAESTROS = os.getenv("SL_ESPEJO_MAESTROS", "0") == "1"
+SERVICIOS_CON_ESPEJO = (
+    condicion_iva_service,
+    unidad_medida_service,
+)
+
+# --- Ciclo de Vida (Doctrina Conexión Única) ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 1. Un solo AsyncClient por worker, precalentado antes de aceptar tráfico
+    db = conexion_firestore.obtener_db_async()
+    await conexion_firestore.precalentar()
+
+    # 2. Inyección en cada Servicio Singleton
+    for servicio in SERVICIOS_CON_DB:
+        servicio.db = db
+
+    # 3. Espejos en memoria (listeners on_snapshot sobre el cliente síncrono)
+    if ESPEJO_MAESTROS and db is not None:
+        db_sync = conexion_firestore.obtener_db()
+        espejos = [servicio.activar_espejo(db_sync) for servicio in SERVICIOS_CON_ESPEJO]
+        for espejo in espejos:
+            if not await asyncio.to_thread(espejo.esperar_listo, 10):
+                print(f"ADVERTENCIA: El espejo de '{espejo.coleccion}' no recibió el snapshot inicial; se usará Firestore.")
+
+    yield
+
+    # 4. Apagado ordenado
+    for servicio in SERVICIOS_CON_ESPEJO:
+        servicio.desactivar_espejo()
+    for servicio in SERVICIOS_CON_DB:
+        servicio.db = None
+    conexion_firestore.cerrar()
 
 # --- Configuración de la Aplicación FastAPI ---
 app = FastAPI(
@@ -15,7 +71,8 @@ app = FastAPI(
     description="API de Microservicios Core para la gestión de Rubros, SubRubros, Productos y Unidades de Medida.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # --- Configuración de CORS ---
@@ -30,6 +87,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CABECERA_CURSOR, "ETag"],  # Paginación y Versiones: cabeceras legibles por el frontend
 )
 
 # --- Inclusión de Routers (Módulos) ---
@@ -49,6 +107,22 @@ def read_root():
     """
     return {"message": "API Core V4 Operativa. Módulos: Rubros, SubRubros, Productos, Unidades de Medida, Condiciones IVA."}
 
+@app.get("/salud/cache", tags=["Salud"], summary="Métricas del cache de catálogos")
+def estadisticas_cache():
+    """
+    Devuelve aciertos, fallos, valores stale servidos y entradas por colección
+    del cache en memoria de este worker.
+    """
+    return cache_catalogos.estadisticas()
+
+@app.get("/salud/contadores", tags=["Salud"], summary="Métricas de los asignadores de códigos")
+def estadisticas_codigos():
+    """
+    Por contador: códigos entregados y reservados, recargas de bloque, errores
+    y latencia promedio de la transacción de reserva en este worker.
+    """
+    return estadisticas_contadores()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
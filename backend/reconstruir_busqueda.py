@@ -0,0 +1,29 @@
+# backend/reconstruir_busqueda.py
+# --- Doctrina Búsqueda: claves 'busqueda' de los productos existentes (o reparación) ---
+# Uso (desde backend/, con el venv activo; idempotente):
+#   python reconstruir_busqueda.py
+# Los productos nuevos y los PATCH de sku / nombre ya las guardan; este script completa los
+# anteriores (la consulta de respaldo de /productos/buscar solo encuentra productos con claves).
+import asyncio
+import json
+import sys
+from app.core.database import conexion_firestore
+from app.modulos.productos.helpers.busqueda_helper import reconstruir_claves_busqueda
+
+
+async def reconstruir() -> int:
+    db = conexion_firestore.obtener_db_async()
+    try:
+        resumen = await reconstruir_claves_busqueda(db)
+        print(json.dumps(resumen, ensure_ascii=False), flush=True)
+    finally:
+        conexion_firestore.cerrar()
+    return 1 if resumen['errores'] else 0
+
+
+def main():
+    sys.exit(asyncio.run(reconstruir()))
+
+
+if __name__ == "__main__":
+    main()
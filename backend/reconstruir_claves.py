@@ -0,0 +1,48 @@
+# backend/reconstruir_claves.py
+# --- Doctrina Claves Únicas: migración de los documentos cargados antes de 'claves_unicas' ---
+# Uso (desde backend/, con el venv activo; idempotente, correr antes de desplegar):
+#   python reconstruir_claves.py [rubros subrubros ...]
+# Sin argumentos recorre todas las colecciones con clave de negocio.
+import argparse
+import asyncio
+import json
+import sys
+from app.core.claves_unicas import reconstruir_claves
+from app.core.database import conexion_firestore
+
+# Colección -> campo con la clave de negocio (Doctrina ABR)
+CLAVES_DE_NEGOCIO = {
+    'rubros': 'codigo',
+    'subrubros': 'codigo_subrubro',
+    'condiciones_iva': 'codigo_iva',
+    'unidades_medida': 'codigo_unidad',
+    'productos': 'sku',
+}
+
+
+async def reconstruir(colecciones) -> int:
+    db = conexion_firestore.obtener_db_async()
+    con_problemas = False
+    try:
+        for coleccion in colecciones:
+            resumen = await reconstruir_claves(db, coleccion, CLAVES_DE_NEGOCIO[coleccion])
+            print(json.dumps(resumen, ensure_ascii=False, default=str), flush=True)
+            con_problemas = con_problemas or bool(resumen['errores'] or resumen['conflictos'])
+    finally:
+        conexion_firestore.cerrar()
+    return 1 if con_problemas else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera los documentos de claves_unicas de los datos existentes.")
+    parser.add_argument("colecciones", nargs="*", help=f"Por defecto: {', '.join(CLAVES_DE_NEGOCIO)}")
+    args = parser.parse_args()
+    colecciones = args.colecciones or list(CLAVES_DE_NEGOCIO)
+    desconocidas = [c for c in colecciones if c not in CLAVES_DE_NEGOCIO]
+    if desconocidas:
+        parser.error(f"Colecciones sin clave de negocio: {', '.join(desconocidas)}")
+    sys.exit(asyncio.run(reconstruir(colecciones)))
+
+
+if __name__ == "__main__":
+    main()
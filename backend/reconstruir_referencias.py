@@ -0,0 +1,39 @@
+# backend/reconstruir_referencias.py
+# --- Doctrina Referencias: contadores de hijos activos de los datos existentes (o reparación) ---
+# Uso (desde backend/, con el venv activo; idempotente, correr después de reconstruir_claves.py):
+#   python reconstruir_referencias.py [subrubros productos]
+# Sin argumentos recalcula los contadores de todas las colecciones hijas.
+import argparse
+import asyncio
+import json
+import sys
+from app.core.database import conexion_firestore
+from app.core.referencias import RELACIONES, reconstruir_referencias
+
+
+async def reconstruir(hijos) -> int:
+    db = conexion_firestore.obtener_db_async()
+    con_problemas = False
+    try:
+        for hijo in hijos:
+            resumen = await reconstruir_referencias(db, hijo)
+            print(json.dumps(resumen, ensure_ascii=False, default=str), flush=True)
+            con_problemas = con_problemas or bool(resumen['errores'])
+    finally:
+        conexion_firestore.cerrar()
+    return 1 if con_problemas else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula referencias.<hijo> en los documentos padre.")
+    parser.add_argument("hijos", nargs="*", help=f"Por defecto: {', '.join(RELACIONES)}")
+    args = parser.parse_args()
+    hijos = args.hijos or list(RELACIONES)
+    desconocidas = [h for h in hijos if h not in RELACIONES]
+    if desconocidas:
+        parser.error(f"Colecciones sin padres declarados: {', '.join(desconocidas)}")
+    sys.exit(asyncio.run(reconstruir(hijos)))
+
+
+if __name__ == "__main__":
+    main()
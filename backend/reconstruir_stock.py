@@ -0,0 +1,30 @@
+# backend/reconstruir_stock.py
+# --- Doctrina Stock Distribuido: agregados de stock de los productos desde sus shards (reparación) ---
+# Uso (desde backend/, con el venv activo; idempotente):
+#   python reconstruir_stock.py
+# Cada movimiento ya incrementa los agregados junto con su shard; este script los recalcula desde
+# los shards si alguna vez divergen (p.ej. datos editados a mano). ?verificar=true en
+# GET /productos/{id}/stock muestra el desvío.
+import asyncio
+import json
+import sys
+from app.core.database import conexion_firestore
+from app.modulos.productos.helpers.stock_helper import reconstruir_agregados_stock
+
+
+async def reconstruir() -> int:
+    db = conexion_firestore.obtener_db_async()
+    try:
+        resumen = await reconstruir_agregados_stock(db)
+        print(json.dumps(resumen, ensure_ascii=False), flush=True)
+    finally:
+        conexion_firestore.cerrar()
+    return 1 if resumen['errores'] else 0
+
+
+def main():
+    sys.exit(asyncio.run(reconstruir()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# backend/tests/test_busqueda_helper.py
+# Doctrina Búsqueda: normalización, claves de respaldo e índice de trigramas en memoria
+from app.modulos.productos.helpers.busqueda_helper import (
+    IndiceBusqueda, claves_busqueda, normalizar, palabras,
+)
+
+
+def _indice():
+    indice = IndiceBusqueda()
+    indice.aplicar('1', {'sku': 'VAL-1', 'nombre': 'Válvula esférica'})
+    indice.aplicar('2', {'sku': 'CAN-2', 'nombre': 'Caño válvula'})
+    indice.aplicar('3', {'sku': 'VAL', 'nombre': 'Otro', 'baja_logica': True})
+    return indice
+
+
+def _ids(resultado):
+    return [r['id'] for r in resultado]
+
+
+def test_normalizar():
+    assert normalizar('Válvula ESFÉRICA 1/2"') == 'valvula esferica 1 2'
+    assert normalizar(None) == ''
+    assert normalizar('  Caño   ') == 'cano'
+
+
+def test_palabras_y_claves_busqueda():
+    assert palabras('AB-12', 'Caño') == ['cano', 'ab', '12', 'ab12']
+    assert claves_busqueda('AB-12', 'Caño') == ['ca', 'can', 'cano', 'ab', '12', 'ab1', 'ab12']
+    assert claves_busqueda('X', 'a') == ['a', 'x']
+
+
+def test_buscar_por_prefijo_sin_acentos():
+    indice = _indice()
+    assert _ids(indice.buscar('valv', 10)) == ['1', '2']
+    assert _ids(indice.buscar('VÁLV ESF', 10)) == ['1']
+    assert indice.buscar('zzz', 10) == []
+    assert indice.buscar('', 10) == []
+
+
+def test_filtro_de_estado():
+    indice = _indice()
+    assert _ids(indice.buscar('val', 10, 'activos')) == ['1', '2']
+    assert _ids(indice.buscar('val', 10, 'inactivos')) == ['3']
+    # SKU exacto primero, después SKU por prefijo
+    assert _ids(indice.buscar('val', 10, 'todos')) == ['3', '1', '2']
+
+
+def test_ranking_nombre_exacto_y_limite():
+    indice = IndiceBusqueda()
+    indice.aplicar('largo', {'sku': 'A1', 'nombre': 'Tornillo hexagonal largo'})
+    indice.aplicar('exacto', {'sku': 'A2', 'nombre': 'Tornillo'})
+    indice.aplicar('medio', {'sku': 'A3', 'nombre': 'Tuerca tornillo'})
+    assert _ids(indice.buscar('tornillo', 10)) == ['exacto', 'largo', 'medio']
+    assert _ids(indice.buscar('tornillo', 1)) == ['exacto']
+
+
+def test_cambio_parcial_reemplaza_el_texto():
+    indice = _indice()
+    indice.aplicar('1', {'nombre': 'Grifo'})
+    assert _ids(indice.buscar('esf', 10)) == []
+    assert indice.buscar('grif', 10)[0]['sku'] == 'VAL-1'
+    indice.aplicar('1', {'baja_logica': True})
+    assert indice.buscar('grif', 10) == []
+
+
+def test_cambio_parcial_de_producto_desconocido_se_ignora():
+    indice = _indice()
+    indice.aplicar('9', {'nombre': 'Nuevo'})
+    assert len(indice) == 3
+
+
+def test_al_dia_con_escrituras_propias():
+    indice = IndiceBusqueda(version=4, ttl=60)
+    indice.registrar([('1', {'sku': 'A', 'nombre': 'a'})], versiones=2)
+    assert not indice.vencido()
+    assert not indice.al_dia(7)
+    assert indice.al_dia(6)
+    assert (indice.version, indice.versiones_locales) == (6, 0)
@@ -0,0 +1,75 @@
+# backend/tests/test_cache_lectura.py
+# Doctrina Cache de Catálogos + Doctrina Lectura Agrupada (batch-get con memoria primero)
+import asyncio
+
+from pydantic import BaseModel
+
+from app.core import lectura, versiones
+from app.core.cache import CacheCatalogos
+from app.core.lectura import LecturaPorIds, leer_por_ids
+from app.core.paginacion import Pagina
+from app.core.proyeccion import parsear_campos
+
+
+class _Modelo(BaseModel):
+    id: str
+    nombre: str
+
+
+def test_cache_respeta_la_version_y_la_invalidacion():
+    cache = CacheCatalogos(ttl=60, ventana_stale=0)
+    cargas = []
+
+    async def cargador():
+        cargas.append(1)
+        return len(cargas)
+
+    async def pedir(version):
+        return await cache.obtener('rubros', 'todos', cargador, version)
+
+    assert asyncio.run(pedir(1)) == 1
+    assert asyncio.run(pedir(1)) == 1
+    assert cache.vigentes('rubros', 1) == [1]
+    assert cache.vigentes('rubros', 2) == []
+    assert asyncio.run(pedir(2)) == 2
+    cache.invalidar('rubros')
+    assert not cache.tiene('rubros')
+    assert asyncio.run(pedir(2)) == 3
+
+
+def test_leer_por_ids_memoria_primero():
+    memoria = {'a': _Modelo(id='a', nombre='A')}
+    pedidos = []
+
+    async def leer(pendientes):
+        pedidos.append(pendientes)
+        return {i: _Modelo(id=i, nombre=i.upper()) for i in pendientes if i != 'zz'}
+
+    resultado = asyncio.run(leer_por_ids(_Modelo, ['b', 'a', 'zz', 'b'], leer, memoria.get))
+    assert isinstance(resultado, LecturaPorIds)
+    assert [item.id for item in resultado.items] == ['b', 'a']
+    assert resultado.faltantes == ['zz']
+    assert pedidos == [['b', 'zz']]
+
+
+def test_en_cache_catalogos_usa_paginas_de_la_version_vigente(monkeypatch):
+    cache = CacheCatalogos(ttl=60, ventana_stale=0)
+    monkeypatch.setattr('app.core.cache.cache_catalogos', cache)
+
+    async def version_vigente(db, coleccion):
+        return 7
+
+    monkeypatch.setattr(versiones, 'version_vigente', version_vigente)
+
+    assert asyncio.run(lectura.en_cache_catalogos(None, 'rubros', _Modelo)) is None
+
+    async def cargar():
+        return Pagina([_Modelo(id='a', nombre='A')])
+
+    asyncio.run(cache.obtener('rubros', 'todos', cargar, 6))
+    assert asyncio.run(lectura.en_cache_catalogos(None, 'rubros', _Modelo)) is None
+
+    asyncio.run(cache.obtener('rubros', 'activos', cargar, 7))
+    en_memoria = asyncio.run(lectura.en_cache_catalogos(None, 'rubros', _Modelo, parsear_campos('nombre', _Modelo)))
+    assert en_memoria('a').model_dump() == {'id': 'a', 'nombre': 'A'}
+    assert en_memoria('b') is None
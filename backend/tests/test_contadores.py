@@ -0,0 +1,69 @@
+# backend/tests/test_contadores.py
+# Doctrina Contadores: entrega de códigos desde bloques reservados (hi-lo)
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import contadores
+from app.core.contadores import AsignadorCodigos
+
+
+class _Db:
+    def collection(self, nombre):
+        return self
+
+    def document(self, nombre):
+        return nombre
+
+    def transaction(self):
+        return None
+
+
+@pytest.fixture
+def reservas(monkeypatch):
+    """Simula contadores/{nombre}: cada reserva avanza 'ultimo_valor' en el tamaño del bloque."""
+    estado = {'ultimo_valor': 0, 'reservas': 0}
+
+    async def reservar_bloque(transaction, contador_ref, tamano, semilla, crear):
+        previo = estado['ultimo_valor']
+        estado['ultimo_valor'] += tamano
+        estado['reservas'] += 1
+        return previo
+
+    monkeypatch.setattr(contadores, '_reservar_bloque', reservar_bloque)
+    return estado
+
+
+def test_codigos_correlativos_por_bloques(reservas):
+    asignador = AsignadorCodigos('prueba', tamano_bloque=3)
+
+    async def pedir(n):
+        return [await asignador.siguiente(_Db()) for _ in range(n)]
+
+    assert asyncio.run(pedir(7)) == [1, 2, 3, 4, 5, 6, 7]
+    assert reservas['reservas'] == 3
+    assert asignador.estadisticas()['disponibles_en_bloque'] == 2
+
+
+def test_pedidos_concurrentes_no_repiten(reservas):
+    asignador = AsignadorCodigos('prueba', tamano_bloque=4)
+
+    async def pedir():
+        return await asyncio.gather(*(asignador.siguiente(_Db()) for _ in range(10)))
+
+    codigos = asyncio.run(pedir())
+    assert sorted(codigos) == list(range(1, 11))
+    assert reservas['reservas'] == 3
+
+
+def test_maximo_agotado_es_409(reservas):
+    asignador = AsignadorCodigos('prueba', tamano_bloque=10, maximo=2)
+
+    async def pedir(n):
+        return [await asignador.siguiente(_Db()) for _ in range(n)]
+
+    assert asyncio.run(pedir(2)) == [1, 2]
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(pedir(1))
+    assert error.value.status_code == 409
@@ -0,0 +1,115 @@
+# backend/tests/test_kit_helper.py
+# Doctrina Kits + Doctrina Precio Entero: grafo de componentes, ciclos, costos y disponibilidad
+from fractions import Fraction
+
+from app.modulos.productos.helpers.kit_helper import GrafoKits, componentes_exactos, stock_disponible
+from app.modulos.productos.helpers.producto_helper import _dividir_half_up
+
+
+def _grafo():
+    return GrafoKits.construir([
+        ('a', 100, False, []),
+        ('b', 250, False, []),
+        ('k', 0, True, componentes_exactos([{'producto_id': 'a', 'cantidad': '2'},
+                                            {'producto_id': 'b', 'cantidad': '0.5'}])),
+        ('kk', 0, True, [('k', Fraction(3)), ('a', Fraction(1))]),
+    ])
+
+
+def test_dividir_half_up_redondea_la_mitad_hacia_afuera():
+    assert _dividir_half_up(5, 2) == 3
+    assert _dividir_half_up(-5, 2) == -3
+    assert _dividir_half_up(1, 2) == 1
+    assert _dividir_half_up(-1, 2) == -1
+    assert _dividir_half_up(7, 3) == 2
+    assert _dividir_half_up(-7, 3) == -2
+    assert _dividir_half_up(0, 5) == 0
+
+
+def test_componentes_exactos_pasa_por_str():
+    assert componentes_exactos([{'producto_id': 'a', 'cantidad': 0.1}]) == [('a', Fraction(1, 10))]
+    assert componentes_exactos(None) == []
+
+
+def test_costo_de_kit_y_sub_kit():
+    grafo = _grafo()
+    assert grafo.costo('k') == 2 * 100 + 125
+    assert grafo.costo('kk') == 3 * 325 + 100
+    assert grafo.costo('a') == 100
+    assert grafo.costo('inexistente') is None
+
+
+def test_costo_fraccionario_redondeado():
+    grafo = GrafoKits.construir([('a', 1, False, []), ('k', 0, True, [('a', Fraction(1, 2))])])
+    assert grafo.costo('k') == 1  # 0,5 -> 1 (ROUND_HALF_UP)
+
+
+def test_ciclos_y_dependientes_sin_costo():
+    grafo = GrafoKits.construir([
+        ('x', 0, True, [('y', Fraction(1))]),
+        ('y', 0, True, [('x', Fraction(1))]),
+        ('z', 0, True, [('x', Fraction(1))]),
+        ('s', 0, True, [('s', Fraction(1))]),
+        ('a', 10, False, []),
+        ('k', 0, True, [('a', Fraction(1))]),
+    ])
+    assert sorted(sorted(c) for c in grafo.ciclos) == [['s'], ['x', 'y']]
+    assert grafo.en_ciclo == {'x', 'y', 's'}
+    assert grafo.costos_kits() == {'x': None, 'y': None, 'z': None, 's': None, 'k': 10}
+
+
+def test_genera_ciclo():
+    grafo = _grafo()
+    assert grafo.genera_ciclo('a', [('kk', Fraction(1))])
+    assert not grafo.genera_ciclo('b', [('a', Fraction(1))])
+
+
+def test_componentes_faltantes():
+    grafo = GrafoKits.construir([('k', 0, True, [('nada', Fraction(1))])])
+    assert grafo.faltantes() == {'k': ['nada']}
+    assert grafo.costo('k') is None
+
+
+def test_aplicar_cambio_recalcula_solo_ancestros():
+    grafo = _grafo()
+    grafo.pendientes_de_guardar()
+    assert sorted(grafo.ancestros('a')) == ['k', 'kk']
+    assert grafo.aplicar_cambio('a', costo=101) == {'k': 327, 'kk': 3 * 327 + 101}
+    assert grafo.aplicar_cambio('b', costo=250) == {}
+
+
+def test_aplicar_cambio_de_bom_rompe_ciclo():
+    grafo = GrafoKits.construir([
+        ('a', 10, False, []),
+        ('x', 0, True, [('y', Fraction(1))]),
+        ('y', 0, True, [('x', Fraction(1))]),
+    ])
+    assert grafo.costo('x') is None
+    assert grafo.aplicar_cambio('y', componentes=[('a', Fraction(2))]) == {'y': 20, 'x': 20}
+    assert grafo.ciclos == []
+
+
+def test_stock_disponible_descuenta_comprometido_del_total():
+    por_deposito, total = stock_disponible([{'deposito_id': 'D1', 'stock_real': 5},
+                                            {'deposito_id': 'D2', 'stock_real': 2}], 10)
+    assert por_deposito == {'D1': 5, 'D2': 2}
+    assert total == 0
+
+
+def test_disponibilidad_por_deposito_y_total():
+    grafo = _grafo()
+    grafo.cargar_stock('a', [{'deposito_id': 'D1', 'stock_real': 10}, {'deposito_id': 'D2', 'stock_real': 3}], 1)
+    grafo.cargar_stock('b', [{'deposito_id': 'D1', 'stock_real': 1}], 0)
+    assert grafo.disponibilidad('k') == ({'D1': 2, 'D2': 0}, 2)
+    assert grafo.disponibilidad('kk') == ({'D1': 0, 'D2': 0}, 0)
+
+    assert sorted(grafo.aplicar_stock('b', [{'deposito_id': 'D1', 'stock_real': 4}])) == ['k', 'kk']
+    assert grafo.disponibilidad('k') == ({'D1': 5, 'D2': 0}, 6)
+
+
+def test_al_dia_con_versiones_locales():
+    grafo = GrafoKits(version=3)
+    grafo.versiones_locales = 2
+    assert not grafo.al_dia(6)
+    assert grafo.al_dia(5)
+    assert (grafo.version, grafo.versiones_locales) == (5, 0)
@@ -0,0 +1,44 @@
+# backend/tests/test_paginacion.py
+# Doctrina Paginación: cursores opacos y paginación en memoria
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.paginacion import (
+    LIMITE_MAXIMO_PAGINA, codificar_cursor, decodificar_cursor, normalizar_limite, paginar_lista,
+)
+
+
+def test_cursor_ida_y_vuelta():
+    for valores in (['abc'], [12.5, 'id-1'], ['ñandú', None]):
+        cursor = codificar_cursor(valores)
+        assert '=' not in cursor
+        assert decodificar_cursor(cursor) == valores
+
+
+@pytest.mark.parametrize('cursor', ['%%%', codificar_cursor([]), 'e30', 'bm8gZXMganNvbg'])
+def test_cursor_invalido_es_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decodificar_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_normalizar_limite():
+    assert normalizar_limite(None) == LIMITE_MAXIMO_PAGINA
+    assert normalizar_limite(LIMITE_MAXIMO_PAGINA + 1) == LIMITE_MAXIMO_PAGINA
+    assert normalizar_limite(0) == 1
+    assert normalizar_limite(20) == 20
+
+
+def test_paginar_lista_recorre_todo_en_orden():
+    items = [SimpleNamespace(id=i) for i in ('c', 'a', 'e', 'b', 'd')]
+    vistos, cursor = [], None
+    while True:
+        pagina = paginar_lista(items, 2, cursor)
+        vistos += [item.id for item in pagina.items]
+        cursor = pagina.siguiente_cursor
+        if cursor is None:
+            break
+    assert vistos == ['a', 'b', 'c', 'd', 'e']
+    assert paginar_lista(items, 5, None).siguiente_cursor is None
@@ -0,0 +1,76 @@
+# backend/tests/test_referencias.py
+# Doctrina Referencias: deltas de contadores de hijos activos y versión de los padres
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.referencias import (
+    colecciones_padre, deltas_referencias, escribir_referencias, exigir_sin_hijos, hijos_activos,
+    incrementos, padres_activos,
+)
+
+
+def _ref(coleccion, doc_id):
+    return SimpleNamespace(id=doc_id, parent=SimpleNamespace(id=coleccion))
+
+
+class _Escritor:
+    def __init__(self):
+        self.updates = []
+        self.sets = []
+
+    def update(self, ref, datos):
+        self.updates.append((ref, datos))
+
+    def set(self, ref, datos, merge=False):
+        self.sets.append(ref)
+
+
+class _Db:
+    def collection(self, nombre):
+        return SimpleNamespace(document=lambda doc_id: (nombre, doc_id))
+
+
+def test_padres_activos():
+    datos = {'rubro_id': 'r1', 'subrubro_id': None, 'unidad_medida': 'UN'}
+    assert padres_activos('productos', datos) == [('rubros', 'r1'), ('unidades_medida', 'UN')]
+    assert padres_activos('productos', {**datos, 'baja_logica': True}) == []
+    assert padres_activos('productos', None) == []
+
+
+def test_deltas_alta_baja_y_reasignacion():
+    antes = {'rubro_id': 'r1'}
+    assert deltas_referencias('subrubros', None, antes) == Counter({('rubros', 'r1'): 1})
+    assert deltas_referencias('subrubros', antes, {**antes, 'baja_logica': True}) == Counter({('rubros', 'r1'): -1})
+    assert deltas_referencias('subrubros', antes, {'rubro_id': 'r2'}) == Counter({('rubros', 'r1'): -1, ('rubros', 'r2'): 1})
+    assert deltas_referencias('subrubros', antes, dict(antes)) == Counter()
+
+
+def test_incrementos_omite_padres_inexistentes():
+    r1 = _ref('rubros', 'r1')
+    deltas = Counter({('rubros', 'r1'): 2, ('rubros', 'borrado'): 1})
+    assert incrementos(deltas, {('rubros', 'r1'): r1}) == [(r1, 2)]
+
+
+def test_escribir_referencias_marca_la_version_de_cada_padre():
+    cambios = [(_ref('rubros', 'r1'), 1), (_ref('subrubros', 's1'), -1), (_ref('rubros', 'r2'), 1)]
+    assert colecciones_padre(cambios) == {'rubros', 'subrubros'}
+
+    escritor = _Escritor()
+    escribir_referencias(escritor, 'productos', cambios)
+    assert [datos for _, datos in escritor.updates][0].keys() == {'referencias.productos'}
+    assert len(escritor.updates) == 3 and escritor.sets == []
+
+    escritor = _Escritor()
+    escribir_referencias(escritor, 'productos', cambios, _Db())
+    assert escritor.sets == [('versiones_colecciones', 'rubros'), ('versiones_colecciones', 'subrubros')]
+
+
+def test_exigir_sin_hijos():
+    assert hijos_activos({'referencias': {'productos': 2, 'subrubros': 0}}) == {'productos': 2}
+    exigir_sin_hijos({'referencias': {'productos': 0}}, 'con hijos')
+    with pytest.raises(HTTPException) as error:
+        exigir_sin_hijos({'referencias': {'productos': 1}}, 'con hijos')
+    assert error.value.status_code == 409
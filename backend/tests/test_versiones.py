@@ -0,0 +1,69 @@
+# backend/tests/test_versiones.py
+# Doctrina Versiones: ETag, GET condicional y versión reusada por worker
+import asyncio
+
+from starlette.requests import Request
+
+from app.core import versiones
+from app.core.versiones import calcular_etag, respuesta_no_modificada
+
+
+def _request(if_none_match=None):
+    headers = [(b'if-none-match', if_none_match.encode())] if if_none_match else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers})
+
+
+def test_calcular_etag_depende_de_version_y_clave():
+    etag = calcular_etag('rubros', 3, 'activos', 50, None, None)
+    assert etag.startswith('W/"rubros-3-')
+    assert etag == calcular_etag('rubros', 3, 'activos', 50, None, None)
+    assert etag != calcular_etag('rubros', 4, 'activos', 50, None, None)
+    assert etag != calcular_etag('rubros', 3, 'todos', 50, None, None)
+
+
+def test_respuesta_no_modificada():
+    etag = calcular_etag('rubros', 1)
+    assert respuesta_no_modificada(_request(), etag) is None
+    assert respuesta_no_modificada(_request('W/"otro"'), etag) is None
+    respuesta = respuesta_no_modificada(_request(f'W/"otro", {etag}'), etag)
+    assert respuesta.status_code == 304
+    assert respuesta.headers['etag'] == etag
+    assert respuesta_no_modificada(_request('*'), etag).status_code == 304
+
+
+class _LoteFalso:
+    def __init__(self):
+        self.operaciones = []
+
+    def set(self, ref, datos, merge=False):
+        self.operaciones.append((ref, datos))
+
+
+class _DbFalsa:
+    def collection(self, nombre):
+        return self
+
+    def document(self, nombre):
+        return nombre
+
+
+def test_version_vigente_reusa_la_lectura(monkeypatch):
+    lecturas = []
+
+    async def obtener_version(db, coleccion):
+        lecturas.append(coleccion)
+        return len(lecturas)
+
+    monkeypatch.setattr(versiones, 'obtener_version', obtener_version)
+    monkeypatch.setattr(versiones, 'TTL_VERSION', 60.0)
+    monkeypatch.setattr(versiones, '_versiones_leidas', {})
+    monkeypatch.setattr(versiones, '_versiones_marcadas', {})
+
+    assert asyncio.run(versiones.version_vigente(None, 'rubros')) == 1
+    assert asyncio.run(versiones.version_vigente(None, 'rubros')) == 1
+    assert lecturas == ['rubros']
+
+    # Una escritura propia descarta la lectura y las siguientes no se reusan dentro del TTL
+    versiones.marcar_version(_LoteFalso(), _DbFalsa(), 'rubros')
+    assert asyncio.run(versiones.version_vigente(None, 'rubros')) == 2
+    assert asyncio.run(versiones.version_vigente(None, 'rubros')) == 3